@@ -1,13 +1,16 @@
 import click
-import epub2sphinx
 import os
 import shutil
 import socket
 import subprocess
 import time
-import tempfile
-from contextlib import closing
+from contextlib import closing, nullcontext
 from epub2sphinx import constants
+from epub2sphinx.constants import ENGINES, EXECUTOR_BACKENDS, IMAGE_FORMATS, PANDOC_BACKENDS, PREVIEW_SERVERS
+
+# The conversion modules (and ebooklib, pypandoc, jinja2, tqdm and Sphinx) are only
+# imported by the commands when they start converting, so that --help, --version
+# and the argument checks start quickly
 
 
 @click.command()
@@ -20,8 +23,28 @@ from epub2sphinx import constants
 @click.option('-c', '--include-custom-css', is_flag=True, help=constants.cli_option_css_help)
 @click.option('--overwrite', is_flag=True, help=constants.cli_option_overwrite_help)
 @click.option('-p', '--port', type=int, default=0, help=constants.cli_option_port_help)
+@click.option('--preview-server', type=click.Choice(PREVIEW_SERVERS), default='http.server', help=constants.cli_option_preview_server_help, show_default=True)
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None, help=constants.cli_option_jobs_help)
+@click.option('--executor', type=click.Choice(EXECUTOR_BACKENDS), default='thread', help=constants.cli_option_executor_help, show_default=True)
+@click.option('--batch-size', type=click.IntRange(min=1), default=16, help=constants.cli_option_batch_size_help, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), help=constants.cli_option_cache_dir_help)
+@click.option('--cache-size', type=click.IntRange(min=0), default=512, help=constants.cli_option_cache_size_help, show_default=True)
+@click.option('--no-cache', is_flag=True, help=constants.cli_option_no_cache_help)
+@click.option('-i', '--incremental', is_flag=True, help=constants.cli_option_incremental_help)
+@click.option('--engine', type=click.Choice(ENGINES), default='auto', help=constants.cli_option_engine_help, show_default=True)
+@click.option('--optimize-images', is_flag=True, help=constants.cli_option_optimize_images_help)
+@click.option('--max-image-size', type=click.IntRange(min=1), default=1600, help=constants.cli_option_max_image_size_help, show_default=True)
+@click.option('--image-format', type=click.Choice(IMAGE_FORMATS), default='keep', help=constants.cli_option_image_format_help, show_default=True)
+@click.option('--max-page-size', type=click.IntRange(min=1), default=None, help=constants.cli_option_max_page_size_help)
+@click.option('--pipeline', is_flag=True, help=constants.cli_option_pipeline_help)
+@click.option('--pandoc-backend', type=click.Choice(PANDOC_BACKENDS), default='process', help=constants.cli_option_pandoc_backend_help, show_default=True)
+@click.option('--profile', is_flag=True, help=constants.cli_option_profile_help)
+@click.option('--profile-json', type=click.Path(dir_okay=False), help=constants.cli_option_profile_json_help)
+@click.option('--profile-dump', type=click.Path(dir_okay=False), help=constants.cli_option_profile_dump_help)
 @click.version_option(package_name='epub2sphinx')
-def convert(output_directory, sphinx_theme_name, input_file, build, serve, include_custom_css, overwrite, port):
+def convert(output_directory, sphinx_theme_name, input_file, build, serve, include_custom_css, overwrite, port, preview_server, jobs, executor, batch_size,
+            cache_dir, cache_size, no_cache, incremental, engine, optimize_images, max_image_size, image_format, max_page_size,
+            pipeline, pandoc_backend, profile, profile_json, profile_dump):
     '''\b
         This tool helps you to convert your epub files into sphinx format for a better reading experience.
         Kindly provide the epub file as the argument to this command.
@@ -32,43 +55,330 @@ def convert(output_directory, sphinx_theme_name, input_file, build, serve, inclu
             click.echo(f"Port {port} is already in use. Aborting!")
             exit(1)
 
+    import cProfile
+    import epub2sphinx
+    from epub2sphinx import images
+    from epub2sphinx.build import build_html
+    from epub2sphinx.cache import ConversionCache, default_cache_directory
+    from epub2sphinx.output import publish_directory, staging_directory
+    from epub2sphinx.profiling import Profiler
+
+    if optimize_images and not images.is_available():
+        click.echo("Pillow is required to optimize images, install it with: pip install epub2sphinx[images]")
+        exit(1)
+
     output_directory = output_directory or default_output_directory(input_file.name)
     output_directory = os.path.abspath(output_directory)
     click.echo("Writing output to {}".format(output_directory))
 
-    if os.path.isdir(output_directory):
-        if overwrite or click.confirm("{} already exists, Do you want to overwrite it?".format(output_directory)):
-            shutil.rmtree(output_directory)
-        else:
+    if os.path.isdir(output_directory) and not incremental:
+        # The existing output is replaced once the new output is ready
+        if not (overwrite or click.confirm("{} already exists, Do you want to overwrite it?".format(output_directory))):
             click.echo("Aborting")
             exit(1)
 
-    temp_directory = tempfile.TemporaryDirectory()
-    build_directory = os.path.join(temp_directory.name, "output")
-    start_time = time.time()
-    c = epub2sphinx.Converter(input_file.name, build_directory, sphinx_theme_name.lower(), include_custom_css)
-    c.convert()
-    click.echo("Conversion finished in {:.2f}s".format(time.time() - start_time))
-
-    if build:
-        # Build using Sphinx
-        os.chdir(build_directory)
-        build_exit_code = subprocess.call(["make html"], shell=True, stdout=subprocess.PIPE)
-        html_path = os.path.join('build', 'html')
-        if build_exit_code == 0 and os.path.isdir(html_path):
-            shutil.copytree(html_path, output_directory)
-            if serve:
-                # Serve on localhost
-                os.chdir(output_directory)
-                # 0 will automatically make use of the next available port
-                subprocess.call([f"python -m http.server {port} --bind 127.0.0.1"], shell=True)
+    cache = None
+    if not no_cache:
+        cache = ConversionCache(cache_dir or default_cache_directory(), cache_size * 1024 * 1024)
+    profiler = Profiler()
+    code_profiler = cProfile.Profile() if profile_dump else None
+    if code_profiler:
+        code_profiler.enable()
+    # Convert and build in a staging directory next to the output directory,
+    # and publish the result with a rename instead of copying it
+    with nullcontext() if incremental else staging_directory(output_directory) as staging:
+        if incremental:
+            # Keep the Sphinx project between runs, so that only the changed files are rebuilt
+            build_directory = sphinx_project_directory(output_directory) if build else output_directory
+        else:
+            build_directory = os.path.join(staging, "output")
+        start_time = time.time()
+        c = epub2sphinx.Converter(input_file.name, build_directory, sphinx_theme_name.lower(), include_custom_css,
+                                 batch_size=batch_size, executor=executor, jobs=jobs, cache=cache,
+                                 incremental=incremental, engine=engine, profiler=profiler,
+                                 optimize_images=optimize_images, max_image_size=max_image_size,
+                                 image_format=image_format, max_page_size=max_page_size and max_page_size * 1024,
+                                 pipeline=pipeline, pandoc_backend=pandoc_backend)
+        c.convert()
+        if cache:
+            click.echo("Conversion finished in {:.2f}s ({} converted without pandoc, cache: {} hits, {} misses)".format(
+                time.time() - start_time, c.python_conversions, c.cache_hits, c.cache_misses))
+        else:
+            click.echo("Conversion finished in {:.2f}s ({} converted without pandoc)".format(
+                time.time() - start_time, c.python_conversions))
+        if c.image_optimizer:
+            click.echo("Optimized {} images ({} duplicates), saved {:.1f} MB".format(
+                c.image_optimizer.image_count, c.image_optimizer.duplicate_count,
+                c.image_optimizer.bytes_saved / 2**20))
+
+        html_path = None
+        if build:
+            # Build using Sphinx
+            with profiler.stage('build html'):
+                build_result = build_html(build_directory, jobs)
+            html_path = build_result.html_path
+            if html_path:
+                with profiler.stage('publish output'):
+                    if incremental:
+                        sync_directory(html_path, output_directory)
+                    else:
+                        publish_directory(html_path, output_directory, staging)
+                if not serve:
+                    click.echo("Build finished successfully ({} warnings)".format(len(build_result.warnings)))
             else:
-                click.echo("Build finished successfully")
+                click.echo("Sphinx Build Failed: {}".format(build_result.error or "Something went wrong!"))
+                for error in build_result.errors:
+                    click.echo("{}:{}: {}: {}".format(error['file'], error['line'], error['level'], error['message']))
+        elif not incremental:
+            with profiler.stage('publish output'):
+                publish_directory(build_directory, output_directory, staging)
+
+    if code_profiler:
+        code_profiler.disable()
+        code_profiler.dump_stats(profile_dump)
+        click.echo("cProfile statistics written to {}".format(profile_dump))
+    if profile:
+        click.echo(profiler.format_report())
+    if profile_json:
+        profiler.write_json(profile_json)
+        click.echo("Profiling report written to {}".format(profile_json))
+
+    if html_path and serve:
+        # Serve on localhost
+        if preview_server == 'builtin':
+            serve_books({'': output_directory}, "127.0.0.1", port, precompress=True, max_age=300)
         else:
-            click.echo("Sphinx Build Failed: Something went wrong!")
+            os.chdir(output_directory)
+            # 0 will automatically make use of the next available port
+            subprocess.call([f"python -m http.server {port} --bind 127.0.0.1"], shell=True)
+
+
+@click.command()
+@click.argument('directories', nargs=-1, required=True, type=click.Path(exists=True, file_okay=False))
+@click.option('--host', default="127.0.0.1", help=constants.cli_option_preview_host_help, show_default=True)
+@click.option('-p', '--port', type=click.IntRange(min=0), default=8000, help=constants.cli_option_preview_port_help, show_default=True)
+@click.option('--precompress/--no-precompress', default=True, help=constants.cli_option_precompress_help, show_default=True)
+@click.option('--max-age', type=click.IntRange(min=0), default=300, help=constants.cli_option_max_age_help, show_default=True)
+@click.version_option(package_name='epub2sphinx')
+def preview(directories, host, port, precompress, max_age):
+    '''\b
+        Serve the HTML output of converted books with a threaded server.
+        A single book is served at the root, several books are served under the names of their directories.
+    '''
+    from epub2sphinx.preview import get_book_names
+
+    books = get_book_names(directories) if len(directories) > 1 else {'': directories[0]}
+    serve_books(books, host, port, precompress, max_age)
+
+
+def serve_books(books, host, port, precompress, max_age):
+    """
+    Serve the HTML output of the books with the built-in preview server until interrupted.
+
+    :param dict books: (Name => HTML directory) mapping, the book served at the root has an empty name
+    :param str host: The address to listen on
+    :param int port: The port to listen on, 0 uses any available port
+    :param bool precompress: Write the compressed copies of the text files before serving them
+    :param int max_age: The time in seconds the browsers can reuse the assets without revalidating them
+    """
+    from epub2sphinx import preview
+
+    if precompress:
+        written = sum(preview.precompress(directory) for directory in books.values())
+        click.echo("Wrote {} compressed files{}".format(
+            written, "" if preview.is_brotli_available() else " (install Brotli for brotli compression)"))
+    server = preview.PreviewServer(books, host, port, max_age=max_age)
+    for name in sorted(books):
+        click.echo("Serving {} on http://{}:{}/{}".format(books[name], *server.server_address[:2],
+                                                         name + "/" if name else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("Stopping the preview server")
+    finally:
+        server.server_close()
+
+
+@click.command()
+@click.argument('inputs', nargs=-1, type=click.Path(exists=True))
+@click.option('-m', '--manifest', 'manifest_file', type=click.Path(exists=True, dir_okay=False), help=constants.cli_option_manifest_help)
+@click.option('-o', '--output-directory', type=click.Path(file_okay=False), required=True, help=constants.cli_option_bulk_output_directory_help)
+@click.option('-t', '--theme', 'sphinx_theme_name', default="alabaster", type=str, help=constants.cli_option_theme_help, show_default=True)
+@click.option('-b/-B', '--build/--no-build', 'build', is_flag=True, default=True, help=constants.cli_option_build_help, show_default=True)
+@click.option('-c', '--include-custom-css', is_flag=True, help=constants.cli_option_css_help)
+@click.option('--overwrite', is_flag=True, help=constants.cli_option_overwrite_help)
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None, help=constants.cli_option_jobs_help)
+@click.option('--executor', type=click.Choice(EXECUTOR_BACKENDS), default='thread', help=constants.cli_option_executor_help, show_default=True)
+@click.option('--max-books', type=click.IntRange(min=1), default=4, help=constants.cli_option_max_books_help, show_default=True)
+@click.option('--batch-size', type=click.IntRange(min=1), default=16, help=constants.cli_option_batch_size_help, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), help=constants.cli_option_cache_dir_help)
+@click.option('--cache-size', type=click.IntRange(min=0), default=512, help=constants.cli_option_cache_size_help, show_default=True)
+@click.option('--no-cache', is_flag=True, help=constants.cli_option_no_cache_help)
+@click.option('--engine', type=click.Choice(ENGINES), default='auto', help=constants.cli_option_engine_help, show_default=True)
+@click.option('--optimize-images', is_flag=True, help=constants.cli_option_optimize_images_help)
+@click.option('--max-image-size', type=click.IntRange(min=1), default=1600, help=constants.cli_option_max_image_size_help, show_default=True)
+@click.option('--image-format', type=click.Choice(IMAGE_FORMATS), default='keep', help=constants.cli_option_image_format_help, show_default=True)
+@click.option('--max-page-size', type=click.IntRange(min=1), default=None, help=constants.cli_option_max_page_size_help)
+@click.option('--pipeline', is_flag=True, help=constants.cli_option_pipeline_help)
+@click.option('--pandoc-backend', type=click.Choice(PANDOC_BACKENDS), default='process', help=constants.cli_option_pandoc_backend_help, show_default=True)
+@click.option('--summary', 'summary_file', type=click.Path(dir_okay=False), help=constants.cli_option_summary_help)
+@click.version_option(package_name='epub2sphinx')
+def bulk_convert(inputs, manifest_file, output_directory, sphinx_theme_name, build, include_custom_css, overwrite, jobs, executor,
+                 max_books, batch_size, cache_dir, cache_size, no_cache, engine, optimize_images, max_image_size, image_format,
+                 max_page_size, pipeline, pandoc_backend, summary_file):
+    '''\b
+        Convert many epub files using a single worker pool.
+        Kindly provide the epub files or directories containing epub files as the arguments to this command.
+    '''
+    from epub2sphinx import images
+    from epub2sphinx.bulk import convert_books, find_input_files, write_summary
+    from epub2sphinx.cache import ConversionCache, default_cache_directory
+
+    if optimize_images and not images.is_available():
+        click.echo("Pillow is required to optimize images, install it with: pip install epub2sphinx[images]")
+        exit(1)
+    input_files = find_input_files(inputs, manifest_file)
+    if not input_files:
+        click.echo("No epub files to convert. Aborting!")
+        exit(1)
+    output_directory = os.path.abspath(output_directory)
+    summary_file = summary_file or os.path.join(output_directory, "summary.json")
+    click.echo("Converting {} books to {}".format(len(input_files), output_directory))
+
+    cache = None
+    if not no_cache:
+        cache = ConversionCache(cache_dir or default_cache_directory(), cache_size * 1024 * 1024)
+
+    def report(result):
+        click.echo("[{}] {} {}".format(result['status'], result['input'], result.get('error', '')))
+
+    summary = convert_books(input_files, output_directory, sphinx_theme_name.lower(), include_custom_css, build,
+                            overwrite, max_books=max_books, executor=executor, jobs=jobs, on_result=report,
+                            batch_size=batch_size, cache=cache, engine=engine, optimize_images=optimize_images,
+                            max_image_size=max_image_size, image_format=image_format,
+                            max_page_size=max_page_size and max_page_size * 1024, pipeline=pipeline,
+                            pandoc_backend=pandoc_backend)
+    write_summary(summary, summary_file)
+    click.echo("Converted {} books in {:.2f}s ({} failed, {} skipped). Summary written to {}".format(
+        summary['succeeded'], summary['total_time'], summary['failed'], summary['skipped'], summary_file))
+    if summary['failed']:
+        exit(1)
+
+
+@click.command()
+@click.option('--host', default="127.0.0.1", help=constants.cli_option_server_host_help, show_default=True)
+@click.option('-p', '--port', type=click.IntRange(min=0), default=8765, help=constants.cli_option_server_port_help, show_default=True)
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False), help=constants.cli_option_socket_help)
+@click.option('--root', 'roots', multiple=True, type=click.Path(exists=True, file_okay=False), help=constants.cli_option_root_help)
+@click.option('--max-jobs', type=click.IntRange(min=1), default=2, help=constants.cli_option_max_jobs_help, show_default=True)
+@click.option('--max-queue', type=click.IntRange(min=0), default=16, help=constants.cli_option_max_queue_help, show_default=True)
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None, help=constants.cli_option_jobs_help)
+@click.option('--executor', type=click.Choice(EXECUTOR_BACKENDS), default='thread', help=constants.cli_option_executor_help, show_default=True)
+@click.option('--batch-size', type=click.IntRange(min=1), default=16, help=constants.cli_option_batch_size_help, show_default=True)
+@click.option('--cache-dir', type=click.Path(file_okay=False), help=constants.cli_option_cache_dir_help)
+@click.option('--cache-size', type=click.IntRange(min=0), default=512, help=constants.cli_option_cache_size_help, show_default=True)
+@click.option('--no-cache', is_flag=True, help=constants.cli_option_no_cache_help)
+@click.option('--engine', type=click.Choice(ENGINES), default='auto', help=constants.cli_option_engine_help, show_default=True)
+@click.option('--pipeline', is_flag=True, help=constants.cli_option_pipeline_help)
+@click.option('--pandoc-backend', type=click.Choice(PANDOC_BACKENDS), default='process', help=constants.cli_option_pandoc_backend_help, show_default=True)
+@click.version_option(package_name='epub2sphinx')
+def serve_converter(host, port, socket_path, roots, max_jobs, max_queue, jobs, executor, batch_size, cache_dir, cache_size,
+                    no_cache, engine, pipeline, pandoc_backend):
+    '''\b
+        Run a resident conversion service that accepts jobs over a local HTTP API.
+        POST /jobs queues a job, GET /jobs/<id> returns its status and DELETE /jobs/<id> cancels it.
+    '''
+    from epub2sphinx.cache import ConversionCache, default_cache_directory
+    from epub2sphinx.server import ConversionService, make_server
+
+    cache = None
+    if not no_cache:
+        cache = ConversionCache(cache_dir or default_cache_directory(), cache_size * 1024 * 1024)
+    service = ConversionService(max_jobs=max_jobs, max_queue=max_queue, executor=executor, jobs=jobs,
+                                batch_size=batch_size, cache=cache, engine=engine, pipeline=pipeline,
+                                pandoc_backend=pandoc_backend, roots=roots)
+    server = make_server(service, host, port, socket_path)
+    if socket_path:
+        click.echo("Conversion service listening on {}".format(socket_path))
     else:
-        shutil.copytree(build_directory, output_directory)
-    temp_directory.cleanup()
+        click.echo("Conversion service listening on http://{}:{}".format(*server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("Stopping the conversion service")
+    finally:
+        server.server_close()
+        service.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+@click.command()
+@click.argument('inputs', nargs=-1, type=click.Path(exists=True))
+@click.option('-m', '--manifest', 'manifest_file', type=click.Path(exists=True, dir_okay=False), help=constants.cli_option_manifest_help)
+@click.option('-o', '--output', 'output_file', type=click.File('w'), default='-', help=constants.cli_option_inspect_output_help)
+@click.option('--lines', is_flag=True, help=constants.cli_option_inspect_lines_help)
+@click.option('-j', '--jobs', type=click.IntRange(min=1), default=None, help=constants.cli_option_jobs_help)
+@click.option('--executor', type=click.Choice(EXECUTOR_BACKENDS), default='process', help=constants.cli_option_inspect_executor_help, show_default=True)
+@click.version_option(package_name='epub2sphinx')
+def inspect(inputs, manifest_file, output_file, lines, jobs, executor):
+    '''\b
+        Print the metadata and the table of contents of epub files as JSON, without converting them.
+        Kindly provide the epub files or directories containing epub files as the arguments to this command.
+    '''
+    import json
+    from epub2sphinx.bulk import find_input_files
+    from epub2sphinx.metadata import inspect_books
+
+    input_files = find_input_files(inputs, manifest_file)
+    results = inspect_books(input_files, executor=executor, jobs=jobs)
+    if lines:
+        for result in results:
+            output_file.write(json.dumps(result) + "\n")
+    else:
+        json.dump(list(results), output_file, indent=2)
+        output_file.write("\n")
+
+
+def sphinx_project_directory(output_directory: str) -> str:
+    """
+    Returns the directory where the Sphinx project is kept between incremental builds.
+
+    :param str output_directory: The directory of the HTML output
+    :return: the path of the Sphinx project next to the output directory
+    :rtype: str
+    """
+    return output_directory.rstrip(os.path.sep) + ".sphinx"
+
+
+def sync_directory(source_directory: str, destination_directory: str):
+    """
+    Copy the files that changed in the source directory to the destination directory
+    and remove the files that are no longer present in the source directory.
+
+    :param str source_directory: The directory to copy from
+    :param str destination_directory: The directory to copy to
+    """
+    copied_files = set()
+    for directory, _, files in os.walk(source_directory):
+        relative_directory = os.path.relpath(directory, source_directory)
+        os.makedirs(os.path.join(destination_directory, relative_directory), exist_ok=True)
+        for file_name in files:
+            source_file = os.path.join(directory, file_name)
+            destination_file = os.path.normpath(os.path.join(destination_directory, relative_directory, file_name))
+            copied_files.add(destination_file)
+            source_stat = os.stat(source_file)
+            if os.path.isfile(destination_file):
+                destination_stat = os.stat(destination_file)
+                if (source_stat.st_size == destination_stat.st_size and
+                        int(source_stat.st_mtime) == int(destination_stat.st_mtime)):
+                    continue
+            shutil.copy2(source_file, destination_file)
+    for directory, _, files in os.walk(destination_directory):
+        for file_name in files:
+            destination_file = os.path.normpath(os.path.join(directory, file_name))
+            if destination_file not in copied_files:
+                os.remove(destination_file)
 
 
 def check_port_availability(host: str, port: int):
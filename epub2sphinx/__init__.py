@@ -1,3 +1,17 @@
-from .book import Book
-from .chapter import Chapter
-from .convert import Converter
+import importlib
+
+# The classes are imported on first use, so that importing a submodule (like the
+# constants used by the command line) does not load the conversion dependencies
+lazy_imports = {
+    'Book': '.book',
+    'Chapter': '.chapter',
+    'Converter': '.convert',
+}
+
+__all__ = list(lazy_imports)
+
+
+def __getattr__(name):
+    if name in lazy_imports:
+        return getattr(importlib.import_module(lazy_imports[name], __name__), name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
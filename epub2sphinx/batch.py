@@ -0,0 +1,216 @@
+import re
+import uuid
+
+from .chapter import convert_html, convert_html_fast, get_reference, preprocess, split_definitions
+from .profiling import record_time
+
+body_pattern = re.compile(r"<body[^>]*>(.*)</body>", re.DOTALL|re.IGNORECASE)
+image_substitution_pattern = re.compile(r"\|image\d+\|")
+
+
+def get_body(html_content):
+    """Returns the content of the body element of a XHTML document
+
+    :param html_content: XHTML document
+    :type html_content: str
+
+    :returns: Content of the body, or the whole document if there is no body
+    :rtype: str
+    """
+    match = body_pattern.search(html_content)
+    if match:
+        return match.group(1)
+    return html_content
+
+
+def renumber_images(rst_content):
+    """Renumber the image substitutions generated by pandoc so that they start from 1,
+    as they would if the chapter was converted on its own
+
+    :param rst_content: ReST content of a chapter
+    :type rst_content: str
+
+    :returns: ReST content with renumbered image substitutions
+    :rtype: str
+    """
+    names = {}
+    return re.sub(image_substitution_pattern,
+                  lambda match: names.setdefault(match.group(0), "|image{}|".format(len(names) + 1)),
+                  rst_content)
+
+
+def join_html_batch(html_contents):
+    """Join many preprocessed HTML documents into a single document, separated by unique split markers
+
+    :param html_contents: List of preprocessed HTML documents
+    :type html_contents: list
+
+    :returns: The split marker and the joined HTML document
+    :rtype: (str, str)
+    """
+    marker = "EPUB2SPHINXSPLIT" + uuid.uuid4().hex + "N"
+    html_content = "".join("<p>{}{}</p>\n{}\n".format(marker, index, get_body(content))
+                           for index, content in enumerate(html_contents))
+    html_content += "<p>{}{}</p>\n".format(marker, len(html_contents))
+    return marker, html_content
+
+
+def split_rst_batch(rst_content, marker, count):
+    """Split the ReST output of a joined HTML document back into the ReST documents.
+    The definitions placed at the end of the document by pandoc are moved to the
+    documents that refer them.
+
+    :param rst_content: ReST content of the document joined by :func:`join_html_batch`
+    :type rst_content: str
+
+    :param marker: Split marker of the joined document
+    :type marker: str
+
+    :param count: Number of joined documents
+    :type count: int
+
+    :returns: List of ReST documents, or None if the markers cannot be found in the output
+    :rtype: list
+    """
+    parts = re.split(r"^[ \t]*" + marker + r"(\d+)[ \t]*$", rst_content, flags=re.MULTILINE)
+    if [int(index) for index in parts[1::2]] != list(range(count + 1)):
+        return None
+
+    contents = [part.strip('\n') for part in parts[2:-1:2]]
+    for label, definition in split_definitions(parts[-1]):
+        reference = get_reference(label)
+        referring = [index for index, content in enumerate(contents) if reference in content]
+        for index in referring or [len(contents) - 1]:
+            contents[index] += '\n\n' + definition
+    return [renumber_images(content) + '\n' if content else ''
+            for content in contents]
+
+
+def convert_html_batch(html_contents, pandoc=None):
+    """Convert many preprocessed HTML documents into ReST with a single pandoc call
+
+    The documents are joined with unique split markers and the ReST output is split back.
+    If the markers cannot be found in the output, the documents are converted one by one.
+
+    :param html_contents: List of preprocessed HTML documents
+    :type html_contents: list
+
+    :param pandoc: Pool of pandoc workers, None starts pandoc for each call
+    :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+
+    :returns: List of ReST documents
+    :rtype: list
+    """
+    if len(html_contents) == 1:
+        return [convert_html(html_contents[0], pandoc)]
+    marker, html_content = join_html_batch(html_contents)
+    rst_contents = split_rst_batch(convert_html(html_content, pandoc), marker, len(html_contents))
+    if rst_contents is None:
+        return [convert_html(content, pandoc) for content in html_contents]
+    return rst_contents
+
+
+def convert_batch(chapters, cache=None, engine='auto', pandoc=None):
+    """Convert the XHTML content of many chapters into ReST with a single pandoc call.
+    The chapters converted in Python or found in the cache are not sent to pandoc.
+
+    :param chapters: List of chapters to convert
+    :type chapters: list
+
+    :param cache: Conversion cache to use, if any
+    :type cache: class:`epub2sphinx.cache.ConversionCache`
+
+    :param engine: Conversion engine, one of :data:`epub2sphinx.constants.ENGINES`
+    :type engine: str
+
+    :param pandoc: Pool of pandoc workers, None starts pandoc for each call
+    :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+
+    :returns: The converted chapters
+    :rtype: list
+    """
+    pending = prepare_batch(chapters, cache, engine)
+    if pending:
+        batch_timings = {}
+        with record_time(batch_timings, 'pandoc'):
+            rst_contents = convert_html_batch([html_content for _, html_content in pending], pandoc)
+        finish_batch(pending, rst_contents, batch_timings['pandoc'], cache)
+    return chapters
+
+
+def prepare_batch(chapters, cache=None, engine='auto'):
+    """Preprocess the chapters of a batch and convert the ones that do not need pandoc,
+    in Python or from the cache
+
+    :param chapters: List of chapters to convert
+    :type chapters: list
+
+    :param cache: Conversion cache to use, if any
+    :type cache: class:`epub2sphinx.cache.ConversionCache`
+
+    :param engine: Conversion engine, one of :data:`epub2sphinx.constants.ENGINES`
+    :type engine: str
+
+    :returns: List of (chapter, preprocessed HTML content) tuples of the chapters left for pandoc
+    :rtype: list
+    """
+    pending = []
+    for chapter in chapters:
+        with record_time(chapter.timings, 'preprocess'):
+            html_content = preprocess(chapter.content)
+        with record_time(chapter.timings, 'convert'):
+            content = convert_html_fast(html_content, engine)
+            if content is not None:
+                chapter.content = content
+                chapter.converted_by = 'python'
+                continue
+            content = cache.get(html_content) if cache else None
+            if content is None:
+                pending.append((chapter, html_content))
+            else:
+                chapter.content = content
+                chapter.converted_by = 'cache'
+    return pending
+
+
+def finish_batch(pending, rst_contents, pandoc_timing, cache=None):
+    """Store the ReST content converted by pandoc in the chapters of a batch, and in the cache
+
+    :param pending: List of (chapter, preprocessed HTML content) tuples returned by :func:`prepare_batch`
+    :type pending: list
+
+    :param rst_contents: ReST content of each pending chapter
+    :type rst_contents: list
+
+    :param pandoc_timing: Wall time and CPU time of the pandoc call
+    :type pandoc_timing: dict
+
+    :param cache: Conversion cache to use, if any
+    :type cache: class:`epub2sphinx.cache.ConversionCache`
+    """
+    # The time of the pandoc call is shared by the chapters according to their size
+    total_size = sum(len(html_content) for _, html_content in pending) or 1
+    for (chapter, html_content), rst_content in zip(pending, rst_contents):
+        share = len(html_content) / total_size
+        chapter.timings['pandoc'] = {name: value * share for name, value in pandoc_timing.items()}
+        chapter.content = rst_content
+        chapter.converted_by = 'pandoc'
+        if cache:
+            cache.put(html_content, rst_content)
+
+
+def make_batches(chapters, batch_size):
+    """Split the chapters into batches to convert together
+
+    :param chapters: List of chapters
+    :type chapters: list
+
+    :param batch_size: Maximum number of chapters in a batch
+    :type batch_size: int
+
+    :returns: List of batches
+    :rtype: list
+    """
+    batch_size = max(batch_size, 1)
+    return [chapters[index:index + batch_size]
+            for index in range(0, len(chapters), batch_size)]
@@ -2,7 +2,7 @@ import datetime
 import ebooklib
 import re
 
-from ebooklib import epub
+from .reader import read_epub
 
 def escape_quotes(text):
     """Function to escape any ' or " symbols present in the string
@@ -46,7 +46,7 @@ def get_chapter_names_and_subsections(epub):
             for sub_item in item[1]:
                 subsubsections = get_names_and_subsections(sub_item)
                 if isinstance(subsubsections, list):
-                    subsections.append(*subsubsections)
+                    subsections.extend(subsubsections)
                 else:
                     subsections.append(subsubsections)
         return subsections
@@ -58,7 +58,7 @@ def get_chapter_names_and_subsections(epub):
 class Book:
     """This class represents an epub book.
 
-    :param epub: EpubBook instance of the file
+    :param epub: EpubBook instance of the file, its items are read on demand
     :type epub: class:`ebooklib.epub.EpubBook`
 
     :param title: Title of the book
@@ -75,6 +75,18 @@ class Book:
 
     :param rights: Book Copyright or License details
     :type rights: str
+
+    :param items_by_id: (Item ID => EpubItem) Mapping
+    :type items_by_id: dict
+
+    :param items_by_href: (File name => EpubItem) Mapping
+    :type items_by_href: dict
+
+    :param parent_sections: (Subsection file => Section file) Mapping
+    :type parent_sections: dict
+
+    :param archive: Archive the items of the epub are read from, closed by :meth:`close`
+    :type archive: class:`epub2sphinx.reader.EpubArchive`
     """
     def __init__(self, file_name):
         """Book Constructor
@@ -82,9 +94,20 @@ class Book:
         :param file_name: Name of the epub file
         :type file_name: str
         """
-        self.epub = epub.read_epub(file_name)
+        self.epub = read_epub(file_name)
+        self.archive = self.epub.archive
         self.title = escape_quotes(self.epub.title)
         self.chapter_names, self.subsections = get_chapter_names_and_subsections(self.epub)
+        # Indexes for constant time lookups, the first item wins like in ebooklib's lookups
+        self.items_by_id = {}
+        self.items_by_href = {}
+        for item in self.epub.get_items():
+            self.items_by_id.setdefault(item.get_id(), item)
+            self.items_by_href.setdefault(item.get_name(), item)
+        self.parent_sections = {}
+        for section, subsections in self.subsections.items():
+            for subsection in subsections:
+                self.parent_sections.setdefault(subsection, section)
         self.toctree = []
         try:
             self.author = escape_quotes(self.epub.get_metadata('DC', 'creator')[0][0])
@@ -97,3 +120,13 @@ class Book:
                 self.rights = datetime.datetime.now().strftime("%Y") + " " + self.author
             else:
                 self.rights = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the epub file once the content of its items is not read anymore"""
+        self.archive.close()
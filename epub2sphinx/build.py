@@ -0,0 +1,169 @@
+import io
+import os
+import re
+import shutil
+import threading
+
+from contextlib import contextmanager, nullcontext
+from sphinx.application import Sphinx
+from sphinx.builders import html as html_builder
+from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+warning_pattern = re.compile(r"^(?:(?P<location>.+?): )?(?P<level>WARNING|ERROR|SEVERE|CRITICAL): (?P<message>.*)$")
+location_line_pattern = re.compile(r"^(?P<file>.*?):(?P<line>\d+)$")
+# Sphinx colours the warnings when the terminal supports it, even if they are written to a buffer
+escape_sequence_pattern = re.compile(r"\x1b\[[0-9;]*m")
+
+# Sphinx and docutils keep global state (like the registered directives and the logging
+# handlers) while building, so the in-process builds run one at a time
+build_lock = threading.Lock()
+
+
+class BuildResult:
+    """This class holds the result of a Sphinx build
+
+    :param html_path: Path of the HTML output, or None if the build failed
+    :type html_path: str
+
+    :param warnings: Warnings and errors reported by Sphinx, each one is a dict with
+        the level, file, line and message
+    :type warnings: list
+
+    :param error: Description of the exception that stopped the build, if any
+    :type error: str
+    """
+    def __init__(self, html_path, warnings, error=None):
+        """BuildResult Constructor
+        """
+        self.html_path = html_path
+        self.warnings = warnings
+        self.error = error
+
+    @property
+    def succeeded(self):
+        return self.html_path is not None
+
+    @property
+    def errors(self):
+        """Returns the reported problems with a level higher than warning
+
+        :rtype: list
+        """
+        return [warning for warning in self.warnings if warning['level'] != 'WARNING']
+
+
+def parse_warnings(warning_output):
+    """Parse the warning output of Sphinx into a list of warnings.
+    Lines that do not start a warning are added to the message of the previous warning.
+
+    :param warning_output: Text written by Sphinx to its warning stream
+    :type warning_output: str
+
+    :returns: List of warnings, each one is a dict with the level, file, line and message
+    :rtype: list
+    """
+    warnings = []
+    for line in escape_sequence_pattern.sub('', warning_output).splitlines():
+        match = warning_pattern.match(line)
+        if match:
+            location = match.group('location') or ''
+            location_match = location_line_pattern.match(location)
+            warnings.append({
+                'level': match.group('level'),
+                'file': location_match.group('file') if location_match else location or None,
+                'line': int(location_match.group('line')) if location_match else None,
+                'message': match.group('message'),
+            })
+        elif warnings and line.strip():
+            warnings[-1]['message'] += '\n' + line
+    return warnings
+
+
+def link_file(source, destination):
+    """Hard link the destination to the source file, or copy the file if it cannot be linked
+    (like across filesystems or on filesystems without hard links)
+
+    :param source: Existing file
+    :type source: str
+
+    :param destination: Name of the linked file, an existing file is replaced
+    :type destination: str
+
+    :returns: True if the file was linked, False if it was copied
+    :rtype: bool
+    """
+    if os.path.lexists(destination):
+        if os.path.exists(destination) and os.path.samefile(source, destination):
+            return True
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+        return True
+    except OSError:
+        shutil.copyfile(source, destination)
+        return False
+
+
+@contextmanager
+def link_source_files(source_directory):
+    """Context manager that makes the HTML builder of Sphinx hard link the files it copies
+    from the source directory (like the images), instead of writing a second copy of them.
+    Files from other places (like the theme) are still copied.
+
+    :param source_directory: Source directory of the Sphinx project
+    :type source_directory: str
+    """
+    copyfile = html_builder.copyfile
+    source_directory = os.path.join(os.path.realpath(source_directory), '')
+
+    def link_or_copy_file(source, destination, *args, **kwargs):
+        if os.path.realpath(source).startswith(source_directory) and os.path.isfile(source):
+            link_file(source, destination)
+        else:
+            copyfile(source, destination, *args, **kwargs)
+
+    html_builder.copyfile = link_or_copy_file
+    try:
+        yield
+    finally:
+        html_builder.copyfile = copyfile
+
+
+def build_html(build_directory, jobs=None, link_images=True):
+    """Build the HTML output of a generated Sphinx project in this process,
+    like `make html` does
+
+    :param build_directory: Directory of the Sphinx project (containing the source directory)
+    :type build_directory: str
+
+    :param jobs: Number of processes used by Sphinx to read and write the documents,
+        None uses the number of processors
+    :type jobs: int
+
+    :param link_images: Hard link the images of the source directory into the HTML output
+        instead of copying them
+    :type link_images: bool
+
+    :returns: Result of the build
+    :rtype: class:`BuildResult`
+    """
+    source_directory = os.path.join(build_directory, 'source')
+    html_path = os.path.join(build_directory, 'build', 'html')
+    doctree_directory = os.path.join(build_directory, 'build', 'doctrees')
+    status_output, warning_output = io.StringIO(), io.StringIO()
+    status_code, error = 1, None
+    with build_lock:
+        try:
+            with patch_docutils(source_directory), docutils_namespace(), \
+                    link_source_files(source_directory) if link_images else nullcontext():
+                app = Sphinx(source_directory, source_directory, html_path, doctree_directory, 'html',
+                             status=status_output, warning=warning_output,
+                             parallel=jobs or os.cpu_count() or 1)
+                app.build()
+                status_code = app.statuscode
+        except Exception as exception:
+            error = "{}: {}".format(type(exception).__name__, exception)
+    warnings = parse_warnings(warning_output.getvalue())
+    if status_code == 0 and os.path.isdir(html_path):
+        return BuildResult(html_path, warnings)
+    return BuildResult(None, warnings, error)
@@ -0,0 +1,230 @@
+import json
+import os
+import time
+import traceback
+
+from .build import build_html
+from .convert import ConversionCancelled, Converter
+from .executor import get_executor
+from .pandoc_workers import get_pandoc_backend
+from .output import publish_directory, staging_directory
+from concurrent.futures import ThreadPoolExecutor
+
+
+def find_input_files(inputs, manifest_file=None):
+    """Returns the epub files given as files, directories or in a manifest file
+
+    :param inputs: List of epub files and directories to search for epub files
+    :type inputs: list
+
+    :param manifest_file: File that contains an epub path on each line, if any
+    :type manifest_file: str
+
+    :returns: List of epub files
+    :rtype: list
+    """
+    paths = list(inputs)
+    if manifest_file:
+        with open(manifest_file) as manifest:
+            paths.extend(line.strip() for line in manifest
+                         if line.strip() and not line.startswith('#'))
+    input_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in sorted(os.walk(path)):
+                input_files.extend(os.path.join(directory, file_name)
+                                   for file_name in sorted(files)
+                                   if file_name.lower().endswith('.epub'))
+        else:
+            input_files.append(path)
+    return input_files
+
+
+def get_output_directories(input_files, output_root):
+    """Returns a unique output directory for every input file
+
+    :param input_files: List of epub files
+    :type input_files: list
+
+    :param output_root: Directory where the output directories are created
+    :type output_root: str
+
+    :returns: List of output directories
+    :rtype: list
+    """
+    output_directories = []
+    used_names = set()
+    for input_file in input_files:
+        name = os.path.basename(input_file).removesuffix('.epub')
+        unique_name, index = name, 1
+        while unique_name in used_names:
+            index += 1
+            unique_name = "{}-{}".format(name, index)
+        used_names.add(unique_name)
+        output_directories.append(os.path.join(output_root, unique_name))
+    return output_directories
+
+
+def convert_book(input_file, output_directory, sphinx_theme_name, include_custom_css, build,
+                 overwrite, build_jobs=None, **converter_options):
+    """Convert a single epub as part of a bulk conversion
+
+    :param input_file: Name of the epub file
+    :type input_file: str
+
+    :param output_directory: Directory to write the output to
+    :type output_directory: str
+
+    :param sphinx_theme_name: Name of the Sphinx theme
+    :type sphinx_theme_name: str
+
+    :param include_custom_css: Include the CSS and Fonts of the epub
+    :type include_custom_css: bool
+
+    :param build: Build the HTML output using Sphinx
+    :type build: bool
+
+    :param overwrite: Overwrite the output directory if present already
+    :type overwrite: bool
+
+    :param build_jobs: Number of processes used by Sphinx
+    :type build_jobs: int
+
+    :returns: Status and timings of the conversion
+    :rtype: dict
+    """
+    result = {'input': input_file, 'output': output_directory}
+    if os.path.isdir(output_directory):
+        if not overwrite:
+            result['status'] = 'skipped'
+            result['error'] = 'Output directory exists'
+            return result
+
+    # Every error of a book, including the staging and publishing of its output, fails only this book
+    try:
+        convert_and_publish(result, input_file, output_directory, sphinx_theme_name, include_custom_css,
+                            build, build_jobs, **converter_options)
+    except ConversionCancelled as exception:
+        result['status'] = 'cancelled'
+        result['error'] = str(exception)
+    except Exception as exception:
+        result['status'] = 'failed'
+        result['error'] = "{}: {}".format(type(exception).__name__, exception)
+        result['traceback'] = traceback.format_exc()
+    return result
+
+
+def convert_and_publish(result, input_file, output_directory, sphinx_theme_name, include_custom_css, build,
+                        build_jobs=None, **converter_options):
+    """Convert and build a book in a staging directory and publish it to its output directory,
+    see :func:`convert_book`
+
+    :param result: Result of the book, updated with its status and timings
+    :type result: dict
+
+    :raises ConversionCancelled: If the conversion was cancelled
+    """
+    with staging_directory(output_directory) as staging:
+        build_directory = os.path.join(staging, "output")
+        start_time = time.time()
+        try:
+            converter = Converter(input_file, build_directory, sphinx_theme_name, include_custom_css,
+                                  verbose=False, **converter_options)
+            converter.convert()
+        finally:
+            result['conversion_time'] = round(time.time() - start_time, 3)
+        result['chapters'] = len(converter.book.toctree)
+        result['python_conversions'] = converter.python_conversions
+        if converter.cache:
+            result['cache_hits'] = converter.cache_hits
+            result['cache_misses'] = converter.cache_misses
+        if converter.image_optimizer:
+            result['images'] = converter.image_optimizer.image_count
+            result['duplicate_images'] = converter.image_optimizer.duplicate_count
+            result['image_bytes_saved'] = converter.image_optimizer.bytes_saved
+
+        if converter.cancel_event is not None and converter.cancel_event.is_set():
+            raise ConversionCancelled("The conversion was cancelled before the build")
+        if build:
+            start_time = time.time()
+            build_result = build_html(build_directory, build_jobs)
+            result['build_time'] = round(time.time() - start_time, 3)
+            result['build_warnings'] = build_result.warnings
+            if not build_result.succeeded:
+                result['status'] = 'failed'
+                result['error'] = 'Sphinx build failed: {}'.format(
+                    build_result.error or "{} errors".format(len(build_result.errors)))
+                return
+            publish_directory(build_result.html_path, output_directory, staging)
+        else:
+            publish_directory(build_directory, output_directory, staging)
+    result['status'] = 'ok'
+
+
+def convert_books(input_files, output_root, sphinx_theme_name, include_custom_css=False, build=True,
+                  overwrite=False, max_books=4, executor='thread', jobs=None, on_result=None,
+                  pandoc_backend='process', **converter_options):
+    """Convert many epub files using one worker pool shared by all the books.
+    A failure in one book does not stop the conversion of the other books.
+
+    :param input_files: List of epub files
+    :type input_files: list
+
+    :param output_root: Directory where the output directory of each book is created
+    :type output_root: str
+
+    :param max_books: Maximum number of books converted at the same time
+    :type max_books: int
+
+    :param executor: Backend of the shared worker pool, see :func:`get_executor`
+    :type executor: str
+
+    :param jobs: Number of workers in the shared worker pool
+    :type jobs: int
+
+    :param pandoc_backend: Backend of the pandoc workers shared by the books, see :func:`get_pandoc_backend`
+    :type pandoc_backend: str
+
+    :param on_result: Function called with the result of each book when it finishes
+    :type on_result: function
+
+    :returns: Summary with the status and timings of each book
+    :rtype: dict
+    """
+    start_time = time.time()
+    output_directories = get_output_directories(input_files, output_root)
+    os.makedirs(output_root, exist_ok=True)
+
+    def convert(input_file, output_directory):
+        result = convert_book(input_file, output_directory, sphinx_theme_name, include_custom_css,
+                              build, overwrite, build_jobs=jobs, executor=shared_executor,
+                              pandoc_backend=shared_pandoc or 'process', **converter_options)
+        if on_result:
+            on_result(result)
+        return result
+
+    with get_executor(executor, jobs) as shared_executor, \
+            get_pandoc_backend(pandoc_backend, jobs) as shared_pandoc:
+        with ThreadPoolExecutor(max_workers=max_books) as book_executor:
+            results = list(book_executor.map(convert, input_files, output_directories))
+
+    return {
+        'total_time': round(time.time() - start_time, 3),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] == 'failed' for result in results),
+        'skipped': sum(result['status'] == 'skipped' for result in results),
+        'books': results,
+    }
+
+
+def write_summary(summary, summary_file):
+    """Write the summary of a bulk conversion as JSON
+
+    :param summary: Summary returned by :func:`convert_books`
+    :type summary: dict
+
+    :param summary_file: Name of the JSON file
+    :type summary_file: str
+    """
+    with open(summary_file, 'w') as summary_output:
+        json.dump(summary, summary_output, indent=2)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import pypandoc
+import tempfile
+
+CACHE_VERSION = 1
+PANDOC_OPTIONS = ('html', 'rst')
+
+
+def default_cache_directory():
+    """Returns the default directory of the conversion cache
+
+    :returns: $XDG_CACHE_HOME/epub2sphinx or ~/.cache/epub2sphinx
+    :rtype: str
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'epub2sphinx')
+
+
+class ConversionCache:
+    """On-disk cache of the ReST content of converted chapters.
+
+    The entries are keyed by a hash of the preprocessed chapter HTML, the pandoc
+    version and the conversion options. The cache only holds plain data, so that
+    it can be sent to worker processes.
+
+    :param directory: Directory where the cache entries are stored
+    :type directory: str
+
+    :param max_size: Maximum size of the cache in bytes
+    :type max_size: int
+
+    :param pandoc_version: Version of pandoc used for the conversion
+    :type pandoc_version: str
+    """
+    def __init__(self, directory, max_size=512 * 1024 * 1024):
+        """ConversionCache Constructor
+
+        :param directory: Directory where the cache entries are stored
+        :type directory: str
+
+        :param max_size: Maximum size of the cache in bytes
+        :type max_size: int
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.pandoc_version = pypandoc.get_pandoc_version()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, html_content):
+        """Returns the path of the cache entry for the given HTML content
+
+        :param html_content: Preprocessed HTML content of a chapter
+        :type html_content: str
+
+        :returns: Path of the cache entry
+        :rtype: str
+        """
+        key = hashlib.sha256()
+        key.update("{}\0{}\0{}\0".format(CACHE_VERSION, self.pandoc_version,
+                                          "\0".join(PANDOC_OPTIONS)).encode())
+        key.update(html_content.encode())
+        digest = key.hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.rst')
+
+    def get(self, html_content):
+        """Returns the cached ReST content for the given HTML content
+
+        :param html_content: Preprocessed HTML content of a chapter
+        :type html_content: str
+
+        :returns: ReST content, or None if it is not in the cache
+        :rtype: str
+        """
+        path = self.get_path(html_content)
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as cache_file:
+                content = cache_file.read()
+            # Mark the entry as recently used
+            os.utime(path)
+            return content
+        except OSError:
+            return None
+
+    def put(self, html_content, rst_content):
+        """Stores the ReST content for the given HTML content
+
+        :param html_content: Preprocessed HTML content of a chapter
+        :type html_content: str
+
+        :param rst_content: ReST content of the chapter
+        :type rst_content: str
+        """
+        path = self.get_path(html_content)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so that other workers never read partial entries
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8', newline='') as cache_file:
+            cache_file.write(rst_content)
+        os.replace(temp_path, path)
+
+    def prune(self):
+        """Removes the least recently used entries until the cache fits in max_size
+        """
+        entries = []
+        for directory, _, files in os.walk(self.directory):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
@@ -1,16 +1,159 @@
+import copy
 import os
+import posixpath
 import pypandoc
 import re
 
-href_pattern = re.compile(r"(href=[\"\'][\w/.@-]*html)([#\'\"])")
-svg_pattern = re.compile(r"\<svg[^\>]*\>(.*)\</svg\>", re.MULTILINE|re.DOTALL)
-epub_metadata_pattern = re.compile(r"epub:[a-zA-Z]+=\"[^\"]*\"")
+from .htmlrst import html_to_rst
+from .manifest import update_file
+from .profiling import record_time
+
+# The tokens rewritten by preprocess, all matched in a single pass over the chapter
+# Every alternative starts with a literal, so that the regex engine only tries to match
+# at the positions of these characters
+preprocess_pattern = re.compile(r"href=[\"\'][\w/.@-]*html(?=[#\'\"])"
+                                r"|epub:[a-zA-Z]+=\"[^\"]*\""
+                                r"|<svg(?=[\s/>])[^>]*>"
+                                r"|</svg\s*>"
+                                r"|<image(?=[\s/>])"
+                                r"|xlink:href")
+# The label of a ReST definition: a substitution, a footnote or a link target
+definition_label_pattern = re.compile(r"\.\. (\|[^|]+\||\[[^\]]+\]|_[^:]+)(?:[ :]|$)")
+# A ReST section title: a line of text underlined with a repeated punctuation character
+heading_pattern = re.compile(r"^(\S.*)\n(([!-/:-@\[-`{-~])\3*)\n", re.MULTILINE)
+
+
+def preprocess(content):
+    """Rewrite the chapter XHTML so that pandoc can convert it to ReST, in a single pass:
+    the links to other chapters get the .html suffix of the ReST documents, the epub attributes
+    are removed and the SVG tags are removed, keeping their images as HTML images.
+
+    :param content: XHTML content of the chapter
+    :type content: str
+
+    :returns: HTML content ready for conversion
+    :rtype: str
+    """
+    svg_depth = 0
+
+    def rewrite(match):
+        nonlocal svg_depth
+        token = match[0]
+        first_character = token[0]
+        if first_character == 'h':
+            return token + '.html'
+        elif first_character == 'e':
+            return ''
+        elif token.startswith('<svg'):
+            if not token.endswith('/>'):
+                svg_depth += 1
+            return ''
+        elif token.startswith('</svg'):
+            svg_depth = max(svg_depth - 1, 0)
+            return ''
+        elif svg_depth == 0:
+            # Only the images of the SVG elements are rewritten
+            return token
+        return '<img' if token == '<image' else 'src'
+
+    return preprocess_pattern.sub(rewrite, content)
+
+
+def split_definitions(rst_content):
+    """Split the trailing ReST definitions that pandoc places at the end of a document
+    (substitutions, footnotes and link targets) into separate blocks
+
+    :param rst_content: ReST content that contains only definitions
+    :type rst_content: str
+
+    :returns: List of (label, definition) tuples
+    :rtype: list
+    """
+    definitions = []
+    for line in rst_content.splitlines():
+        match = definition_label_pattern.match(line)
+        if match:
+            definitions.append([match.group(1), line])
+        elif definitions and (line.startswith(' ') or not line.strip()):
+            definitions[-1][1] += '\n' + line
+    return [(label, definition.rstrip()) for label, definition in definitions]
+
+
+def get_reference(label):
+    """Returns the text used to refer a definition with the given label
+
+    :param label: Label of a ReST definition (like |image1|, [1] or _name)
+    :type label: str
+
+    :returns: Reference text to search for
+    :rtype: str
+    """
+    if label.startswith('['):
+        return label + '_'
+    elif label.startswith('_'):
+        return label[1:] + '_'
+    return label
+
+
+def split_trailing_definitions(rst_content):
+    """Split the ReST definitions that pandoc places at the end of a document from its content
+
+    :param rst_content: ReST content
+    :type rst_content: str
+
+    :returns: The content without the trailing definitions, and the list of (label, definition) tuples
+    :rtype: (str, list)
+    """
+    lines = rst_content.splitlines(keepends=True)
+    start = len(lines)
+    # The definitions are followed by their indented options and blank lines
+    while start and (not lines[start - 1].strip() or lines[start - 1].startswith(' ') or
+                     definition_label_pattern.match(lines[start - 1])):
+        start -= 1
+    while start < len(lines) and not definition_label_pattern.match(lines[start]):
+        start += 1
+    return ''.join(lines[:start]), split_definitions(''.join(lines[start:]))
+
+
+def convert_html(html_content, pandoc=None):
+    """Convert preprocessed HTML content into ReST using pandoc
+
+    :param html_content: Preprocessed HTML content
+    :type html_content: str
+
+    :param pandoc: Pool of pandoc workers, None starts pandoc for this conversion
+    :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+
+    :returns: ReST content
+    :rtype: str
+    """
+    if pandoc is not None:
+        return pandoc.convert(html_content)
+    return pypandoc.convert_text(html_content, 'rst', format='html')
+
+
+def convert_html_fast(html_content, engine='auto'):
+    """Convert preprocessed HTML content into ReST without pandoc, if the engine allows it
+
+    :param html_content: Preprocessed HTML content
+    :type html_content: str
+
+    :param engine: 'auto' converts simple HTML in Python, 'pandoc' always uses pandoc
+    :type engine: str
+
+    :returns: ReST content, or None if the content has to be converted by pandoc
+    :rtype: str
+    """
+    if engine == 'auto':
+        return html_to_rst(html_content)
+    elif engine == 'pandoc':
+        return None
+    raise ValueError("Unknown conversion engine: {}".format(engine))
+
 
 class Chapter:
     """This class represents an XHTML file in the epub's spine.
-
-    :param chapter_item: EpubItem instance of the chapter
-    :type chapter_item: class:`ebooklib.epub.EpubItem`
+    It only holds plain data, so that it can be sent to worker processes.
 
     :param title: Title of the chapter
     :type title: str
@@ -20,6 +163,25 @@ class Chapter:
 
     :param content: XHTML or ReST content of the chapter
     :type content: str
+
+    :param subchapters: Subsections that are merged with this chapter
+    :type subchapters: list
+
+    :param fragments: ReST content of the chapters merged with this chapter
+    :type fragments: list
+
+    :param toctree: Documents listed in the toctree at the end of the chapter,
+        relative to the directory of the chapter
+    :type toctree: list
+
+    :param size: Size of the XHTML content in bytes
+    :type size: int
+
+    :param converted_by: How the ReST content was generated: 'python', 'cache' or 'pandoc'
+    :type converted_by: str
+
+    :param timings: Wall time and CPU time of each conversion step of the chapter
+    :type timings: dict
     """
     def __init__(self, book, chapter_item):
         """Chapter Constructor
@@ -30,9 +192,15 @@ class Chapter:
         :param chapter_item: EpubItem of the chapter
         :type chapter_item: class:`ebooklib.epub.EpubItem`
         """
-        self.chapter_item = chapter_item
-        self.file = self.chapter_item.get_name()
-        self.content = self.chapter_item.get_content().decode()
+        self.file = chapter_item.get_name()
+        content = chapter_item.get_content()
+        self.size = len(content)
+        self.content = content.decode()
+        self.subchapters = []
+        self.fragments = []
+        self.toctree = []
+        self.converted_by = None
+        self.timings = {}
         if self.file in book.chapter_names.keys():
             self.title = book.chapter_names[self.file]
         elif self.content.find('epub:type="toc"') != -1:
@@ -40,38 +208,155 @@ class Chapter:
         else:
             self.title = None
 
-    def convert(self):
-        """Convert the XHTML chapter content into ReST
+    def convert(self, engine='auto', pandoc=None):
+        """Convert the XHTML chapter content into ReST.
+        Simple chapters are converted in Python, the others by pandoc.
+
+        :param engine: Conversion engine, one of :data:`epub2sphinx.constants.ENGINES`
+        :type engine: str
+
+        :param pandoc: Pool of pandoc workers, None starts pandoc for the conversion
+        :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+        """
+        with record_time(self.timings, 'preprocess'):
+            html_content = preprocess(self.content)
+        with record_time(self.timings, 'convert'):
+            self.content = convert_html_fast(html_content, engine)
+            if self.content is None:
+                self.content = convert_html(html_content, pandoc)
+                self.converted_by = 'pandoc'
+            else:
+                self.converted_by = 'python'
+
+    def get_rst(self):
+        """Returns the ReST content of the chapter along with its title
+
+        :returns: ReST content
+        :rtype: str
+        """
+        return ''.join(self.get_rst_parts())
+
+    def get_rst_parts(self):
+        """Returns the ReST content of the chapter along with its title as a list of parts,
+        so that the merged chapters are not copied into a single string
+
+        :returns: List of ReST content parts
+        :rtype: list
         """
-        html_content = re.sub(href_pattern, r"\1.html\2", self.content)
-        html_content = re.sub(epub_metadata_pattern, "", html_content)
-        if html_content.find("<svg") != -1:
-            html_content = re.sub(svg_pattern, r"\1", html_content)
-            html_content = html_content.replace("<image", "<img").replace("xlink:href", "src")
-        self.content = pypandoc.convert_text(html_content, 'rst', format='html')
+        # Add Chapter title
+        if not self.title:
+            self.title = "Unnamed chapter"
+        parts = ['*'*len(self.title)+'\n' +
+                 self.title+'\n' +
+                 '*'*len(self.title)+'\n',
+                 self.content] + self.fragments
+        if self.toctree:
+            parts.append('\n\n.. toctree::\n   :maxdepth: 1\n\n' +
+                         ''.join('   {}\n'.format(document) for document in self.toctree))
+        return parts
 
-    def write(self, source_directory):
-        """Write the ReST chapter content to output file
+    def write(self, source_directory, previous_hash=None):
+        """Write the ReST chapter content to output file.
+        The content is released once it is written.
 
         :param source_directory: The source directory for writing the output file
         :type source_directory: str
+
+        :param previous_hash: Hash of the file written in the previous run, if any.
+            The file is not written again if its content did not change.
+        :type previous_hash: str
+
+        :returns: Hash of the file content
+        :rtype: str
         """
-        with open(os.path.join(source_directory, self.file + '.rst'), 'x') as ch_file:
-            # Add Chapter title
-            if not self.title:
-                self.title = "Unnamed chapter"
-            ch_file.write('*'*len(self.title)+'\n')
-            ch_file.write(self.title+'\n')
-            ch_file.write('*'*len(self.title)+'\n')
+        content_hash = update_file(self.get_path(source_directory),
+                                   [part.encode() for part in self.get_rst_parts()],
+                                   previous_hash)
+        self.content = None
+        self.fragments = []
+        return content_hash
 
-            # Write ReST content
-            ch_file.write(self.content)
+    def get_path(self, source_directory):
+        """Returns the path of the output file
+
+        :param source_directory: The source directory for writing the output file
+        :type source_directory: str
+
+        :returns: Output filename
+        :rtype: str
+        """
+        return os.path.join(source_directory, self.file + '.rst')
 
     def merge(self, other_chapter):
-        """Merges a chapter's content with this chapter
+        """Merges a chapter's content with this chapter.
+        The content is appended to the fragments, which are joined only when writing.
 
         :param other_chapter: The other chapter
         :type other_chapter: class:`Chapter`
         """
-        self.content += other_chapter.content
-        del other_chapter
+        self.fragments.append(other_chapter.content)
+        self.fragments.extend(other_chapter.fragments)
+        self.toctree.extend(other_chapter.toctree)
+
+    def get_document_name(self, chapter):
+        """Returns the name of another chapter's document, relative to this chapter,
+        as used in a toctree
+
+        :param chapter: The other chapter
+        :type chapter: class:`Chapter`
+
+        :rtype: str
+        """
+        return posixpath.relpath(chapter.file, posixpath.dirname(self.file) or '.')
+
+    def split(self, max_size):
+        """Split the ReST content larger than the maximum size at its top level headings.
+        This chapter keeps the first page, the next pages are returned as new chapters
+        that are listed first in the toctree of this chapter. The definitions at the end of
+        the content (like the image substitutions) are added to every page that refers them.
+
+        :param max_size: Maximum size of a page in characters. A section larger than
+            the maximum size is not split.
+        :type max_size: int
+
+        :returns: List of the new pages
+        :rtype: list
+        """
+        content = ''.join([self.content] + self.fragments)
+        if len(content) <= max_size:
+            return []
+        content, definitions = split_trailing_definitions(content)
+        headings = [match for match in heading_pattern.finditer(content)
+                    if len(match.group(2)) >= len(match.group(1).rstrip())]
+        if not headings:
+            return []
+        # The adornment of the first heading is used by the top level sections
+        positions = [match.start() for match in headings if match.group(2)[0] == headings[0].group(2)[0]]
+        sections = [content[start:end] for start, end in zip([0] + positions, positions + [len(content)])]
+        page_contents = [sections[0]]
+        for section in sections[1:]:
+            if page_contents[-1] and len(page_contents[-1]) + len(section) > max_size:
+                page_contents.append(section)
+            else:
+                page_contents[-1] += section
+        for label, definition in definitions:
+            reference = get_reference(label)
+            referring = [index for index, page_content in enumerate(page_contents) if reference in page_content]
+            for index in referring or [len(page_contents) - 1]:
+                page_contents[index] = page_contents[index].rstrip('\n') + '\n\n' + definition + '\n'
+
+        self.content = page_contents[0]
+        self.fragments = []
+        pages = []
+        for index, page_content in enumerate(page_contents[1:], 2):
+            heading = heading_pattern.match(page_content)
+            page = copy.copy(self)
+            page.file = "{}-{}".format(self.file, index)
+            page.title = heading.group(1).strip()
+            page.content = page_content[heading.end():]
+            page.subchapters = []
+            page.toctree = []
+            page.timings = {}
+            pages.append(page)
+        self.toctree = [self.get_document_name(page) for page in pages] + self.toctree
+        return pages
@@ -1,3 +1,11 @@
+# Choices of the command line options, kept here so that the command line can be
+# set up without importing the conversion modules
+ENGINES = ('auto', 'pandoc')
+EXECUTOR_BACKENDS = ('thread', 'process', 'serial')
+PANDOC_BACKENDS = ('process', 'worker')
+PREVIEW_SERVERS = ('http.server', 'builtin')
+IMAGE_FORMATS = ('keep', 'webp')
+
 cli_option_output_directory_help = """\b
 The name of the output directory where the ReST file will be generated.
 Kindly make sure that the given directory is not existing already."""
@@ -20,4 +28,133 @@ Overwrite the output directory if present already
 """
 cli_option_port_help = """\b
 The port number on which the files will be served after conversion
+"""
+cli_option_jobs_help = """\b
+The number of workers used for the conversion and the Sphinx build.
+Defaults to the number of processors
+"""
+cli_option_executor_help = """\b
+Run the conversion in threads, in separate processes or serially.
+Use process to make use of all the processors for the preprocessing
+"""
+cli_option_batch_size_help = """\b
+The number of chapters converted together in a single pandoc call.
+Use 1 to convert each chapter separately
+"""
+cli_option_cache_dir_help = """\b
+The directory of the conversion cache.
+Defaults to ~/.cache/epub2sphinx
+"""
+cli_option_cache_size_help = """\b
+The maximum size of the conversion cache in MB.
+The least recently used entries are removed when it grows larger
+"""
+cli_option_no_cache_help = """\b
+Do not use the conversion cache
+"""
+cli_option_incremental_help = """\b
+Only rewrite the files that changed since the previous run.
+The Sphinx project is kept next to the output directory when building
+"""
+cli_option_manifest_help = """\b
+A file with the path of an epub file on each line
+"""
+cli_option_bulk_output_directory_help = """\b
+The directory where the output directory of each book will be created.
+"""
+cli_option_max_books_help = """\b
+The number of books converted at the same time
+"""
+cli_option_summary_help = """\b
+The JSON file where the status and timings of each book are written.
+Defaults to summary.json in the output directory
+"""
+cli_option_engine_help = """\b
+The engine that converts the chapters to ReST.
+auto converts simple chapters without pandoc and uses pandoc for the others,
+pandoc converts every chapter with pandoc
+"""
+cli_option_profile_help = """\b
+Print the wall time and CPU time of each stage, the slowest chapters
+and the peak memory usage
+"""
+cli_option_profile_json_help = """\b
+Write the profiling report, with the timings of every chapter, to this JSON file
+"""
+cli_option_profile_dump_help = """\b
+Write cProfile statistics of the conversion and the build to this file.
+They can be read with pstats or snakeviz
+"""
+cli_option_optimize_images_help = """\b
+Deduplicate identical images, downscale the large images and recompress them.
+Requires Pillow (pip install epub2sphinx[images]).
+Image references in the custom CSS are not rewritten
+"""
+cli_option_max_image_size_help = """\b
+The maximum width and height in pixels of the optimized images
+"""
+cli_option_image_format_help = """\b
+The format of the optimized images.
+keep recompresses the images in their format, webp converts them to WebP
+"""
+cli_option_server_host_help = """\b
+The address the conversion service listens on
+"""
+cli_option_server_port_help = """\b
+The port the conversion service listens on
+"""
+cli_option_socket_help = """\b
+Listen on this Unix socket instead of a TCP port
+"""
+cli_option_root_help = """\b
+A directory the input and output files of the jobs must be in, can be given several times.
+Defaults to the current directory. Any local user that can reach the service can overwrite the files in it
+"""
+cli_option_max_jobs_help = """\b
+The number of jobs converted at the same time
+"""
+cli_option_max_queue_help = """\b
+The number of jobs that can wait to be converted.
+New jobs are rejected when the queue is full
+"""
+cli_option_max_page_size_help = """\b
+Split the chapters larger than this size in KB at their headings into several pages,
+and write each subsection as its own page instead of merging it into its chapter
+"""
+cli_option_inspect_output_help = """\b
+The file where the JSON is written. Defaults to the standard output
+"""
+cli_option_inspect_lines_help = """\b
+Write one JSON object per line, as soon as each book is inspected
+"""
+cli_option_inspect_executor_help = """\b
+The backend of the worker pool that reads the books
+"""
+cli_option_pipeline_help = """\b
+Run the conversion as an asyncio pipeline whose stages overlap: the chapters are written
+as soon as they are converted and the files are extracted during the conversion
+"""
+cli_option_pandoc_backend_help = """\b
+How pandoc is run. process starts pandoc for every conversion,
+worker keeps a pool of pandoc workers (one per job) that convert the chapters sent to them.
+A worker is restarted if it crashes, and a chapter that takes longer than 5 minutes
+is converted by a new pandoc process
+"""
+cli_option_preview_server_help = """\b
+The server used by --serve. builtin is a threaded server that supports caching headers
+and sends the precompressed copies of the pages, scripts and styles that it writes
+"""
+cli_option_preview_host_help = """\b
+The address the preview server listens on
+"""
+cli_option_preview_port_help = """\b
+The port number on which the books are served
+"""
+cli_option_precompress_help = """\b
+Write gzip compressed copies (and brotli compressed copies if Brotli is installed)
+of the pages, scripts and styles before serving them
+"""
+cli_option_max_age_help = """\b
+The time in seconds the browsers can reuse the images, scripts and styles without revalidating them.
+The pages are always revalidated
 """
\ No newline at end of file
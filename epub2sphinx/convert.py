@@ -1,13 +1,21 @@
+import asyncio
 import ebooklib
 import os
 import shutil
-import click
 
+from .batch import convert_batch, make_batches
 from .book import Book
 from .chapter import Chapter
-from concurrent.futures import ThreadPoolExecutor
+from .events import EventEmitter, ProgressBars
+from .executor import get_executor
+from .images import ImageOptimizer
+from .manifest import Manifest
+from .pandoc_workers import get_pandoc_backend
+from .profiling import Profiler
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import repeat
 from jinja2 import Environment, PackageLoader
-from tqdm import tqdm
 
 STYLE_TYPES = (ebooklib.ITEM_STYLE, ebooklib.ITEM_FONT)
 IMAGE_TYPES = (ebooklib.ITEM_IMAGE, ebooklib.ITEM_COVER)
@@ -15,6 +23,20 @@ IMAGE_TYPES = (ebooklib.ITEM_IMAGE, ebooklib.ITEM_COVER)
 templates_directory = os.path.join(os.path.abspath(os.path.dirname(__file__)), "templates")
 
 
+class ConversionCancelled(Exception):
+    """Raised when a conversion is cancelled before it finishes"""
+
+
+@lru_cache(maxsize=None)
+def get_template_environment():
+    """Returns the Jinja environment of the templates.
+    It is created once per process, so that the compiled templates are reused by later conversions.
+
+    :rtype: class:`jinja2.Environment`
+    """
+    return Environment(loader=PackageLoader("epub2sphinx"))
+
+
 def should_extract_item(item, extract_style):
     """Returns a boolean indicating if this item needs to be extracted
 
@@ -51,6 +73,34 @@ def get_filename(item, source_directory):
         return os.path.join(source_directory, "_static", item.file_name)
 
 
+def extract_file(archive, zip_name, file_path, previous_hash=None):
+    """Streams a file from the epub to the output file without loading it in memory.
+    The CRC32 and size recorded in the zip file are used as the hash of the content,
+    so unchanged files are not read at all.
+
+    :param archive: Archive that contains the file
+    :type archive: class:`epub2sphinx.reader.EpubArchive`
+
+    :param zip_name: Path of the file inside the epub
+    :type zip_name: str
+
+    :param file_path: Output filename
+    :type file_path: str
+
+    :param previous_hash: Hash of the file written in the previous run, if any
+    :type previous_hash: str
+
+    :returns: Hash of the file content
+    :rtype: str
+    """
+    info = archive.getinfo(zip_name)
+    content_hash = "crc32:{:08x}:{}".format(info.CRC, info.file_size)
+    if content_hash != previous_hash or not os.path.isfile(file_path):
+        with archive.open(zip_name) as source_file, open(file_path, 'wb') as ext_file:
+            shutil.copyfileobj(source_file, ext_file)
+    return content_hash
+
+
 def extract_item(item, source_directory, extract_style):
     """Extracts the Image, CSS or Font file
 
@@ -64,13 +114,12 @@ def extract_item(item, source_directory, extract_style):
     :type extract_style: bool
     """
     if should_extract_item(item, extract_style):
-        file_path = get_filename(item, source_directory)
-        with open(file_path, 'wb') as ext_file:
-            ext_file.write(item.content)
+        extract_file(item.archive, item.zip_name, get_filename(item, source_directory))
 
 
-def generate_chapter(chapter_id, book, source_directory):
-    """Generate ReST for each chapter
+def generate_chapter(chapter_id, book):
+    """Generate the chapter for each item in the spine.
+    The subsections of a section are stored in its subchapters list.
 
     :param chapter_id: ID of the chapter
     :type chapter_id: str
@@ -78,26 +127,89 @@ def generate_chapter(chapter_id, book, source_directory):
     :param book: Book instance
     :type book: class:`ebook.epub.EpubItem`
 
-    :param source_directory: Source directory to extract the file to
-    :type source_directory: str
+    :returns: The chapter, or None if the item is a subsection of another chapter
+    :rtype: class:`Chapter`
     """
-    chapter_item = book.epub.get_item_with_id(chapter_id[0])
+    chapter_item = book.items_by_id.get(chapter_id[0])
     file_name = chapter_item.get_name()
     if file_name in book.subsections:
         chapter = Chapter(book, chapter_item)
-        chapter.convert()
-        for subchapter_href in book.subsections[file_name]:
-            if subchapter_href != file_name:
-                subchapter = Chapter(book, book.epub.get_item_with_href(subchapter_href))
-                subchapter.convert()
-                subchapter.write(source_directory)
-                chapter.merge(subchapter)
-        return chapter
-    elif not any(file_name in subsections
-                 for subsections in book.subsections.values()):
-        chapter = Chapter(book, chapter_item)
-        chapter.convert()
+        # A file can be listed many times when the TOC links to several anchors in it
+        chapter.subchapters = [Chapter(book, book.items_by_href.get(subchapter_href))
+                               for subchapter_href in dict.fromkeys(book.subsections[file_name])
+                               if subchapter_href != file_name]
         return chapter
+    elif file_name not in book.parent_sections:
+        return Chapter(book, chapter_item)
+
+
+def convert_chapters(chapters, executor, batch_size, cache=None, engine='auto', progress=None, pandoc=None):
+    """Convert the chapters and their subchapters to ReST in batches
+
+    The chapters are sent to the executor without their subchapters, so that each
+    chapter is transferred to the workers only once.
+
+    :param chapters: List of chapters
+    :type chapters: list
+
+    :param executor: Executor to run the conversion on
+    :type executor: class:`concurrent.futures.Executor`
+
+    :param batch_size: Maximum number of chapters converted in one pandoc call
+    :type batch_size: int
+
+    :param cache: Conversion cache to use, if any
+    :type cache: class:`epub2sphinx.cache.ConversionCache`
+
+    :param engine: Conversion engine, one of :data:`epub2sphinx.constants.ENGINES`
+    :type engine: str
+
+    :param progress: Progress tracker updated with each converted chapter, if any
+    :type progress: class:`epub2sphinx.events.ProgressTracker`
+
+    :param pandoc: Pool of pandoc workers, None starts pandoc for each batch
+    :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+
+    :returns: List of converted chapters
+    :rtype: list
+    """
+    subchapter_counts = [len(chapter.subchapters) for chapter in chapters]
+    all_chapters = []
+    for chapter in chapters:
+        all_chapters.append(chapter)
+        all_chapters.extend(chapter.subchapters)
+        chapter.subchapters = []
+
+    converted_chapters = []
+    sizes = iter([chapter.size for chapter in all_chapters])
+    for batch in executor.map(partial(convert_batch, cache=cache, engine=engine, pandoc=pandoc),
+                              make_batches(all_chapters, batch_size)):
+        converted_chapters.extend(batch)
+        if progress:
+            for chapter in batch:
+                progress.update(chapter.file, next(sizes))
+
+    converted_chapters = iter(converted_chapters)
+    chapters = []
+    for subchapter_count in subchapter_counts:
+        chapter = next(converted_chapters)
+        chapter.subchapters = [next(converted_chapters) for _ in range(subchapter_count)]
+        chapters.append(chapter)
+    return chapters
+
+
+def merge_subchapters(chapter):
+    """Merge the converted subchapters with the chapter
+
+    :param chapter: Converted chapter
+    :type chapter: class:`Chapter`
+
+    :returns: The chapter
+    :rtype: class:`Chapter`
+    """
+    for subchapter in chapter.subchapters:
+        chapter.merge(subchapter)
+    return chapter
 
 
 def merge_chapters(chapters):
@@ -106,22 +218,17 @@ def merge_chapters(chapters):
     :param chapters: List of chapters
     :type chapters: list
     """
-    def merge_range(start_index, end_index):
-        """Merge the chapters present at the given range of indices (both inclusive)
-        """
-        for _ in range(start_index, end_index):
-            chapters[start_index].merge(chapters[start_index+1])
-            del chapters[start_index+1]
-
     if not chapters[0].title:
-        current_chapter = 1
-        while not chapters[current_chapter].title:
-            current_chapter += 1
-        merge_range(0, current_chapter-1)
+        first_titled = next((index for index, chapter in enumerate(chapters) if chapter.title),
+                            len(chapters))
+        for chapter in chapters[1:first_titled]:
+            chapters[0].merge(chapter)
+        # Remove the merged chapters at once instead of shifting the list for every chapter
+        del chapters[1:first_titled]
         chapters[0].title = "Front Page"
 
 
-def write_chapter(chapter, source_directory):
+def write_chapter(chapter, source_directory, previous_hash=None):
     """Write chapter to output file
 
     :param chapter: Chapter to write
@@ -129,65 +236,232 @@ def write_chapter(chapter, source_directory):
 
     :param source_directory: Source directory to extract the file to
     :type source_directory: str
+
+    :param previous_hash: Hash of the file written in the previous run, if any
+    :type previous_hash: str
+
+    :returns: Hash of the file content
+    :rtype: str
     """
-    chapter.write(source_directory)
-    return chapter.file
+    return chapter.write(source_directory, previous_hash)
 
 
 class Converter:
 
-    def __init__(self, file_name, output_directory, sphinx_theme_name, include_custom_css):
-        self.book = Book(file_name)
+    def __init__(self, file_name, output_directory, sphinx_theme_name, include_custom_css, batch_size=16,
+                 executor='thread', jobs=None, cache=None, incremental=False, engine='auto', verbose=True,
+                 profiler=None, optimize_images=False, max_image_size=1600, image_format='keep',
+                 cancel_event=None, max_page_size=None, on_event=None, pipeline=False, pandoc_backend='process'):
+        self.profiler = profiler or Profiler()
+        # The terminal output is only one of the listeners of the progress events
+        self.events = EventEmitter([ProgressBars() if verbose else None, on_event])
+        with self.profiler.stage('parse'):
+            self.book = Book(file_name)
         self.output_directory = output_directory
         self.source_directory = os.path.join(output_directory, 'source')
         self.theme = sphinx_theme_name
         self.include_custom_css = include_custom_css
         self.css_files = None
+        self.batch_size = batch_size
+        self.executor = executor
+        self.jobs = jobs
+        self.cache = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.engine = engine
+        self.python_conversions = 0
+        self.incremental = incremental
+        self.verbose = verbose
+        self.image_optimizer = ImageOptimizer(max_image_size, image_format) if optimize_images else None
+        self.cancel_event = cancel_event
+        self.max_page_size = max_page_size
+        self.pipeline = pipeline
+        self.pandoc_backend = pandoc_backend
+
+    def echo(self, message):
+        self.events.emit('message', message=message)
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that records the time spent in a stage of the conversion,
+        and emits the events of its start and end.
+        The conversion stops before the stage if it was cancelled.
+
+        :param name: Name of the stage
+        :type name: str
+        """
+        self.check_cancelled("the '{}' stage".format(name))
+        self.events.emit('stage_started', stage=name)
+        try:
+            with self.profiler.stage(name):
+                yield
+        finally:
+            self.events.emit('stage_finished', stage=name, wall_time=self.profiler.stages[name]['wall_time'])
+
+    def check_cancelled(self, step):
+        """Stop the conversion if it was cancelled
+
+        :param step: Description of the next step of the conversion, for the error message
+        :type step: str
+
+        :raises ConversionCancelled: If the cancel event is set
+        """
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ConversionCancelled("The conversion was cancelled before {}".format(step))
 
     def convert(self):
-        # Create output directory structure
-        click.echo("Creating directory structure")
-        shutil.copytree(os.path.join(templates_directory, "makefiles"),
-                        self.output_directory)
-        directories = {os.path.dirname(get_filename(item, self.source_directory))
-                       for item in self.book.epub.get_items()
-                       if (should_extract_item(item, self.include_custom_css) or
-                           item.get_type() == ebooklib.ITEM_DOCUMENT)}
-        for directory in directories:
-            os.makedirs(directory, exist_ok=True)
-        self.css_files = [item.file_name for item in self.book.epub.get_items()
-                          if item.get_type() == ebooklib.ITEM_STYLE]
-
-        with ThreadPoolExecutor() as executor:
+        """Convert the book into a Sphinx project. The epub is closed at the end."""
+        with self.book:
+            if self.pipeline:
+                asyncio.run(self.convert_async())
+            else:
+                self.convert_sync()
+
+    def convert_sync(self):
+        """Convert the book stage after stage, with the executor and the pandoc backend of the converter"""
+        manifest = self.setup()
+        with get_executor(self.executor, self.jobs) as executor, \
+                get_pandoc_backend(self.pandoc_backend, self.jobs) as pandoc:
             # Generate ReST file for each chapter in ebook
-            chapters = list(filter(None, tqdm(
-                executor.map(lambda x: generate_chapter(x, self.book, self.source_directory),
-                             self.book.epub.spine),
-                total=len(self.book.epub.spine),
-                desc="Generating ReST content",
-                colour='Blue')))
-            merge_chapters(chapters)
-            self.book.toctree = list(tqdm(
-                executor.map(lambda x: write_chapter(x, self.source_directory),
-                             chapters),
-                total=len(chapters),
-                desc="Writing ReST files",
-                colour='Blue'))
+            with self.stage('read chapters'):
+                chapters = self.read_chapters()
+            with self.stage('convert chapters'):
+                progress = self.events.progress('convert chapters',
+                                                sum(1 + len(chapter.subchapters) for chapter in chapters))
+                chapters = convert_chapters(chapters, executor, self.batch_size, self.cache, self.engine,
+                                            progress, pandoc)
+            all_chapters = [ch for chapter in chapters for ch in [chapter] + chapter.subchapters]
+            self.record_conversions(all_chapters)
+            if self.image_optimizer:
+                # The images are written before the chapters, whose image paths are rewritten
+                self.echo("Optimizing images")
+                with self.stage('optimize images'):
+                    self.image_optimizer.optimize(self.get_image_items(), self.source_directory, executor, manifest)
+                    for chapter in all_chapters:
+                        self.image_optimizer.rewrite_chapter(chapter)
+            with self.stage('merge chapters'):
+                subchapters = [subchapter for chapter in chapters for subchapter in chapter.subchapters]
+                if self.max_page_size:
+                    # The subsections are only written as their own pages, listed in the toctree of their chapter
+                    for chapter in chapters:
+                        chapter.toctree = [chapter.get_document_name(subchapter) for subchapter in chapter.subchapters]
+                else:
+                    chapters = [merge_subchapters(chapter) for chapter in chapters]
+                merge_chapters(chapters)
+                pages = []
+                if self.max_page_size:
+                    for chapter in subchapters + chapters:
+                        pages.extend(chapter.split(self.max_page_size))
+            with self.stage('write chapters'):
+                written_chapters = subchapters + chapters + pages
+                chapter_paths = [chapter.get_path(self.source_directory) for chapter in written_chapters]
+                chapter_hashes = executor.map(write_chapter,
+                                              written_chapters,
+                                              repeat(self.source_directory),
+                                              [manifest.get(path) for path in chapter_paths])
+                progress = self.events.progress('write chapters', len(written_chapters))
+                for chapter, path, content_hash in zip(written_chapters, chapter_paths, chapter_hashes):
+                    manifest.add(path, content_hash)
+                    progress.update(chapter.file)
+                self.book.toctree = [chapter.file for chapter in chapters]
             # Extract other files from epub
-            click.echo("Extracting images")
-            list(executor.map(
-                lambda x: extract_item(x, self.source_directory, self.include_custom_css),
-                self.book.epub.get_items()))
+            self.echo("Extracting images")
+            with self.stage('extract files'):
+                items = self.get_extracted_items()
+                item_paths = [get_filename(item, self.source_directory) for item in items]
+                item_hashes = executor.map(extract_file,
+                                           [item.archive for item in items],
+                                           [item.zip_name for item in items],
+                                           item_paths,
+                                           [manifest.get(path) for path in item_paths])
+                progress = self.events.progress('extract files', len(items))
+                for item, path, content_hash in zip(items, item_paths, item_hashes):
+                    manifest.add(path, content_hash)
+                    progress.update(item.file_name, item.archive.getinfo(item.zip_name).file_size)
+        self.render_templates(manifest)
+
+    async def convert_async(self):
+        """Convert the book with the asyncio pipeline, whose stages overlap,
+        see :class:`epub2sphinx.pipeline.ConversionPipeline`
+        """
+        from .pipeline import ConversionPipeline
+        await ConversionPipeline(self).run()
+
+    def setup(self):
+        """Create the directory structure of the output
+
+        :returns: Manifest of the output directory
+        :rtype: class:`epub2sphinx.manifest.Manifest`
+        """
+        self.echo("Creating directory structure")
+        with self.stage('setup'):
+            shutil.copytree(os.path.join(templates_directory, "makefiles"),
+                            self.output_directory, dirs_exist_ok=self.incremental)
+            manifest = Manifest(self.output_directory, self.incremental)
+            directories = {os.path.dirname(get_filename(item, self.source_directory))
+                           for item in self.book.epub.get_items()
+                           if (should_extract_item(item, self.include_custom_css) or
+                               item.get_type() == ebooklib.ITEM_DOCUMENT)}
+            for directory in directories:
+                os.makedirs(directory, exist_ok=True)
+            self.css_files = [item.file_name for item in self.book.epub.get_items()
+                              if item.get_type() == ebooklib.ITEM_STYLE]
+        return manifest
+
+    def read_chapters(self):
+        """Returns the chapters of the book, with their subsections in their subchapters
+
+        :rtype: list
+        """
+        return list(filter(None, (generate_chapter(x, self.book) for x in self.book.epub.spine)))
 
+    def get_image_items(self):
+        """Returns the image items of the book
+
+        :rtype: list
+        """
+        return [item for item in self.book.epub.get_items() if item.get_type() in IMAGE_TYPES]
+
+    def get_extracted_items(self):
+        """Returns the items extracted as they are: the images, unless they are optimized,
+        and the CSS and fonts if they are included
+
+        :rtype: list
+        """
+        return [item for item in self.book.epub.get_items()
+                if should_extract_item(item, self.include_custom_css) and
+                not (self.image_optimizer and item.get_type() in IMAGE_TYPES)]
+
+    def record_conversions(self, chapters):
+        """Record how the converted chapters were converted, and prune the cache
+
+        :param chapters: List of all the converted chapters, with the subchapters
+        :type chapters: list
+        """
+        self.profiler.add_chapters(chapters)
+        converted_by = [chapter.converted_by for chapter in chapters]
+        self.python_conversions = converted_by.count('python')
+        if self.cache:
+            self.cache_hits = converted_by.count('cache')
+            self.cache_misses = converted_by.count('pandoc')
+            with self.stage('prune cache'):
+                self.cache.prune()
+
+    def render_templates(self, manifest):
+        """Render conf.py and index.rst, and save the manifest
+
+        :param manifest: Manifest of the output directory
+        :type manifest: class:`epub2sphinx.manifest.Manifest`
+        """
         # Render jinja templates
-        click.echo("Generating conf.py and index.rst")
-        jinja_env = Environment(
-            loader=PackageLoader("epub2sphinx")
-        )
-        with open(os.path.join(self.source_directory, 'conf.py'), 'x') as cf:
+        self.echo("Generating conf.py and index.rst")
+        with self.stage('render templates'):
+            jinja_env = get_template_environment()
             if self.include_custom_css:
-                cf.write(jinja_env.get_template('conf.py').render(book=self.book, theme=self.theme, css_files=self.css_files))
+                conf = jinja_env.get_template('conf.py').render(book=self.book, theme=self.theme, css_files=self.css_files)
             else:
-                cf.write(jinja_env.get_template('conf.py').render(book=self.book, theme=self.theme))
-        with open(os.path.join(self.source_directory, 'index.rst'), 'x') as of:
-            of.write(jinja_env.get_template('index.rst').render(book=self.book))
+                conf = jinja_env.get_template('conf.py').render(book=self.book, theme=self.theme)
+            manifest.update(os.path.join(self.source_directory, 'conf.py'), conf.encode())
+            index = jinja_env.get_template('index.rst').render(book=self.book)
+            manifest.update(os.path.join(self.source_directory, 'index.rst'), index.encode())
+            manifest.save()
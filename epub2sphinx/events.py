@@ -0,0 +1,145 @@
+import click
+import time
+
+
+class EventEmitter:
+    """This class sends the progress events of a conversion to its listeners, like the
+    terminal or a service embedding the converter. No event is created when there is no listener.
+
+    Every event is a dict with its 'type' and the 'time' it was emitted:
+
+    - 'stage_started' and 'stage_finished', with the name of the 'stage'. A finished stage also
+      has its 'wall_time', and the stage is finished even if the conversion failed in it.
+    - 'progress' when a stage with items starts (with no 'item') and when each of its items is done:
+      a chapter converted or written, or a file extracted. It has the 'stage', the 'item' file name,
+      the number of 'completed' and 'total' items, the 'bytes' processed so far, the 'elapsed' time
+      of the stage and the throughput in 'items_per_second' and 'bytes_per_second'. The total of
+      the written chapters grows in the pipeline, as the chapters are split into pages.
+    - 'message' with a 'message' for the user.
+
+    :param listeners: Functions called with each event
+    :type listeners: list
+    """
+    def __init__(self, listeners=()):
+        """EventEmitter Constructor
+
+        :param listeners: Functions called with each event
+        :type listeners: list
+        """
+        self.listeners = [listener for listener in listeners if listener is not None]
+
+    def emit(self, event_type, **data):
+        """Send an event to the listeners
+
+        :param event_type: Type of the event
+        :type event_type: str
+        """
+        if not self.listeners:
+            return
+        event = dict(type=event_type, time=time.time(), **data)
+        for listener in self.listeners:
+            listener(event)
+
+    def progress(self, stage, total):
+        """Returns the progress tracker of a stage
+
+        :param stage: Name of the stage
+        :type stage: str
+
+        :param total: Number of items in the stage
+        :type total: int
+
+        :rtype: class:`ProgressTracker`
+        """
+        return ProgressTracker(self, stage, total)
+
+
+class ProgressTracker:
+    """This class counts the items done in a stage and emits their 'progress' events
+
+    :param completed: Number of items done
+    :type completed: int
+
+    :param bytes: Size of the items done in bytes
+    :type bytes: int
+    """
+    def __init__(self, emitter, stage, total):
+        """ProgressTracker Constructor
+
+        :param emitter: Emitter of the events
+        :type emitter: class:`EventEmitter`
+
+        :param stage: Name of the stage
+        :type stage: str
+
+        :param total: Number of items in the stage
+        :type total: int
+        """
+        self.emitter = emitter
+        self.stage = stage
+        self.total = total
+        self.completed = 0
+        self.bytes = 0
+        self.start_time = time.perf_counter()
+        self.emit(None)
+
+    def update(self, item, size=0):
+        """Record an item done and emit its event
+
+        :param item: File name of the item
+        :type item: str
+
+        :param size: Size of the item in bytes
+        :type size: int
+        """
+        self.completed += 1
+        self.bytes += size
+        self.emit(item)
+
+    def emit(self, item):
+        """Emit the 'progress' event of the stage
+
+        :param item: File name of the last item done, None when the stage starts
+        :type item: str
+        """
+        if not self.emitter.listeners:
+            return
+        elapsed = time.perf_counter() - self.start_time
+        self.emitter.emit('progress', stage=self.stage, item=item, completed=self.completed, total=self.total,
+                          bytes=self.bytes, elapsed=elapsed,
+                          items_per_second=self.completed / elapsed if elapsed else None,
+                          bytes_per_second=self.bytes / elapsed if elapsed else None)
+
+
+class ProgressBars:
+    """Event listener that shows the messages and the progress of the chapters on the terminal,
+    with tqdm progress bars. tqdm is only imported when a bar is shown.
+    """
+    descriptions = {
+        'convert chapters': "Generating ReST content",
+        'write chapters': "Writing ReST files",
+    }
+
+    def __init__(self):
+        """ProgressBars Constructor
+        """
+        self.bars = {}
+
+    def __call__(self, event):
+        stage = event.get('stage')
+        if event['type'] == 'message':
+            click.echo(event['message'])
+        elif event['type'] == 'progress' and stage in self.descriptions:
+            if stage not in self.bars:
+                from tqdm import tqdm
+                self.bars[stage] = tqdm(total=event['total'], desc=self.descriptions[stage], colour='Blue')
+            bar = self.bars[stage]
+            # The total grows when the pipeline splits chapters into pages
+            bar.total = event['total']
+            bar.update(event['completed'] - bar.n)
+            if event['completed'] >= event['total']:
+                self.bars.pop(stage).close()
+        elif event['type'] == 'stage_finished':
+            # The stages of the pipeline overlap, so its bars are closed at the end of the pipeline
+            for stage in list(self.bars):
+                self.bars.pop(stage).close()
@@ -0,0 +1,43 @@
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+
+
+class SerialExecutor(Executor):
+    """Executor that runs every task immediately in the calling thread.
+    Useful for debugging and profiling the conversion.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exception:
+            future.set_exception(exception)
+        return future
+
+
+def get_executor(backend='thread', jobs=None):
+    """Returns the executor used to run the conversion tasks
+
+    The tasks submitted to the executor should only take plain data (like chapters,
+    file names and bytes) so that they can be sent to worker processes.
+    An existing executor can be passed as the backend to share it between conversions,
+    it is not shut down when the conversion finishes.
+
+    :param backend: One of 'thread', 'process', 'serial' or an executor instance
+    :type backend: str or class:`concurrent.futures.Executor`
+
+    :param jobs: Number of workers, None uses the default of the executor
+    :type jobs: int
+
+    :returns: Executor instance
+    :rtype: class:`concurrent.futures.Executor`
+    """
+    if isinstance(backend, Executor):
+        return nullcontext(backend)
+    elif backend == 'thread':
+        return ThreadPoolExecutor(max_workers=jobs)
+    elif backend == 'process':
+        return ProcessPoolExecutor(max_workers=jobs)
+    elif backend == 'serial':
+        return SerialExecutor()
+    raise ValueError("Unknown executor backend: {}".format(backend))
@@ -0,0 +1,498 @@
+import re
+import unicodedata
+
+from html.parser import HTMLParser
+
+# The output follows the ReST writer of pandoc, so that both engines produce the same files
+LINE_WIDTH = 72
+HEADING_CHARACTERS = "=-~^'"
+SPECIAL_CHARACTERS = "`*_|"
+# Characters that can be next to inline markup without an escaped space
+OK_BEFORE_MARKUP = "-:/'\"<([{–—"
+OK_AFTER_MARKUP = "-.,:;!?\\/'\")]}>–—"
+# Characters that make a special character look like the start or the end of inline markup
+START_STRING_PREFIXES = ("-:/'\"<([{", ('Pd', 'Po', 'Pi', 'Pf', 'Ps'))
+END_STRING_SUFFIXES = ("-.,:;!?\\/'\")]}>", ('Pd', 'Po', 'Pi', 'Pf', 'Pe'))
+
+BLOCK_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'ul', 'ol', 'li', 'div'}
+INLINE_TAGS = {'em', 'i', 'strong', 'b', 'a', 'span', 'img'}
+CONTAINER_TAGS = {'html', 'body'}
+IGNORED_TAGS = {'head'}
+GLOBAL_ATTRIBUTES = {'class', 'id', 'style', 'lang', 'dir', 'xml:lang'}
+ALLOWED_ATTRIBUTES = {
+    'a': GLOBAL_ATTRIBUTES | {'href', 'title'},
+    'img': {'src', 'alt', 'class'},
+}
+VOID_TAGS = {'img'}
+# Containers with these classes are written as admonitions by pandoc
+ADMONITION_CLASSES = {'attention', 'caution', 'danger', 'error', 'hint', 'important',
+                      'note', 'tip', 'warning', 'admonition'}
+whitespace_pattern = re.compile(r"[ \t\n\r\f]+")
+safe_name_pattern = re.compile(r"^[\w.-]+$")
+safe_label_pattern = re.compile(r"^[\w][\w .,-]*$")
+
+
+def has_wide_characters(text):
+    """Returns if the text has characters whose display width is not one column.
+    pandoc measures the lines and headings by their display width.
+    """
+    return not text.isascii() and any(
+        unicodedata.east_asian_width(character) in ('W', 'F') or unicodedata.combining(character) or
+        unicodedata.category(character) == 'Cf' for character in text)
+
+
+class Unsupported(Exception):
+    """Raised when the HTML uses markup that is not handled by the Python engine"""
+
+
+class Element:
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+
+
+class TreeBuilder(HTMLParser):
+    """Streaming parser that builds a small tree of the supported elements.
+    Any unsupported element raises :class:`Unsupported`.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element('root', {})
+        self.stack = [self.root]
+        self.ignored_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.ignored_depth:
+            self.ignored_depth += tag not in VOID_TAGS
+            return
+        if tag in IGNORED_TAGS:
+            self.ignored_depth = 1
+            return
+        if tag in CONTAINER_TAGS:
+            return
+        if tag not in BLOCK_TAGS and tag not in INLINE_TAGS:
+            raise Unsupported(tag)
+        attrs = dict(attrs)
+        allowed_attributes = ALLOWED_ATTRIBUTES.get(tag, GLOBAL_ATTRIBUTES)
+        if any(name not in allowed_attributes for name in attrs):
+            raise Unsupported(tag)
+        parent = self.stack[-1]
+        if tag in BLOCK_TAGS and parent.tag in INLINE_TAGS | {'p', 'h1', 'h2', 'h3', 'h4', 'h5'}:
+            raise Unsupported(tag)
+        element = Element(tag, attrs)
+        parent.children.append(element)
+        if tag not in VOID_TAGS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.ignored_depth:
+            self.ignored_depth -= tag not in VOID_TAGS
+            return
+        if tag in CONTAINER_TAGS or tag in VOID_TAGS:
+            return
+        if self.stack[-1].tag != tag:
+            raise Unsupported(tag)
+        self.stack.pop()
+
+    def handle_data(self, data):
+        if not self.ignored_depth:
+            if has_wide_characters(data):
+                raise Unsupported('text')
+            self.stack[-1].children.append(data)
+
+
+# Inline nodes, modelled after the pandoc AST
+class Space:
+    pass
+
+
+SPACE = Space()
+
+
+class Markup:
+    """Emphasis, strong emphasis, link, image or span"""
+    def __init__(self, kind, children, target=None):
+        self.kind = kind
+        self.children = children
+        self.target = target
+
+
+def flatten(inlines):
+    """Returns the inlines with the spans replaced by their content"""
+    for inline in inlines:
+        if isinstance(inline, Markup) and inline.kind == 'span':
+            yield from flatten(inline.children)
+        else:
+            yield inline
+
+
+def get_text(inlines):
+    """Returns the plain text of the inlines, like the stringify function of pandoc"""
+    return ''.join(get_text(inline.children) if isinstance(inline, Markup) else ' ' if inline is SPACE else inline
+                   for inline in inlines)
+
+
+def get_identifier(text):
+    """Returns the identifier that pandoc generates for a heading with this text"""
+    text = ''.join(character for character in text.lower() if character.isspace() or character in '_-.' or
+                   unicodedata.category(character)[0] in 'LN')
+    identifier = '-'.join(text.split())
+    # The identifiers start with a letter
+    while identifier and unicodedata.category(identifier[0])[0] != 'L':
+        identifier = identifier[1:]
+    return identifier or 'section'
+
+
+def is_complex(inline):
+    if isinstance(inline, Markup):
+        if inline.kind == 'span':
+            return bool(inline.children) and is_complex(inline.children[0])
+        return True
+    return False
+
+
+def needs_escaped_space(previous, inline):
+    """Returns if an escaped space is needed between two inlines, so that the
+    inline markup is recognized
+    """
+    if is_complex(previous):
+        if inline is SPACE:
+            return False
+        return not (isinstance(inline, str) and (inline[0].isspace() or inline[0] in OK_AFTER_MARKUP))
+    if is_complex(inline):
+        if previous is SPACE:
+            return False
+        return not (isinstance(previous, str) and (previous[-1].isspace() or previous[-1] in OK_BEFORE_MARKUP))
+    return False
+
+
+def is_markup_boundary(character, characters):
+    """Returns if inline markup can start or end next to the character"""
+    if character is None or character.isspace():
+        return True
+    ascii_characters, categories = characters
+    if character.isascii():
+        return character in ascii_characters
+    return unicodedata.category(character) in categories
+
+
+def escape_word(word):
+    """Escape the ReST special characters of a word like pandoc does"""
+    escaped = []
+    for index, character in enumerate(word):
+        if character == '\\':
+            escaped.append('\\\\')
+        elif character in SPECIAL_CHARACTERS:
+            before = word[index - 1] if index > 0 else None
+            after = word[index + 1] if index + 1 < len(word) else None
+            if character == '_':
+                # A trailing underscore makes a reference
+                ends_markup = after is None or not after.isalnum()
+            else:
+                ends_markup = is_markup_boundary(after, END_STRING_SUFFIXES)
+            if ends_markup or is_markup_boundary(before, START_STRING_PREFIXES):
+                escaped.append('\\')
+            escaped.append(character)
+        else:
+            escaped.append(character)
+    return ''.join(escaped)
+
+
+class Renderer:
+    """Renders the element tree into ReST"""
+    def __init__(self):
+        self.images = {}
+        self.image_count = 0
+        self.heading_ids = set()
+
+    def get_inlines(self, nodes, in_markup=False):
+        """Convert the inline elements into a list of words, spaces and markup"""
+        inlines = []
+        for node in nodes:
+            if isinstance(node, str):
+                for index, word in enumerate(whitespace_pattern.split(node)):
+                    if index:
+                        inlines.append(SPACE)
+                    if word:
+                        inlines.append(word)
+            elif node.tag in BLOCK_TAGS:
+                raise Unsupported(node.tag)
+            elif node.tag == 'span' or (node.tag == 'a' and 'href' not in node.attrs):
+                inlines.append(Markup('span', self.get_inlines(node.children, in_markup)))
+            elif node.tag == 'img':
+                if in_markup:
+                    # ReST cannot nest an image substitution in emphasis
+                    raise Unsupported(node.tag)
+                inlines.append(self.get_image(node))
+            else:
+                if in_markup:
+                    raise Unsupported(node.tag)
+                children = self.get_inlines(node.children, True)
+                if node.tag == 'a':
+                    words = list(flatten(children))
+                    if any(isinstance(word, Markup) for word in words):
+                        raise Unsupported(node.tag)
+                    href = node.attrs['href'] or ''
+                    text = ''.join(' ' if word is SPACE else word for word in words).strip()
+                    # pandoc percent-encodes the whitespace of the links
+                    if (not href or text == href or href.startswith('mailto:') or not text or
+                            any(character.isspace() for character in href)):
+                        raise Unsupported(node.tag)
+                    inlines.append(Markup('link', children, href))
+                else:
+                    inlines.append(Markup('strong' if node.tag in ('strong', 'b') else 'emph', children))
+        return inlines
+
+    def get_image(self, node):
+        source = node.attrs.get('src')
+        if not source or any(character.isspace() for character in source):
+            raise Unsupported('img')
+        alt = whitespace_pattern.sub(' ', node.attrs.get('alt') or '').strip()
+        if alt and (not safe_label_pattern.match(alt) or re.match(r"^image\d+$", alt) or
+                    has_wide_characters(alt)):
+            raise Unsupported('img')
+        if alt and self.images.get(alt, source) == source:
+            label = alt
+        else:
+            self.image_count += 1
+            label = "image{}".format(self.image_count)
+        self.images[label] = source
+        return Markup('image', [], label)
+
+    def move_spaces(self, inlines):
+        """Move the spaces at the edges of markup outside of it and merge adjacent emphasis"""
+        result = []
+        for inline in inlines:
+            if isinstance(inline, Markup) and inline.kind in ('emph', 'strong', 'link'):
+                children = self.move_spaces(inline.children)
+                leading = children[:1] == [SPACE]
+                trailing = children[-1:] == [SPACE]
+                children = children[leading:len(children) - trailing]
+                for child in children[:1] + children[-1:]:
+                    if isinstance(child, Markup) and child.kind == 'span':
+                        raise Unsupported('span')
+                if leading:
+                    result.append(SPACE)
+                if not children:
+                    if inline.kind == 'link':
+                        raise Unsupported('a')
+                elif (inline.kind != 'link' and result and isinstance(result[-1], Markup) and
+                        result[-1].kind == inline.kind):
+                    result[-1] = Markup(inline.kind, result[-1].children + children)
+                else:
+                    result.append(Markup(inline.kind, children, inline.target))
+                if trailing:
+                    result.append(SPACE)
+            elif isinstance(inline, Markup) and inline.kind == 'span':
+                result.append(Markup('span', self.move_spaces(inline.children)))
+            else:
+                result.append(inline)
+        return result
+
+    def collapse_spaces(self, inlines):
+        """Remove the repeated spaces"""
+        result = []
+        for inline in inlines:
+            if inline is SPACE and result and result[-1] is SPACE:
+                continue
+            if isinstance(inline, Markup) and inline.kind != 'image':
+                inline = Markup(inline.kind, self.collapse_spaces(inline.children), inline.target)
+            result.append(inline)
+        return result
+
+    def get_words(self, inlines):
+        """Render the inlines of a block into words that can be separated by line breaks"""
+        output = []
+        self.render_inlines(self.collapse_spaces(self.move_spaces(inlines)), output)
+        words = ['']
+        for text in output:
+            if text is SPACE:
+                if words[-1]:
+                    words.append('')
+            else:
+                words[-1] += text
+        if len(words) > 1 and not words[-1]:
+            words.pop()
+        return words
+
+    def render_inlines(self, inlines, output):
+        """Render the inlines into a list of text and breakable spaces"""
+        for index, inline in enumerate(inlines):
+            if index and needs_escaped_space(inlines[index - 1], inline):
+                output.append('\\ ')
+            if inline is SPACE:
+                output.append(SPACE)
+            elif isinstance(inline, str):
+                output.append(escape_word(inline))
+            elif inline.kind == 'image':
+                for index, word in enumerate(('|' + inline.target + '|').split(' ')):
+                    if index:
+                        output.append(SPACE)
+                    output.append(word)
+            elif inline.kind == 'span':
+                self.render_inlines(inline.children, output)
+            else:
+                delimiter = {'link': '`', 'strong': '**', 'emph': '*'}[inline.kind]
+                output.append(delimiter)
+                self.render_inlines(inline.children, output)
+                output.append(' <' + inline.target + '>`__' if inline.kind == 'link' else delimiter)
+
+    def wrap(self, words, indent):
+        """Wrap the words into lines of LINE_WIDTH characters, like pandoc"""
+        lines = []
+        line = ''
+        for word in words:
+            if line and indent + len(line) + 1 + len(word) > LINE_WIDTH:
+                lines.append(line)
+                line = word
+            else:
+                line = line + ' ' + word if line else word
+        lines.append(line)
+        return lines
+
+    def get_blocks(self, nodes, indent):
+        """Render the block elements into a list of (kind, lines) tuples"""
+        blocks = []
+        inlines = []
+
+        def flush_inlines():
+            words = self.get_words(self.get_inlines(inlines))
+            if words != ['']:
+                # Only the text outside of any block is a paragraph at the top level
+                blocks.append(('plain' if indent else 'para', self.wrap(words, indent)))
+            inlines.clear()
+
+        for node in nodes:
+            if isinstance(node, str) or node.tag in INLINE_TAGS:
+                inlines.append(node)
+                continue
+            flush_inlines()
+            if node.tag == 'p':
+                words = self.get_words(self.get_inlines(node.children))
+                if words != ['']:
+                    blocks.append(('para', self.wrap(words, indent)))
+            elif node.tag in ('h1', 'h2', 'h3', 'h4', 'h5'):
+                # pandoc writes nested headings as rubrics
+                if indent:
+                    raise Unsupported(node.tag)
+                blocks.append(('para', self.get_heading(node)))
+            elif node.tag in ('ul', 'ol'):
+                blocks.append(('list', self.get_list(node, indent)))
+            elif node.tag == 'div':
+                blocks.append(('container', self.get_container(node, indent)))
+            else:
+                raise Unsupported(node.tag)
+        flush_inlines()
+        return blocks
+
+    def get_heading(self, node):
+        if any(isinstance(child, Element) and child.tag == 'img' for child in node.children):
+            raise Unsupported('img')
+        inlines = self.get_inlines(node.children)
+        words = self.get_words(inlines)
+        if words == ['']:
+            raise Unsupported(node.tag)
+        title = ' '.join(words)
+        lines = [title, HEADING_CHARACTERS[int(node.tag[1]) - 1] * len(title)]
+        # pandoc gives the headings without an id a unique identifier generated from their text,
+        # and only writes a label when the identifier is not the one generated from the text
+        generated_id = get_identifier(get_text(inlines))
+        heading_id = node.attrs.get('id')
+        if not heading_id:
+            heading_id, index = generated_id, 0
+            while heading_id in self.heading_ids:
+                index += 1
+                heading_id = "{}-{}".format(generated_id, index)
+        self.heading_ids.add(heading_id)
+        if heading_id != generated_id:
+            if not safe_name_pattern.match(heading_id):
+                raise Unsupported(node.tag)
+            lines = ['.. _{}:'.format(heading_id), ''] + lines
+        return lines
+
+    def get_container(self, node, indent):
+        classes = whitespace_pattern.sub(' ', node.attrs.get('class') or '').strip()
+        if ADMONITION_CLASSES.intersection(classes.split(' ')):
+            raise Unsupported(node.tag)
+        lines = ['.. container::' + (' ' + classes if classes else '')]
+        if node.attrs.get('id'):
+            if not safe_name_pattern.match(node.attrs['id']):
+                raise Unsupported(node.tag)
+            lines.append('   :name: ' + node.attrs['id'])
+        content = self.join_blocks(self.get_blocks(node.children, indent + 3))
+        if content:
+            lines.append('')
+            lines.extend(('   ' + line) if line else '' for line in content)
+        return lines
+
+    def get_list(self, node, indent):
+        items = [child for child in node.children if isinstance(child, Element)]
+        if any(item.tag != 'li' for item in items):
+            raise Unsupported(node.tag)
+        if any(isinstance(child, str) and child.strip() for child in node.children):
+            raise Unsupported(node.tag)
+        if not items:
+            raise Unsupported(node.tag)
+        marker = '- ' if node.tag == 'ul' else '#. '
+        item_blocks = [self.get_blocks(item.children, indent + len(marker)) for item in items]
+        if any(not blocks or blocks[0][0] == 'list' or any(kind == 'container' for kind, _ in blocks)
+               for blocks in item_blocks):
+            raise Unsupported('li')
+        loose = any(kind == 'para' for blocks in item_blocks for kind, _ in blocks)
+        lines = []
+        for blocks in item_blocks:
+            if loose:
+                blocks = [('para' if kind == 'plain' else kind, block_lines) for kind, block_lines in blocks]
+            content = self.join_blocks(blocks)
+            lines.append(marker + content[0])
+            lines.extend((' ' * len(marker) + line) if line else '' for line in content[1:])
+            if blocks[-1][0] != 'plain':
+                lines.append('')
+        if lines[-1] == '':
+            lines.pop()
+        return lines
+
+    def join_blocks(self, blocks):
+        lines = []
+        for index, (kind, block_lines) in enumerate(blocks):
+            # pandoc does not separate a plain block from a following paragraph
+            if index and not (blocks[index - 1][0] == 'plain' and kind == 'para'):
+                lines.append('')
+            lines.extend(block_lines)
+        return lines
+
+    def render(self, root):
+        lines = self.join_blocks(self.get_blocks(root.children, 0))
+        if self.images:
+            if lines:
+                lines.append('')
+            lines.extend('.. |{}| image:: {}'.format(label, source) for label, source in self.images.items())
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+def html_to_rst(html_content):
+    """Convert simple HTML into ReST without pandoc.
+    Only paragraphs, headings, emphasis, links, lists, images and containers are
+    handled; other markup makes this function return None.
+
+    :param html_content: Preprocessed HTML content
+    :type html_content: str
+
+    :returns: ReST content, or None if the HTML uses unsupported markup
+    :rtype: str
+    """
+    try:
+        builder = TreeBuilder()
+        builder.feed(html_content)
+        builder.close()
+        if len(builder.stack) != 1:
+            return None
+        return Renderer().render(builder.root)
+    except Unsupported:
+        return None
@@ -0,0 +1,274 @@
+import hashlib
+import io
+import os
+import posixpath
+import re
+
+from .constants import IMAGE_FORMATS
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed to optimize images
+    Image = None
+
+# Pillow formats that are resized and recompressed, the other images are only deduplicated
+OPTIMIZED_FORMATS = {'PNG': 'PNG', 'JPEG': 'JPEG', 'WEBP': 'WEBP'}
+
+image_directive_pattern = re.compile(r"^(\s*\.\. (?:\|[^|\n]+\| )?(?:image|figure):: )(\S+)[ \t]*$", re.MULTILINE)
+
+
+def is_available():
+    """Returns a boolean indicating if Pillow is installed to optimize images
+
+    :rtype: bool
+    """
+    return Image is not None
+
+
+def hash_file(archive, zip_name):
+    """Returns the SHA-256 hash of a file in the epub, used to find duplicate images
+
+    :param archive: Archive that contains the file
+    :type archive: class:`epub2sphinx.reader.EpubArchive`
+
+    :param zip_name: Path of the file inside the epub
+    :type zip_name: str
+
+    :rtype: str
+    """
+    content_hash = hashlib.sha256()
+    with archive.open(zip_name) as source_file:
+        for block in iter(lambda: source_file.read(1024 * 1024), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def get_optimized_path(file_path, image_format):
+    """Returns the output filename of an image after the optimization
+
+    :param file_path: Output filename of the original image
+    :type file_path: str
+
+    :param image_format: 'keep' to keep the format of the image, 'webp' to convert it to WebP
+    :type image_format: str
+
+    :rtype: str
+    """
+    if image_format == 'webp':
+        return os.path.splitext(file_path)[0] + '.webp'
+    return file_path
+
+
+def optimize_image(archive, zip_name, file_path, max_size, image_format='keep', previous_hash=None,
+                   content_hash=None):
+    """Write an optimized version of an image from the epub.
+    Images larger than the maximum size are downscaled, and the images are recompressed
+    or converted to WebP. The original image is kept if the result is not smaller.
+
+    :param archive: Archive that contains the image
+    :type archive: class:`epub2sphinx.reader.EpubArchive`
+
+    :param zip_name: Path of the image inside the epub
+    :type zip_name: str
+
+    :param file_path: Output filename of the original image
+    :type file_path: str
+
+    :param max_size: Maximum width and height in pixels, None keeps the size
+    :type max_size: int
+
+    :param image_format: 'keep' to keep the format of the image, 'webp' to convert it to WebP
+    :type image_format: str
+
+    :param previous_hash: Hash of the image written in the previous run, if any
+    :type previous_hash: str
+
+    :param content_hash: SHA-256 hash of the original image, see :func:`hash_file`
+    :type content_hash: str
+
+    :returns: Written filename, its hash, the original size and the written size in bytes
+    :rtype: tuple
+    """
+    original_size = archive.getinfo(zip_name).file_size
+    optimized_path = get_optimized_path(file_path, image_format)
+    output_hash = "image:{}:{}:{}".format(content_hash, max_size, image_format)
+    for output_path in dict.fromkeys([optimized_path, file_path]):
+        if output_hash == previous_hash and os.path.isfile(output_path):
+            return output_path, output_hash, original_size, os.path.getsize(output_path)
+
+    with archive.open(zip_name) as source_file:
+        content = source_file.read()
+    output_path, output = file_path, content
+    try:
+        image = Image.open(io.BytesIO(content))
+        image_type = OPTIMIZED_FORMATS.get(image.format)
+        # Animated images are copied as they are
+        if image_type and not getattr(image, 'is_animated', False):
+            resized = bool(max_size) and max(image.size) > max_size
+            if resized:
+                image.thumbnail((max_size, max_size), Image.LANCZOS)
+            if image_format == 'webp':
+                image_type = 'WEBP'
+            optimized = save_image(image, image_type)
+            if resized or len(optimized) < len(content):
+                output_path = optimized_path if image_type == 'WEBP' else file_path
+                output = optimized
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Images that Pillow cannot read, or refuses to read as they are too large, are copied as they are
+        pass
+    with open(output_path, 'wb') as output_file:
+        output_file.write(output)
+    return output_path, output_hash, original_size, len(output)
+
+
+def save_image(image, image_type):
+    """Returns the image compressed in the given format
+
+    :param image: Image to compress
+    :type image: class:`PIL.Image.Image`
+
+    :param image_type: Pillow format name: 'PNG', 'JPEG' or 'WEBP'
+    :type image_type: str
+
+    :rtype: bytes
+    """
+    output = io.BytesIO()
+    if image_type == 'PNG':
+        image.save(output, 'PNG', optimize=True)
+    elif image_type == 'JPEG':
+        if image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        image.save(output, 'JPEG', quality=85, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        image.save(output, 'WEBP', quality=80, method=4)
+    return output.getvalue()
+
+
+def rewrite_image_paths(rst_content, chapter_file, image_paths):
+    """Rewrite the image paths of the ReST image and figure directives
+
+    :param rst_content: ReST content of the chapter
+    :type rst_content: str
+
+    :param chapter_file: Filename of the chapter, relative to the source directory
+    :type chapter_file: str
+
+    :param image_paths: (Original image filename => Written image filename) mapping,
+        relative to the source directory
+    :type image_paths: dict
+
+    :returns: ReST content with the new image paths
+    :rtype: str
+    """
+    chapter_directory = posixpath.dirname(chapter_file)
+
+    def rewrite(match):
+        image_path = posixpath.normpath(posixpath.join(chapter_directory, match.group(2)))
+        new_path = image_paths.get(image_path)
+        if new_path is None or new_path == image_path:
+            return match.group(0)
+        return match.group(1) + posixpath.relpath(new_path, chapter_directory or '.')
+
+    return image_directive_pattern.sub(rewrite, rst_content)
+
+
+class ImageOptimizer:
+    """This class runs the image pipeline of a book: identical images are written once,
+    and the images are downscaled and recompressed on the executor.
+
+    :param max_size: Maximum width and height in pixels, None keeps the size
+    :type max_size: int
+
+    :param image_format: One of :data:`IMAGE_FORMATS`
+    :type image_format: str
+
+    :param image_paths: (Original image filename => Written image filename) mapping,
+        relative to the source directory
+    :type image_paths: dict
+
+    :param image_count: Number of images in the book
+    :type image_count: int
+
+    :param duplicate_count: Number of images that are duplicates of another image
+    :type duplicate_count: int
+
+    :param original_size: Size of the images of the book in bytes
+    :type original_size: int
+
+    :param optimized_size: Size of the written images in bytes
+    :type optimized_size: int
+    """
+    def __init__(self, max_size=1600, image_format='keep'):
+        """ImageOptimizer Constructor
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError("Unknown image format: {}".format(image_format))
+        if not is_available():
+            raise RuntimeError("Pillow is required to optimize images, install it with: pip install epub2sphinx[images]")
+        self.max_size = max_size
+        self.image_format = image_format
+        self.image_paths = {}
+        self.image_count = 0
+        self.duplicate_count = 0
+        self.original_size = 0
+        self.optimized_size = 0
+
+    @property
+    def bytes_saved(self):
+        return self.original_size - self.optimized_size
+
+    def optimize(self, items, source_directory, executor, manifest):
+        """Write the optimized images and record the written filenames
+
+        :param items: Image items of the book
+        :type items: list
+
+        :param source_directory: Source directory to write the images to
+        :type source_directory: str
+
+        :param executor: Executor to run the optimization on
+        :type executor: class:`concurrent.futures.Executor`
+
+        :param manifest: Manifest of the output directory
+        :type manifest: class:`epub2sphinx.manifest.Manifest`
+        """
+        content_hashes = list(executor.map(hash_file,
+                                           [item.archive for item in items],
+                                           [item.zip_name for item in items]))
+        unique_items = {}
+        for item, content_hash in zip(items, content_hashes):
+            unique_items.setdefault(content_hash, item)
+        self.image_count = len(items)
+        self.duplicate_count = len(items) - len(unique_items)
+        self.original_size = sum(item.archive.getinfo(item.zip_name).file_size for item in items)
+
+        unique_hashes = list(unique_items)
+        unique_items = list(unique_items.values())
+        file_paths = [os.path.join(source_directory, item.file_name) for item in unique_items]
+        results = executor.map(optimize_image,
+                               [item.archive for item in unique_items],
+                               [item.zip_name for item in unique_items],
+                               file_paths,
+                               [self.max_size] * len(unique_items),
+                               [self.image_format] * len(unique_items),
+                               [manifest.get(get_optimized_path(path, self.image_format)) or manifest.get(path)
+                                for path in file_paths],
+                               unique_hashes)
+        written_paths = {}
+        for content_hash, (output_path, output_hash, _, output_size) in zip(unique_hashes, results):
+            manifest.add(output_path, output_hash)
+            written_paths[content_hash] = os.path.relpath(output_path, source_directory).replace(os.path.sep, '/')
+            self.optimized_size += output_size
+        for item, content_hash in zip(items, content_hashes):
+            self.image_paths[item.file_name] = written_paths[content_hash]
+
+    def rewrite_chapter(self, chapter):
+        """Rewrite the image paths in the ReST content of a converted chapter
+
+        :param chapter: Converted chapter
+        :type chapter: class:`epub2sphinx.Chapter`
+        """
+        if any(original != written for original, written in self.image_paths.items()):
+            chapter.content = rewrite_image_paths(chapter.content, chapter.file, self.image_paths)
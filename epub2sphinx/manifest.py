@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.epub2sphinx-manifest.json'
+
+
+def update_file(file_path, content, previous_hash=None):
+    """Writes the content to the file, unless it has the same hash as in the previous run.
+    Unchanged files keep their modification time, so that Sphinx does not read them again.
+
+    :param file_path: Output filename
+    :type file_path: str
+
+    :param content: Content of the file, or a list of parts that are written one after another
+    :type content: bytes or list
+
+    :param previous_hash: Hash of the content written in the previous run, if any
+    :type previous_hash: str
+
+    :returns: Hash of the content
+    :rtype: str
+    """
+    if isinstance(content, bytes):
+        content = [content]
+    content_hash = hashlib.sha256()
+    for part in content:
+        content_hash.update(part)
+    content_hash = content_hash.hexdigest()
+    if content_hash != previous_hash or not os.path.isfile(file_path):
+        with open(file_path, 'wb') as output_file:
+            output_file.writelines(content)
+    return content_hash
+
+
+class Manifest:
+    """This class holds the hashes of the files generated in an output directory.
+    It is stored in the output directory and used to only rewrite the changed files.
+
+    :param directory: Output directory
+    :type directory: str
+
+    :param previous: (Relative path => Hash) mapping of the previous run
+    :type previous: dict
+
+    :param current: (Relative path => Hash) mapping of the current run
+    :type current: dict
+    """
+    def __init__(self, directory, incremental=False):
+        """Manifest Constructor
+
+        :param directory: Output directory
+        :type directory: str
+
+        :param incremental: Load the hashes of the previous run
+        :type incremental: bool
+        """
+        self.directory = directory
+        self.previous = {}
+        self.current = {}
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        if incremental and os.path.isfile(manifest_path):
+            with open(manifest_path) as manifest_file:
+                self.previous = json.load(manifest_file)
+
+    def relative_path(self, file_path):
+        return os.path.relpath(file_path, self.directory)
+
+    def get(self, file_path):
+        """Returns the hash of the file in the previous run
+
+        :param file_path: Path of the file
+        :type file_path: str
+
+        :returns: Hash of the file, or None if it was not generated
+        :rtype: str
+        """
+        return self.previous.get(self.relative_path(file_path))
+
+    def add(self, file_path, content_hash):
+        """Records the hash of a file generated in the current run
+
+        :param file_path: Path of the file
+        :type file_path: str
+
+        :param content_hash: Hash of the file content
+        :type content_hash: str
+        """
+        self.current[self.relative_path(file_path)] = content_hash
+
+    def update(self, file_path, content):
+        """Writes the file if it changed since the previous run and records its hash
+
+        :param file_path: Path of the file
+        :type file_path: str
+
+        :param content: Content of the file
+        :type content: bytes
+        """
+        self.add(file_path, update_file(file_path, content, self.get(file_path)))
+
+    def save(self):
+        """Removes the files of the previous run that were not generated again
+        and writes the manifest
+        """
+        for relative_path in set(self.previous) - set(self.current):
+            file_path = os.path.join(self.directory, relative_path)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+        with open(os.path.join(self.directory, MANIFEST_NAME), 'w') as manifest_file:
+            json.dump(self.current, manifest_file, indent=1, sort_keys=True)
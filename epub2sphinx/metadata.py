@@ -0,0 +1,176 @@
+import posixpath
+import zipfile
+
+from .book import get_chapter_names_and_subsections
+from .executor import get_executor
+from ebooklib import epub
+from ebooklib.utils import parse_html_string, parse_string
+from types import SimpleNamespace
+from urllib.parse import unquote
+
+
+def read_package(zip_file):
+    """Returns the parsed OPF file of an epub and its directory, using the container file
+
+    :param zip_file: Opened epub file
+    :type zip_file: class:`zipfile.ZipFile`
+
+    :rtype: (class:`lxml.etree._ElementTree`, str)
+    """
+    container = parse_string(zip_file.read("META-INF/container.xml"))
+    for root_file in container.findall(".//{%s}rootfile[@media-type]" % epub.NAMESPACES["CONTAINERNS"]):
+        if root_file.get("media-type") == "application/oebps-package+xml":
+            opf_file = root_file.get("full-path")
+            return parse_string(zip_file.read(opf_file)), posixpath.dirname(opf_file)
+    raise epub.EpubException(-1, "Can not find container file")
+
+
+def get_metadata_values(package, name):
+    """Returns the text of the Dublin Core metadata elements of the given name"""
+    return [element.text for element in package.iterfind(
+        "{%s}metadata/{%s}%s" % (epub.NAMESPACES["OPF"], epub.NAMESPACES["DC"], name))]
+
+
+def parse_ncx(data):
+    """Parse the table of contents of an NCX file, like ebooklib does
+
+    :rtype: list
+    """
+    daisy = epub.NAMESPACES["DAISY"]
+
+    def get_children(element, depth, item_id):
+        label, content, children = "", "", []
+        for child in element:
+            if child.tag == "{%s}navLabel" % daisy:
+                label = child[0].text
+            elif child.tag == "{%s}content" % daisy:
+                content = child.get("src", "")
+            elif child.tag == "{%s}navPoint" % daisy:
+                children.append(get_children(child, depth + 1, child.get("id", "")))
+        if children:
+            return children if depth == 0 else (epub.Section(label, href=content), children)
+        return epub.Link(content, label, item_id)
+
+    return get_children(parse_string(data).getroot().find("{%s}navMap" % daisy), 0, "")
+
+
+def parse_nav(data, base_path):
+    """Parse the table of contents of an EPUB 3 navigation document, like ebooklib does
+
+    :rtype: list
+    """
+    def parse_list(list_node):
+        items = []
+        for item_node in list_node.findall("li"):
+            sublist_node = item_node.find("ol")
+            link_node = item_node.find("a")
+            if sublist_node is not None:
+                title = item_node[0].text_content()
+                if link_node is not None and link_node.get("href"):
+                    href = posixpath.normpath(posixpath.join(base_path, link_node.get("href")))
+                    items.append((epub.Section(title, href=href), parse_list(sublist_node)))
+                else:
+                    items.append((epub.Section(title), parse_list(sublist_node)))
+            elif link_node is not None and link_node.get("href"):
+                href = posixpath.normpath(posixpath.join(base_path, link_node.get("href")))
+                items.append(epub.Link(href, link_node.text_content()))
+        return items
+
+    nav_node = parse_html_string(data).xpath("//nav[@*='toc']")[0]
+    return parse_list(nav_node.find("ol"))
+
+
+def inspect_book(file_name):
+    """Returns the metadata and the table of contents of an epub without converting it.
+    Only the container, the OPF and the nav or NCX files are read from the epub,
+    and the chapter names and subsections are the ones computed by :class:`epub2sphinx.Book`.
+    The title, author and rights are the raw Dublin Core values of the OPF: unlike :class:`epub2sphinx.Book`,
+    their quotes are not escaped and the rights are None when the book has no dc:rights,
+    instead of the current year and the author.
+
+    :param file_name: Name of the epub file
+    :type file_name: str
+
+    :returns: Title, author, rights, language, identifier, chapter names, subsections and
+        spine (as file names) of the book
+    :rtype: dict
+    """
+    with zipfile.ZipFile(file_name) as zip_file:
+        package, opf_directory = read_package(zip_file)
+        opf = epub.NAMESPACES["OPF"]
+        manifest = {}
+        nav_file = None
+        for item in package.iterfind("{%s}manifest/{%s}item" % (opf, opf)):
+            file_name_in_book = unquote(item.get("href", ""))
+            manifest.setdefault(item.get("id"), file_name_in_book)
+            if (nav_file is None and item.get("media-type") == "application/xhtml+xml" and
+                    "nav" in item.get("properties", "").split()):
+                nav_file = file_name_in_book
+        spine = package.find("{%s}spine" % opf)
+        spine_ids = [item.get("idref") for item in spine] if spine is not None else []
+
+        # The nav document is preferred over the NCX file, like ebooklib does since 0.20,
+        # where ignore_ncx defaults to True (see requirements.txt)
+        if nav_file is not None:
+            toc = parse_nav(zip_file.read(posixpath.normpath(posixpath.join(opf_directory, nav_file))),
+                            posixpath.dirname(nav_file))
+        elif spine is not None and spine.get("toc") in manifest:
+            toc = parse_ncx(zip_file.read(posixpath.normpath(
+                posixpath.join(opf_directory, manifest[spine.get("toc")]))))
+        else:
+            toc = []
+
+    chapter_names, subsections = get_chapter_names_and_subsections(SimpleNamespace(toc=toc))
+    unique_identifier = package.getroot().get("unique-identifier")
+    identifiers = [element.text for element in package.iterfind(
+        "{%s}metadata/{%s}identifier" % (opf, epub.NAMESPACES["DC"])) if element.get("id") == unique_identifier]
+    titles, creators, rights, languages = (get_metadata_values(package, name)
+                                           for name in ("title", "creator", "rights", "language"))
+    return {
+        'file': file_name,
+        'title': titles[0] if titles else None,
+        'author': creators[0] if creators else None,
+        'rights': rights[0] if rights else None,
+        'language': languages[0] if languages else None,
+        'identifier': (identifiers or get_metadata_values(package, "identifier") or [None])[0],
+        'chapter_names': chapter_names,
+        'subsections': subsections,
+        'spine': [manifest[item_id] for item_id in spine_ids if item_id in manifest],
+    }
+
+
+def try_inspect_book(file_name):
+    """Returns the result of :func:`inspect_book`, or the error if the epub cannot be read
+
+    :param file_name: Name of the epub file
+    :type file_name: str
+
+    :rtype: dict
+    """
+    try:
+        return inspect_book(file_name)
+    except Exception as exception:
+        return {'file': file_name, 'error': "{}: {}".format(type(exception).__name__, exception)}
+
+
+def inspect_books(file_names, executor='process', jobs=None, chunk_size=16):
+    """Inspect many epub files on a worker pool. A file that cannot be read does not
+    stop the others, its result holds the error instead.
+
+    :param file_names: List of epub files
+    :type file_names: list
+
+    :param executor: Backend of the worker pool, see :func:`epub2sphinx.executor.get_executor`
+    :type executor: str
+
+    :param jobs: Number of workers
+    :type jobs: int
+
+    :param chunk_size: Number of files sent to a worker process at once
+    :type chunk_size: int
+
+    :returns: Iterator over the results, in the order of the files
+    :rtype: iterator
+    """
+    with get_executor(executor, jobs) as pool:
+        yield from pool.map(try_inspect_book, file_names, chunksize=chunk_size)
@@ -0,0 +1,101 @@
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import tempfile
+
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Arguments of renameat2: paths relative to the current directory, and exchange the two paths
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+@contextmanager
+def staging_directory(output_directory):
+    """Context manager that creates a staging directory next to the output directory,
+    on the same filesystem, so that the finished output can be published with a rename.
+    The staging directory and everything left in it are removed at the end.
+
+    :param output_directory: Directory the output is published to
+    :type output_directory: str
+
+    :returns: Path of the staging directory
+    :rtype: str
+    """
+    output_directory = os.path.abspath(output_directory)
+    parent_directory, name = os.path.split(output_directory.rstrip(os.path.sep))
+    os.makedirs(parent_directory, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix=".{}.".format(name), suffix=".staging", dir=parent_directory)
+    try:
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def exchange_paths(first_path, second_path):
+    """Atomically exchange two paths with renameat2(RENAME_EXCHANGE), where the platform
+    and the filesystem support it (Linux 3.15 and glibc 2.28 or later)
+
+    :param first_path: First path
+    :type first_path: str
+
+    :param second_path: Second path
+    :type second_path: str
+
+    :returns: If the paths were exchanged, False if the exchange is not supported
+    :rtype: bool
+
+    :raises OSError: If the exchange is supported but failed
+    """
+    renameat2 = get_renameat2()
+    if renameat2 is None:
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(first_path), AT_FDCWD, os.fsencode(second_path), RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        # The kernel or the filesystem does not support the exchange
+        return False
+    raise OSError(error, os.strerror(error), first_path, None, second_path)
+
+
+@lru_cache(maxsize=None)
+def get_renameat2():
+    """Returns the renameat2 function of the C library, or None if it does not have it"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+def publish_directory(directory, output_directory, staging_directory):
+    """Replace the output directory with a finished directory of the staging directory.
+    The previous output ends up in the staging directory, so that it is removed with it.
+
+    Where renameat2(RENAME_EXCHANGE) is supported, the two directories are swapped in a single
+    atomic operation, so readers see either the previous or the new output. Elsewhere the previous
+    output is moved away before the new output is moved in, and the output directory does not
+    exist between these two renames. Readers never see a partially written output in both cases.
+
+    :param directory: Finished directory inside the staging directory
+    :type directory: str
+
+    :param output_directory: Directory the output is published to
+    :type output_directory: str
+
+    :param staging_directory: Staging directory returned by :func:`staging_directory`
+    :type staging_directory: str
+    """
+    if os.path.lexists(output_directory):
+        if exchange_paths(directory, output_directory):
+            return
+        os.rename(output_directory, os.path.join(staging_directory, "previous"))
+    os.rename(directory, output_directory)
@@ -0,0 +1,248 @@
+import os
+import pypandoc
+import subprocess
+import threading
+
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+
+# Lua script run by each worker with `pandoc lua`. It reads the documents from its standard input,
+# each preceded by a line with its size in bytes, and writes the ReST of each document preceded by
+# a line with the status and the size of the result. The worker exits when its input is closed.
+worker_script = """
+while true do
+  local header = io.read('l')
+  if not header then break end
+  local size = tonumber(header)
+  local text = size > 0 and io.read(size) or ''
+  local ok, result = pcall(function() return pandoc.write(pandoc.read(text, 'html'), 'rst') end)
+  if not ok then
+    result = tostring(result)
+  elseif result:sub(-1) ~= '\\n' then
+    -- The pandoc command ends its output with a newline
+    result = result .. '\\n'
+  end
+  io.write(ok and 'OK ' or 'ERR ', #result, '\\n', result)
+  io.flush()
+end
+"""
+
+
+class PandocWorkerError(Exception):
+    """Raised when a pandoc worker crashes, times out or fails to convert a document"""
+
+
+class PandocWorker:
+    """This class runs a long-lived pandoc process that converts HTML documents into ReST,
+    so that pandoc is not started again for every document
+
+    :param timeout: Maximum time in seconds to convert a document, the worker is killed after it
+    :type timeout: float
+    """
+    def __init__(self, timeout=None):
+        """PandocWorker Constructor
+
+        :param timeout: Maximum time in seconds to convert a document, None waits forever
+        :type timeout: float
+        """
+        self.timeout = timeout
+        self.timed_out = False
+        self.process = None
+        self.start()
+
+    def start(self):
+        """Start the pandoc process of the worker"""
+        self.timed_out = False
+        self.process = subprocess.Popen([pypandoc.get_pandoc_path(), "lua", "-e", worker_script],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        """Kill the worker when a conversion takes longer than the timeout"""
+        self.timed_out = True
+        self.process.kill()
+
+    def convert(self, html_content):
+        """Convert preprocessed HTML content into ReST, with the same options as
+        :func:`epub2sphinx.chapter.convert_html`
+
+        :param html_content: Preprocessed HTML content
+        :type html_content: str
+
+        :returns: ReST content
+        :rtype: str
+
+        :raises PandocWorkerError: If the worker crashed, timed out or failed to convert the document
+        """
+        data = html_content.encode("utf-8")
+        timer = threading.Timer(self.timeout, self.kill) if self.timeout else None
+        if timer:
+            timer.start()
+        try:
+            self.process.stdin.write(b"%d\n" % len(data) + data)
+            self.process.stdin.flush()
+            header = self.process.stdout.readline().split()
+            if len(header) != 2:
+                if self.timed_out:
+                    raise PandocWorkerError("The pandoc worker timed out after {}s".format(self.timeout))
+                raise PandocWorkerError("The pandoc worker exited with exitcode {}".format(self.process.wait()))
+            size = int(header[1])
+            result = self.process.stdout.read(size)
+            if len(result) != size:
+                raise PandocWorkerError("The pandoc worker exited with exitcode {}".format(self.process.wait()))
+            result = result.decode("utf-8", errors="replace")
+        except OSError as error:
+            self.process.kill()
+            self.process.wait()
+            raise PandocWorkerError("The pandoc worker exited: {}".format(error))
+        finally:
+            if timer:
+                timer.cancel()
+        if header[0] != b"OK":
+            raise PandocWorkerError("The pandoc worker failed to convert the document: {}".format(result))
+        return result
+
+    def close(self):
+        """Stop the worker. It is killed, as it keeps no state between the documents."""
+        self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+
+class PandocWorkerPool:
+    """This class keeps a pool of long-lived pandoc workers and sends each document to an idle worker.
+    The workers are started when they are first needed. A worker that crashed is restarted and
+    the document is sent again once, and a document that timed out or still fails is converted
+    by a new pandoc process, like :func:`epub2sphinx.chapter.convert_html` does.
+
+    The pool can be sent to worker processes: each process then uses its own pool of a single worker,
+    as a worker process converts one batch of chapters at a time.
+
+    :param size: Maximum number of workers
+    :type size: int
+
+    :param restarts: Number of workers restarted after a crash or a timeout
+    :type restarts: int
+
+    :param fallbacks: Number of documents converted by a new pandoc process
+    :type fallbacks: int
+    """
+    def __init__(self, size=None, timeout=300):
+        """PandocWorkerPool Constructor
+
+        :param size: Maximum number of workers, defaults to the number of processors
+        :type size: int
+
+        :param timeout: Maximum time in seconds to convert a document in a worker
+        :type timeout: float
+        """
+        self.size = size or os.cpu_count() or 1
+        self.timeout = timeout
+        self.idle_workers = []
+        self.available = threading.BoundedSemaphore(self.size)
+        self.lock = threading.Lock()
+        self.restarts = 0
+        self.fallbacks = 0
+
+    def __reduce__(self):
+        # Only the timeout of the pool is sent to the worker processes. Each process runs one conversion
+        # at a time, so its pool has a single worker instead of one per job in every process.
+        return get_process_worker_pool, (1, self.timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def worker(self):
+        """Context manager that takes an idle worker from the pool, or starts a new one,
+        and gives it back to the pool afterwards
+
+        :rtype: class:`PandocWorker`
+        """
+        with self.available:
+            with self.lock:
+                worker = self.idle_workers.pop() if self.idle_workers else None
+            worker = worker or PandocWorker(self.timeout)
+            try:
+                yield worker
+            finally:
+                with self.lock:
+                    self.idle_workers.append(worker)
+
+    def convert(self, html_content):
+        """Convert preprocessed HTML content into ReST with a worker
+
+        :param html_content: Preprocessed HTML content
+        :type html_content: str
+
+        :returns: ReST content
+        :rtype: str
+        """
+        with self.worker() as worker:
+            for _ in range(2):
+                if not worker.alive:
+                    worker.close()
+                    worker.start()
+                    with self.lock:
+                        self.restarts += 1
+                try:
+                    return worker.convert(html_content)
+                except PandocWorkerError:
+                    # The document is only sent again if the worker crashed while converting it,
+                    # as it would time out again or fail to convert again
+                    if worker.alive or worker.timed_out:
+                        break
+        with self.lock:
+            self.fallbacks += 1
+        return pypandoc.convert_text(html_content, 'rst', format='html')
+
+    def close(self):
+        """Stop the idle workers"""
+        with self.lock:
+            workers, self.idle_workers = self.idle_workers, []
+        for worker in workers:
+            worker.close()
+
+
+@lru_cache(maxsize=None)
+def get_process_worker_pool(size, timeout):
+    """Returns the pool of pandoc workers of the current process, used in place of
+    the pools sent to worker processes
+
+    :rtype: class:`PandocWorkerPool`
+    """
+    return PandocWorkerPool(size, timeout)
+
+
+def get_pandoc_backend(backend='process', jobs=None):
+    """Returns the pandoc workers used to convert the chapters
+
+    An existing pool can be passed as the backend to share it between conversions,
+    it is not closed when the conversion finishes.
+
+    :param backend: 'process' to start pandoc for every conversion, 'worker' to keep a pool
+        of pandoc workers, or a class:`PandocWorkerPool` instance
+    :type backend: str or class:`PandocWorkerPool`
+
+    :param jobs: Number of workers, None uses the number of processors
+    :type jobs: int
+
+    :returns: Context manager of the pool, or of None for 'process'
+    """
+    if isinstance(backend, PandocWorkerPool):
+        return nullcontext(backend)
+    elif backend == 'process':
+        return nullcontext()
+    elif backend == 'worker':
+        return PandocWorkerPool(jobs)
+    raise ValueError("Unknown pandoc backend: {}".format(backend))
@@ -0,0 +1,251 @@
+import asyncio
+import os
+import pypandoc
+import time
+
+from .batch import convert_html_batch, finish_batch, join_html_batch, make_batches, prepare_batch, split_rst_batch
+from .convert import extract_file, get_filename, merge_chapters, merge_subchapters, write_chapter
+from .executor import get_executor
+from .pandoc_workers import get_pandoc_backend
+from functools import partial
+
+
+def prepare_chapters(chapters, cache=None, engine='auto'):
+    """Run :func:`epub2sphinx.batch.prepare_batch` on a worker. The chapters are returned
+    with the pending ones, as the worker may convert copies of them.
+
+    :returns: The chapters and the list of (chapter, preprocessed HTML content) tuples left for pandoc
+    :rtype: (list, list)
+    """
+    return chapters, prepare_batch(chapters, cache, engine)
+
+
+async def run_pandoc(html_content, semaphore, timing):
+    """Convert preprocessed HTML content into ReST with a pandoc subprocess,
+    with the same options as :func:`epub2sphinx.chapter.convert_html`
+
+    :param html_content: Preprocessed HTML content
+    :type html_content: str
+
+    :param semaphore: Limit on the number of pandoc processes running at the same time
+    :type semaphore: class:`asyncio.Semaphore`
+
+    :param timing: Wall time and CPU time of the pandoc calls, updated with the time of this call
+    :type timing: dict
+
+    :returns: ReST content
+    :rtype: str
+    """
+    async with semaphore:
+        start_time = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            pypandoc.get_pandoc_path(), "--from=html", "--to=rst",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate(html_content.encode("utf-8"))
+        timing['wall_time'] += time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError('Pandoc died with exitcode "{}" during conversion: {}'.format(
+            process.returncode, stderr.decode("utf-8", errors="replace")))
+    return stdout.decode("utf-8", errors="replace")
+
+
+async def convert_html_batch_async(html_contents, semaphore, timing, pandoc=None):
+    """Convert many preprocessed HTML documents into ReST with a single pandoc subprocess,
+    like :func:`epub2sphinx.batch.convert_html_batch`, or with a pool of pandoc workers
+
+    :param html_contents: List of preprocessed HTML documents
+    :type html_contents: list
+
+    :param semaphore: Limit on the number of pandoc processes running at the same time
+    :type semaphore: class:`asyncio.Semaphore`
+
+    :param timing: Wall time and CPU time of the pandoc calls, updated with the time of these calls
+    :type timing: dict
+
+    :param pandoc: Pool of pandoc workers, None starts pandoc subprocesses
+    :type pandoc: class:`epub2sphinx.pandoc_workers.PandocWorkerPool`
+
+    :returns: List of ReST documents
+    :rtype: list
+    """
+    if pandoc is not None:
+        # The workers are blocking, so they are used from a thread
+        async with semaphore:
+            start_time = time.perf_counter()
+            rst_contents = await asyncio.to_thread(convert_html_batch, html_contents, pandoc)
+            timing['wall_time'] += time.perf_counter() - start_time
+        return rst_contents
+    if len(html_contents) > 1:
+        marker, html_content = join_html_batch(html_contents)
+        rst_contents = split_rst_batch(await run_pandoc(html_content, semaphore, timing),
+                                       marker, len(html_contents))
+        if rst_contents is not None:
+            return rst_contents
+    return await asyncio.gather(*(run_pandoc(content, semaphore, timing) for content in html_contents))
+
+
+class ConversionPipeline:
+    """This class runs the conversion of a :class:`epub2sphinx.Converter` as an asyncio pipeline.
+
+    Unlike :meth:`epub2sphinx.Converter.convert`, the stages do not wait for each other: the
+    files are extracted and the images optimized while the chapters are converted, and each
+    chapter is written as soon as it and its subsections are converted. Only the untitled
+    chapters at the beginning of the book wait for each other, as they are merged into the
+    front page. The pandoc processes are run with asyncio, up to the number of jobs at the
+    same time, and the other work runs on the executor of the converter.
+
+    :param converter: The converter whose book is converted
+    :type converter: class:`epub2sphinx.Converter`
+    """
+    def __init__(self, converter):
+        """ConversionPipeline Constructor
+
+        :param converter: The converter whose book is converted
+        :type converter: class:`epub2sphinx.Converter`
+        """
+        self.converter = converter
+        self.manifest = None
+        self.executor = None
+        self.pandoc = None
+        self.pandoc_semaphore = None
+        self.image_task = None
+        # Chapters of the book, each with its subchapters
+        self.parts = []
+        self.remaining_parts = []
+        self.front_count = 0
+        self.convert_progress = None
+        self.write_progress = None
+
+    async def run(self):
+        converter = self.converter
+        self.manifest = converter.setup()
+        with get_executor(converter.executor, converter.jobs) as self.executor, \
+                get_pandoc_backend(converter.pandoc_backend, converter.jobs) as self.pandoc:
+            with converter.stage('read chapters'):
+                chapters = converter.read_chapters()
+            with converter.stage('pipeline'):
+                await self.convert_chapters(chapters)
+        converter.record_conversions([chapter for parts in self.parts for chapter in parts])
+        converter.render_templates(self.manifest)
+
+    async def run_in_executor(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def convert_chapters(self, chapters):
+        """Convert, write and extract everything, with overlapping stages
+
+        :param chapters: Chapters of the book, with their subchapters
+        :type chapters: list
+        """
+        converter = self.converter
+        self.pandoc_semaphore = asyncio.Semaphore(converter.jobs or os.cpu_count() or 1)
+        self.parts = [[chapter] + chapter.subchapters for chapter in chapters]
+        self.remaining_parts = [len(parts) for parts in self.parts]
+        for chapter in chapters:
+            chapter.subchapters = []
+        # The untitled chapters at the beginning of the book are merged into the front page
+        if chapters and not chapters[0].title:
+            self.front_count = next((index for index, chapter in enumerate(chapters) if chapter.title),
+                                    len(chapters))
+        positions = [(index, part_index) for index, parts in enumerate(self.parts)
+                     for part_index in range(len(parts))]
+        self.convert_progress = converter.events.progress('convert chapters', len(positions))
+        # The pages of the split chapters are added to the total when they are split
+        self.write_progress = converter.events.progress('write chapters',
+                                                        len(positions) - max(self.front_count - 1, 0))
+        tasks = [self.convert_batch(batch) for batch in make_batches(positions, converter.batch_size)]
+        if converter.image_optimizer:
+            # The chapters are written once the images are optimized, as their image paths are rewritten
+            self.image_task = asyncio.ensure_future(asyncio.to_thread(
+                converter.image_optimizer.optimize, converter.get_image_items(), converter.source_directory,
+                self.executor, self.manifest))
+            tasks.append(self.image_task)
+        tasks.append(self.extract_files())
+        await asyncio.gather(*tasks)
+
+        heads = [parts[0] for parts in self.parts]
+        converter.book.toctree = [chapter.file for chapter in heads[:min(self.front_count, 1)] +
+                                  heads[self.front_count:]]
+
+    async def convert_batch(self, positions):
+        """Convert a batch of chapters, and write the chapters that are ready
+
+        :param positions: List of (chapter index, part index) tuples of the chapters of the batch
+        :type positions: list
+        """
+        converter = self.converter
+        converter.check_cancelled("converting a chapter")
+        chapters, pending = await self.run_in_executor(
+            partial(prepare_chapters, cache=converter.cache, engine=converter.engine),
+            [self.parts[index][part_index] for index, part_index in positions])
+        if pending:
+            pandoc_timing = {'wall_time': 0.0, 'cpu_time': 0.0}
+            rst_contents = await convert_html_batch_async([html_content for _, html_content in pending],
+                                                          self.pandoc_semaphore, pandoc_timing, self.pandoc)
+            finish_batch(pending, rst_contents, pandoc_timing, converter.cache)
+
+        ready = []
+        for (index, part_index), chapter in zip(positions, chapters):
+            self.parts[index][part_index] = chapter
+            self.convert_progress.update(chapter.file, chapter.size)
+            self.remaining_parts[index] -= 1
+            if self.remaining_parts[index] == 0:
+                if index >= self.front_count:
+                    ready.append([index])
+                elif not any(self.remaining_parts[:self.front_count]):
+                    ready.append(range(self.front_count))
+        await asyncio.gather(*(self.write_chapters(indices) for indices in ready))
+
+    async def write_chapters(self, indices):
+        """Merge and write converted chapters with their subchapters
+
+        :param indices: Indices of the chapters, more than one for the chapters merged into the front page
+        :type indices: list
+        """
+        converter = self.converter
+        if self.image_task:
+            await self.image_task
+        converter.check_cancelled("writing a chapter")
+        chapters, subchapters = [], []
+        for index in indices:
+            chapter, *chapter_subchapters = self.parts[index]
+            if converter.image_optimizer:
+                for part in self.parts[index]:
+                    converter.image_optimizer.rewrite_chapter(part)
+            chapter.subchapters = chapter_subchapters
+            subchapters.extend(chapter_subchapters)
+            if converter.max_page_size:
+                # The subsections are only written as their own pages, listed in the toctree of their chapter
+                chapter.toctree = [chapter.get_document_name(subchapter) for subchapter in chapter_subchapters]
+            else:
+                merge_subchapters(chapter)
+            chapters.append(chapter)
+        if indices[0] < self.front_count:
+            merge_chapters(chapters)
+        pages = []
+        if converter.max_page_size:
+            for chapter in subchapters + chapters:
+                pages.extend(chapter.split(converter.max_page_size))
+            self.write_progress.total += len(pages)
+        await asyncio.gather(*(self.write_chapter(chapter) for chapter in subchapters + chapters + pages))
+
+    async def write_chapter(self, chapter):
+        path = chapter.get_path(self.converter.source_directory)
+        content_hash = await self.run_in_executor(write_chapter, chapter, self.converter.source_directory,
+                                                  self.manifest.get(path))
+        self.manifest.add(path, content_hash)
+        self.write_progress.update(chapter.file)
+
+    async def extract_files(self):
+        """Extract the images, CSS and fonts of the book"""
+        items = self.converter.get_extracted_items()
+        progress = self.converter.events.progress('extract files', len(items))
+
+        async def extract_item(item):
+            path = get_filename(item, self.converter.source_directory)
+            content_hash = await self.run_in_executor(extract_file, item.archive, item.zip_name, path,
+                                                      self.manifest.get(path))
+            self.manifest.add(path, content_hash)
+            progress.update(item.file_name, item.archive.getinfo(item.zip_name).file_size)
+
+        await asyncio.gather(*(extract_item(item) for item in items))
@@ -0,0 +1,333 @@
+import email.utils
+import gzip
+import html
+import mimetypes
+import os
+import posixpath
+import shutil
+import urllib.parse
+
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import brotli
+except ImportError:  # Brotli is only needed to precompress the files with brotli
+    brotli = None
+
+# Precompressed variants of a file, in the order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Files that are worth compressing, the images and fonts of the books are already compressed
+COMPRESSED_TYPES = ('.html', '.css', '.js', '.svg', '.json', '.txt', '.xml')
+
+
+def is_brotli_available():
+    """Returns a boolean indicating if Brotli is installed to precompress the files with brotli
+
+    :rtype: bool
+    """
+    return brotli is not None
+
+
+def precompress(directory, min_size=1024):
+    """Write gzip (and brotli, if Brotli is installed) compressed copies of the text files of a directory,
+    next to the files. The preview server sends them to the clients that accept these encodings.
+    A copy is only written again when its file changed.
+
+    :param directory: Directory of the HTML output
+    :type directory: str
+
+    :param min_size: Files smaller than this size in bytes are not compressed
+    :type min_size: int
+
+    :returns: Number of compressed copies written
+    :rtype: int
+    """
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    written = 0
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if not file_name.endswith(COMPRESSED_TYPES):
+                continue
+            path = os.path.join(root, file_name)
+            file_stat = os.stat(path)
+            if file_stat.st_size < min_size:
+                continue
+            data = None
+            for suffix, compress in compressors:
+                compressed_path = path + suffix
+                if os.path.isfile(compressed_path) and os.stat(compressed_path).st_mtime_ns == file_stat.st_mtime_ns:
+                    continue
+                if data is None:
+                    with open(path, 'rb') as input_file:
+                        data = input_file.read()
+                with open(compressed_path, 'wb') as output_file:
+                    output_file.write(compress(data))
+                # The copy has the time of its file, so that it is known to be up to date
+                os.utime(compressed_path, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+                written += 1
+    return written
+
+
+def get_accepted_encodings(accept_encoding):
+    """Returns the content encodings accepted by a client
+
+    :param accept_encoding: Value of the Accept-Encoding header
+    :type accept_encoding: str
+
+    :rtype: set
+    """
+    encodings = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, parameters = part.strip().partition(';')
+        quality = parameters.strip()
+        if quality.startswith('q=') and quality[2:].strip('0.') == '':
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    """Serves the files of the books of the preview server, with ETag and Last-Modified headers
+    for revalidation, the precompressed copies of the files when the client accepts them,
+    and the file content sent with sendfile
+    """
+    server_version = "epub2sphinx"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def send_body(self, status_code, body, content_type, send_body, headers=()):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def serve(self, send_body):
+        url_path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if url_path == '/' and '' not in self.server.books:
+            self.send_book_list(send_body)
+            return
+        path = self.server.translate_path(url_path)
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        if os.path.isdir(path):
+            if not url_path.endswith('/'):
+                # Redirect to the directory, so that the relative links of its index work
+                self.send_body(HTTPStatus.MOVED_PERMANENTLY, b"", "text/plain", send_body,
+                               [("Location", urllib.parse.quote(url_path + '/'))])
+                return
+            path = os.path.join(path, "index.html")
+        self.send_file(path, send_body)
+
+    def send_book_list(self, send_body):
+        links = "".join('<li><a href="/{0}/">{1}</a></li>'.format(urllib.parse.quote(name), html.escape(name))
+                        for name in sorted(self.server.books))
+        body = ("<!DOCTYPE html><html><head><meta charset='utf-8'><title>Books</title></head>"
+                "<body><h1>Books</h1><ul>{}</ul></body></html>".format(links)).encode()
+        self.send_body(HTTPStatus.OK, body, "text/html; charset=utf-8", send_body,
+                       [("Cache-Control", "no-cache")])
+
+    def send_file(self, path, send_body):
+        try:
+            file_stat = os.stat(path)
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        headers = [("Last-Modified", email.utils.formatdate(file_stat.st_mtime, usegmt=True)),
+                   ("Cache-Control", self.server.get_cache_control(path))]
+        etag = '{:x}-{:x}'.format(file_stat.st_mtime_ns, file_stat.st_size)
+        if path.endswith(COMPRESSED_TYPES):
+            headers.append(("Vary", "Accept-Encoding"))
+            encoding, path = self.get_precompressed(path, file_stat)
+            if encoding:
+                headers.append(("Content-Encoding", encoding))
+                etag += '-' + encoding
+        headers.append(("ETag", '"{}"'.format(etag)))
+
+        if self.is_not_modified(headers[-1][1], file_stat.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            if send_body and size:
+                self.send_content(file)
+
+    def get_precompressed(self, path, file_stat):
+        """Returns the precompressed copy of a file to send, if the client accepts its encoding
+        and the copy is up to date, see :func:`precompress`
+
+        :param path: Path of the file
+        :type path: str
+
+        :param file_stat: Status of the file
+        :type file_stat: class:`os.stat_result`
+
+        :returns: The content encoding, or None, and the path of the file to send
+        :rtype: (str, str)
+        """
+        accepted = get_accepted_encodings(self.headers.get("Accept-Encoding"))
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted:
+                try:
+                    if os.stat(path + suffix).st_mtime_ns == file_stat.st_mtime_ns:
+                        return encoding, path + suffix
+                except OSError:
+                    pass
+        return None, path
+
+    def send_content(self, file):
+        """Send the content of a file, with sendfile when the platform supports it"""
+        try:
+            self.connection.sendfile(file)
+        except (AttributeError, OSError, ValueError):
+            # Connections that are not plain sockets
+            file.seek(0)
+            shutil.copyfileobj(file, self.wfile)
+
+    def is_not_modified(self, etag, mtime):
+        """Returns a boolean indicating if the client already has this version of the file
+
+        :param etag: ETag of the file
+        :type etag: str
+
+        :param mtime: Modification time of the file
+        :type mtime: float
+
+        :rtype: bool
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            # If-Modified-Since is ignored when If-None-Match is present
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since.timestamp() >= int(mtime)
+        return False
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, 'quiet', False):
+            super().log_message(format, *args)
+
+
+class PreviewServer(ThreadingHTTPServer):
+    """Threaded HTTP server that serves the HTML output of one or more converted books.
+    A single book is served at the root, several books are served under their names,
+    with a list of the books at the root.
+
+    :param books: (Name => HTML directory) mapping, the book served at the root has an empty name
+    :type books: dict
+    """
+    daemon_threads = True
+
+    def __init__(self, books, host='127.0.0.1', port=0, max_age=300, quiet=False):
+        """PreviewServer Constructor
+
+        :param books: (Name => HTML directory) mapping, the book served at the root has an empty name
+        :type books: dict
+
+        :param host: Address to listen on
+        :type host: str
+
+        :param port: Port to listen on, 0 uses any available port
+        :type port: int
+
+        :param max_age: Time in seconds the clients can reuse the images, styles and scripts
+            without revalidating them. The pages are always revalidated.
+        :type max_age: int
+
+        :param quiet: Do not log the requests
+        :type quiet: bool
+        """
+        self.books = {name: os.path.realpath(directory) for name, directory in books.items()}
+        self.max_age = max_age
+        self.quiet = quiet
+        super().__init__((host, port), PreviewRequestHandler)
+
+    def translate_path(self, url_path):
+        """Returns the file of a URL path, or None if it is not in a book
+
+        :param url_path: Unquoted path of the URL
+        :type url_path: str
+
+        :rtype: str
+        """
+        parts = [part for part in posixpath.normpath(url_path).split('/') if part not in ('', '.', '..')]
+        if '' in self.books:
+            root = self.books['']
+        elif parts and parts[0] in self.books:
+            root = self.books[parts.pop(0)]
+        else:
+            return None
+        if any(os.sep in part or (os.altsep and os.altsep in part) for part in parts):
+            return None
+        path = os.path.join(root, *parts)
+        # Do not follow links out of the book
+        if os.path.commonpath([root, os.path.realpath(path)]) != root:
+            return None
+        return path
+
+    def get_cache_control(self, path):
+        """Returns the Cache-Control header of a file
+
+        :param path: Path of the file
+        :type path: str
+
+        :rtype: str
+        """
+        if path.endswith('.html'):
+            return "no-cache"
+        return "max-age={}".format(self.max_age)
+
+
+def get_book_names(directories):
+    """Returns a unique URL name for each book directory
+
+    :param directories: List of the HTML directories of the books
+    :type directories: list
+
+    :returns: (Name => HTML directory) mapping
+    :rtype: dict
+    """
+    books = {}
+    for directory in directories:
+        name = os.path.basename(os.path.normpath(os.path.abspath(directory)))
+        unique_name, index = name, 1
+        while unique_name in books:
+            index += 1
+            unique_name = "{}-{}".format(name, index)
+        books[unique_name] = directory
+    return books
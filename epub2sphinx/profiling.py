@@ -0,0 +1,166 @@
+import json
+import sys
+import time
+
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+@contextmanager
+def record_time(timings, name):
+    """Add the wall time and the CPU time of the calling thread spent in the block
+    to the timings of the given name
+
+    :param timings: (Name => {'wall_time', 'cpu_time'}) mapping to update
+    :type timings: dict
+
+    :param name: Name of the timed step
+    :type name: str
+    """
+    wall_start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        timing = timings.setdefault(name, {'wall_time': 0.0, 'cpu_time': 0.0})
+        timing['wall_time'] += time.perf_counter() - wall_start
+        timing['cpu_time'] += time.thread_time() - cpu_start
+
+
+def get_peak_rss(who='self'):
+    """Returns the peak resident set size in bytes
+
+    :param who: 'self' for this process, 'children' for the largest finished child
+        process (like pandoc or Sphinx)
+    :type who: str
+
+    :returns: Peak RSS in bytes, or None if it cannot be measured on this platform
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def get_children_cpu_time():
+    """Returns the CPU time used by the finished child processes, like pandoc
+
+    :rtype: float
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Profiler:
+    """This class records the wall time and CPU time of each stage of a conversion,
+    and the time spent on each chapter.
+
+    The CPU time of a stage covers every thread of this process, the CPU time of
+    child processes (like pandoc) is reported separately. The CPU time of worker
+    processes is not included.
+
+    :param stages: (Stage name => timings) mapping, in the order the stages ran
+    :type stages: dict
+
+    :param chapters: Timings of each chapter
+    :type chapters: list
+    """
+    def __init__(self):
+        """Profiler Constructor
+        """
+        self.stages = {}
+        self.chapters = []
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that records the time spent in a stage
+
+        :param name: Name of the stage
+        :type name: str
+        """
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        children_cpu_start = get_children_cpu_time()
+        try:
+            yield
+        finally:
+            timing = self.stages.setdefault(name, {'wall_time': 0.0, 'cpu_time': 0.0, 'children_cpu_time': 0.0})
+            timing['wall_time'] += time.perf_counter() - wall_start
+            timing['cpu_time'] += time.process_time() - cpu_start
+            timing['children_cpu_time'] += get_children_cpu_time() - children_cpu_start
+
+    def add_chapters(self, chapters):
+        """Record the timings of converted chapters
+
+        :param chapters: List of chapters
+        :type chapters: list
+        """
+        for chapter in chapters:
+            self.chapters.append({
+                'file': chapter.file,
+                'converted_by': chapter.converted_by,
+                'wall_time': sum(timing['wall_time'] for timing in chapter.timings.values()),
+                'cpu_time': sum(timing['cpu_time'] for timing in chapter.timings.values()),
+                'steps': chapter.timings,
+            })
+
+    def get_report(self, slowest_chapters=10):
+        """Returns the profiling report
+
+        :param slowest_chapters: Number of chapters listed in the report, None lists all of them
+        :type slowest_chapters: int
+
+        :returns: Report with the timings of the stages and the slowest chapters
+        :rtype: dict
+        """
+        chapters = sorted(self.chapters, key=lambda chapter: chapter['wall_time'], reverse=True)
+        return {
+            'wall_time': sum(timing['wall_time'] for timing in self.stages.values()),
+            'cpu_time': sum(timing['cpu_time'] for timing in self.stages.values()),
+            'children_cpu_time': sum(timing['children_cpu_time'] for timing in self.stages.values()),
+            'peak_rss': get_peak_rss('self'),
+            'peak_children_rss': get_peak_rss('children'),
+            'stages': [dict(name=name, **timing) for name, timing in self.stages.items()],
+            'chapter_count': len(chapters),
+            'chapters': chapters[:slowest_chapters],
+        }
+
+    def write_json(self, file_name):
+        """Write the report with the timings of all the chapters as JSON
+
+        :param file_name: Name of the JSON file
+        :type file_name: str
+        """
+        with open(file_name, 'w') as report_file:
+            json.dump(self.get_report(slowest_chapters=None), report_file, indent=2)
+
+    def format_report(self, slowest_chapters=10):
+        """Returns the profiling report as text
+
+        :param slowest_chapters: Number of chapters listed in the report
+        :type slowest_chapters: int
+
+        :rtype: str
+        """
+        report = self.get_report(slowest_chapters)
+        lines = ["{:<24}{:>12}{:>12}{:>14}".format("Stage", "Wall (s)", "CPU (s)", "Child CPU (s)")]
+        for stage in report['stages'] + [dict(name='total', **report)]:
+            lines.append("{:<24}{:>12.3f}{:>12.3f}{:>14.3f}".format(
+                stage['name'], stage['wall_time'], stage['cpu_time'], stage['children_cpu_time']))
+        if report['chapters']:
+            lines.append("")
+            lines.append("Slowest chapters (of {}):".format(report['chapter_count']))
+            for chapter in report['chapters']:
+                lines.append("  {:<40}{:>10.3f}s  {}".format(
+                    chapter['file'], chapter['wall_time'], chapter['converted_by']))
+        if report['peak_rss'] is not None:
+            lines.append("")
+            lines.append("Peak RSS: {:.1f} MB (child processes: {:.1f} MB)".format(
+                report['peak_rss'] / 2**20, report['peak_children_rss'] / 2**20))
+        return "\n".join(lines)
@@ -0,0 +1,208 @@
+import os
+import posixpath
+import zipfile
+
+from ebooklib import epub
+from urllib.parse import unquote
+
+
+class EpubArchive:
+    """Random access to the files inside an epub.
+    The zip file is opened once in every process, so that instances can be sent to
+    worker processes.
+
+    :param file_name: Name of the epub file
+    :type file_name: str
+    """
+    def __init__(self, file_name):
+        """EpubArchive Constructor
+
+        :param file_name: Name of the epub file
+        :type file_name: str
+        """
+        # The epub is opened again in other processes, so the path must not depend on the
+        # working directory
+        self.file_name = os.path.abspath(file_name)
+        self._zip_file = None
+        self._pid = None
+
+    def __getstate__(self):
+        return {'file_name': self.file_name, '_zip_file': None, '_pid': None}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def zip_file(self):
+        """Returns the zip file opened by this process
+
+        :rtype: class:`zipfile.ZipFile`
+        """
+        if self._zip_file is None or self._pid != os.getpid():
+            self._zip_file = zipfile.ZipFile(self.file_name, 'r')
+            self._pid = os.getpid()
+        return self._zip_file
+
+    def close(self):
+        """Close the zip file opened by this process. It is opened again if the archive is read afterwards."""
+        if self._zip_file is not None and self._pid == os.getpid():
+            self._zip_file.close()
+        self._zip_file = None
+        self._pid = None
+
+    def read(self, name):
+        """Returns the content of a file inside the epub
+
+        :param name: Path of the file inside the epub
+        :type name: str
+
+        :rtype: bytes
+        """
+        return self.zip_file().read(name)
+
+    def open(self, name):
+        """Returns a file object to stream a file inside the epub
+
+        :param name: Path of the file inside the epub
+        :type name: str
+
+        :rtype: file object
+        """
+        return self.zip_file().open(name)
+
+    def getinfo(self, name):
+        """Returns the ZipInfo of a file inside the epub
+
+        :param name: Path of the file inside the epub
+        :type name: str
+
+        :rtype: class:`zipfile.ZipInfo`
+        """
+        return self.zip_file().getinfo(name)
+
+
+class LazyItem:
+    """Mixin for the ebooklib item classes that reads the content from the epub
+    only when it is used, instead of keeping it in memory.
+
+    :param archive: Archive that contains the item
+    :type archive: class:`EpubArchive`
+
+    :param zip_name: Path of the item inside the epub
+    :type zip_name: str
+    """
+    archive = None
+    zip_name = None
+    _content = b''
+
+    @property
+    def content(self):
+        if self.archive is None:
+            return self._content
+        return self.archive.read(self.zip_name)
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self.archive = None
+
+    def open(self):
+        """Returns a file object to stream the content of the item
+
+        :rtype: file object
+        """
+        return self.archive.open(self.zip_name)
+
+
+def lazy(item_class):
+    return type('Lazy' + item_class.__name__, (LazyItem, item_class), {})
+
+
+LazyEpubItem = lazy(epub.EpubItem)
+LazyEpubHtml = lazy(epub.EpubHtml)
+LazyEpubNav = lazy(epub.EpubNav)
+LazyEpubCoverHtml = lazy(epub.EpubCoverHtml)
+LazyEpubImage = lazy(epub.EpubImage)
+LazyEpubCover = lazy(epub.EpubCover)
+LazyEpubNcx = lazy(epub.EpubNcx)
+LazyEpubSMIL = lazy(epub.EpubSMIL)
+
+
+class LazyEpubReader(epub.EpubReader):
+    """Epub reader that only parses the OPF, NCX and nav files up front.
+    The content of the other items is read from the zip file on demand.
+
+    It overrides the private _load and _load_manifest methods of EbookLib 0.20,
+    so requirements.txt pins EbookLib to this release. Check these methods again
+    against the new release before raising the pin.
+    """
+    def read_file(self, name):
+        return self.archive.read(posixpath.normpath(name))
+
+    def _load(self):
+        self.archive = EpubArchive(self.file_name)
+        try:
+            self.archive.zip_file()
+        except zipfile.BadZipfile:
+            raise epub.EpubException(0, "Bad Zip file")
+        self._load_container()
+        self._load_opf_file()
+
+    def _load_manifest(self):
+        for r in self.container.find("{%s}%s" % (epub.NAMESPACES["OPF"], "manifest")):
+            if r is not None and r.tag != "{%s}item" % epub.NAMESPACES["OPF"]:
+                continue
+
+            media_type = r.get("media-type")
+            properties = r.get("properties", "").split()
+            # people use wrong content types
+            if media_type == "image/jpg":
+                media_type = "image/jpeg"
+
+            if media_type == "application/x-dtbncx+xml":
+                item = LazyEpubNcx()
+            elif media_type == "application/smil+xml":
+                item = LazyEpubSMIL()
+            elif media_type == "application/xhtml+xml":
+                if "nav" in properties:
+                    item = LazyEpubNav()
+                elif "cover" in properties:
+                    item = LazyEpubCoverHtml()
+                else:
+                    item = LazyEpubHtml()
+                    item.media_overlay = r.get("media-overlay", None)
+                    item.media_duration = r.get("duration", None)
+                    item.properties = properties
+            elif media_type in epub.IMAGE_MEDIA_TYPES:
+                if "cover-image" in properties:
+                    item = LazyEpubCover()
+                else:
+                    item = LazyEpubImage()
+            else:
+                item = LazyEpubItem()
+
+            item.id = r.get("id")
+            item.file_name = unquote(r.get("href"))
+            item.media_type = media_type
+            item.archive = self.archive
+            item.zip_name = posixpath.normpath(posixpath.join(self.opf_dir, item.file_name))
+            self.book.add_item(item)
+
+
+def read_epub(file_name):
+    """Reads the structure of an epub without loading the content of its items
+
+    :param file_name: Name of the epub file
+    :type file_name: str
+
+    :returns: EpubBook instance whose items read their content on demand from its archive attribute,
+        an :class:`EpubArchive` to close once the book is not read anymore
+    :rtype: class:`ebooklib.epub.EpubBook`
+    """
+    reader = LazyEpubReader(file_name)
+    book = reader.load()
+    reader.process()
+    book.archive = reader.archive
+    return book
@@ -0,0 +1,426 @@
+import json
+import os
+import socketserver
+import threading
+import time
+import uuid
+
+from .bulk import convert_book
+from .constants import ENGINES, IMAGE_FORMATS
+from .convert import get_template_environment
+from .executor import get_executor
+from .pandoc_workers import get_pandoc_backend
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Options of a job and their types, 'input' and 'output' are required
+JOB_OPTIONS = {
+    'input': str,
+    'output': str,
+    'theme': str,
+    'build': bool,
+    'include_custom_css': bool,
+    'overwrite': bool,
+    'engine': str,
+    'optimize_images': bool,
+    'max_image_size': int,
+    'image_format': str,
+    'max_page_size': int,
+    'pipeline': bool,
+}
+# Values accepted for the options that have a fixed set of values
+JOB_OPTION_CHOICES = {
+    'engine': ENGINES,
+    'image_format': IMAGE_FORMATS,
+}
+# Options that must be positive
+POSITIVE_JOB_OPTIONS = ('max_image_size', 'max_page_size')
+FINISHED_STATUSES = ('ok', 'failed', 'skipped', 'cancelled')
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue of the service is full"""
+
+
+class Job:
+    """This class holds a conversion job of the service and its status
+
+    :param id: ID of the job
+    :type id: str
+
+    :param options: Options of the job, see :data:`JOB_OPTIONS`
+    :type options: dict
+
+    :param status: 'queued', 'running', or the status of the finished conversion:
+        'ok', 'failed', 'skipped' or 'cancelled'
+    :type status: str
+
+    :param result: Result of the finished conversion, see :func:`epub2sphinx.bulk.convert_book`
+    :type result: dict
+
+    :param stage: Current stage of the running conversion
+    :type stage: str
+
+    :param progress: Last progress event of the current stage, with the number of chapters
+        done and the throughput, see :class:`epub2sphinx.events.EventEmitter`
+    :type progress: dict
+    """
+    def __init__(self, options):
+        """Job Constructor
+
+        :param options: Options of the job, see :data:`JOB_OPTIONS`
+        :type options: dict
+        """
+        self.id = uuid.uuid4().hex
+        self.options = options
+        self.status = 'queued'
+        self.result = None
+        self.stage = None
+        self.progress = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.future = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATUSES
+
+    def update_progress(self, event):
+        """Event listener of the conversion, that keeps the current stage and its progress
+
+        :param event: Event of the conversion
+        :type event: dict
+        """
+        if event['type'] == 'stage_started':
+            self.stage, self.progress = event['stage'], None
+        elif event['type'] == 'progress':
+            self.progress = event
+
+    def to_dict(self):
+        """Returns the status of the job as plain data
+
+        :rtype: dict
+        """
+        return {
+            'id': self.id,
+            'status': self.status,
+            'options': self.options,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stage': self.stage,
+            'progress': self.progress,
+            'result': self.result,
+        }
+
+
+def validate_job_options(options):
+    """Check the options of a submitted job
+
+    :param options: Options of the job
+    :type options: dict
+
+    :raises ValueError: If an option is unknown, missing, has the wrong type or an invalid value
+    """
+    if not isinstance(options, dict):
+        raise ValueError("The job must be a JSON object")
+    for name, value in options.items():
+        if name not in JOB_OPTIONS:
+            raise ValueError("Unknown option: {}".format(name))
+        # bool is a subclass of int, so it is not accepted for the int options
+        if not isinstance(value, JOB_OPTIONS[name]) or (JOB_OPTIONS[name] is int and isinstance(value, bool)):
+            raise ValueError("Option {} must be a {}".format(name, JOB_OPTIONS[name].__name__))
+        if name in JOB_OPTION_CHOICES and value not in JOB_OPTION_CHOICES[name]:
+            raise ValueError("Option {} must be one of {}".format(name, ", ".join(JOB_OPTION_CHOICES[name])))
+        if name in POSITIVE_JOB_OPTIONS and value < 1:
+            raise ValueError("Option {} must be positive".format(name))
+    for name in ('input', 'output'):
+        if name not in options:
+            raise ValueError("Missing option: {}".format(name))
+
+
+def is_in_directory(path, directory):
+    """Returns a boolean indicating if a path is inside a directory, after resolving the symbolic links
+
+    :param path: Path to check, it does not have to exist
+    :type path: str
+
+    :param directory: Resolved path of the directory
+    :type directory: str
+
+    :rtype: bool
+    """
+    path = os.path.realpath(path)
+    return path != directory and os.path.commonpath([directory, path]) == directory
+
+
+class ConversionService:
+    """This class keeps a worker pool and the loaded modules between conversions,
+    and runs the submitted jobs with a limit on the number of concurrent and queued jobs.
+
+    :param max_jobs: Maximum number of jobs running at the same time
+    :type max_jobs: int
+
+    :param max_queue: Maximum number of jobs waiting to run
+    :type max_queue: int
+
+    :param max_finished: Number of finished jobs whose status is kept
+    :type max_finished: int
+
+    :param roots: Resolved directories the input and output of the jobs must be in
+    :type roots: list
+
+    :param jobs: (Job ID => Job) mapping, in the order the jobs were submitted
+    :type jobs: dict
+    """
+    def __init__(self, max_jobs=2, max_queue=16, max_finished=256, executor='thread', jobs=None,
+                 pandoc_backend='process', roots=None, **converter_options):
+        """ConversionService Constructor
+
+        :param roots: Directories the input and output of the jobs must be in,
+            defaults to the current directory. Any client of the service can write to them.
+        :type roots: list
+
+        :param executor: Backend of the shared worker pool, see :func:`epub2sphinx.executor.get_executor`
+        :type executor: str
+
+        :param jobs: Number of workers in the shared worker pool
+        :type jobs: int
+
+        :param pandoc_backend: Backend of the shared pandoc workers,
+            see :func:`epub2sphinx.pandoc_workers.get_pandoc_backend`
+        :type pandoc_backend: str
+        """
+        self.max_jobs = max_jobs
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        self.roots = [os.path.realpath(root) for root in roots or [os.getcwd()]]
+        self.converter_options = converter_options
+        self.build_jobs = jobs
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor_context = get_executor(executor, jobs)
+        self.executor = self.executor_context.__enter__()
+        self.pandoc_context = get_pandoc_backend(pandoc_backend, jobs)
+        self.pandoc = self.pandoc_context.__enter__()
+        self.job_executor = ThreadPoolExecutor(max_workers=max_jobs)
+        # Compile the templates now instead of during the first job
+        template_environment = get_template_environment()
+        for template_name in ('conf.py', 'index.rst'):
+            template_environment.get_template(template_name)
+
+    def submit(self, options):
+        """Queue a conversion job
+
+        :param options: Options of the job, see :data:`JOB_OPTIONS`
+        :type options: dict
+
+        :returns: The queued job
+        :rtype: class:`Job`
+
+        :raises ValueError: If the options are not valid, or the input or output is not in a root directory
+        :raises QueueFull: If the maximum number of jobs are already waiting
+        """
+        validate_job_options(options)
+        for name in ('input', 'output'):
+            if not any(is_in_directory(options[name], root) for root in self.roots):
+                raise ValueError("The {} must be inside one of the root directories of the service".format(name))
+        job = Job(options)
+        with self.lock:
+            queued = sum(queued_job.status == 'queued' for queued_job in self.jobs.values())
+            if queued >= self.max_queue:
+                raise QueueFull("{} jobs are already queued".format(queued))
+            self.jobs[job.id] = job
+            self.remove_finished_jobs()
+            job.future = self.job_executor.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        """Run a queued job, called by the job executor
+
+        :param job: Job to run
+        :type job: class:`Job`
+        """
+        with self.lock:
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        options = dict(job.options)
+        converter_options = dict(self.converter_options)
+        for name in ('engine', 'optimize_images', 'max_image_size', 'image_format', 'max_page_size', 'pipeline'):
+            if name in options:
+                converter_options[name] = options[name]
+        try:
+            result = convert_book(os.path.realpath(options['input']), os.path.realpath(options['output']),
+                                  options.get('theme', 'alabaster').lower(),
+                                  options.get('include_custom_css', False), options.get('build', True),
+                                  options.get('overwrite', False), build_jobs=self.build_jobs,
+                                  executor=self.executor, pandoc_backend=self.pandoc or 'process',
+                                  cancel_event=job.cancel_event,
+                                  on_event=job.update_progress, **converter_options)
+        except Exception as exception:
+            result = {'status': 'failed', 'error': "{}: {}".format(type(exception).__name__, exception)}
+        with self.lock:
+            job.result = result
+            job.status = result['status']
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        """Returns the job with the given ID, or None if there is no such job
+
+        :rtype: class:`Job`
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        """Returns the jobs in the order they were submitted
+
+        :rtype: list
+        """
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Cancel a job. A queued job never runs, a running job stops at its next stage.
+
+        :param job_id: ID of the job
+        :type job_id: str
+
+        :returns: The job, or None if there is no such job
+        :rtype: class:`Job`
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                job.future.cancel()
+        return job
+
+    def remove_finished_jobs(self):
+        """Forget the oldest finished jobs above the maximum number of finished jobs.
+        Called with the lock held.
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        """Cancel the queued jobs, wait for the running jobs and stop the worker pools"""
+        for job in self.list():
+            if job.status == 'queued':
+                self.cancel(job.id)
+        self.job_executor.shutdown(wait=True)
+        self.executor_context.__exit__(None, None, None)
+        self.pandoc_context.__exit__(None, None, None)
+
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API of the conversion service. The service is taken from the server.
+
+    - POST /jobs with the JSON options of a job queues it, max_page_size is in bytes
+    - GET /jobs lists the jobs, GET /jobs/<id> returns the status of a job
+    - DELETE /jobs/<id> cancels a job
+    """
+    server_version = "epub2sphinx"
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_job_id(self):
+        parts = self.path.rstrip('/').split('/')
+        if len(parts) == 3 and parts[1] == 'jobs':
+            return parts[2]
+        return None
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path.rstrip('/') == '/jobs':
+            self.send_json(200, {'jobs': [job.to_dict() for job in service.list()]})
+            return
+        job = service.get(self.get_job_id())
+        if job is None:
+            self.send_json(404, {'error': 'No such job'})
+        else:
+            self.send_json(200, job.to_dict())
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        try:
+            options = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            job = self.server.service.submit(options)
+        except ValueError as exception:
+            self.send_json(400, {'error': str(exception)})
+        except QueueFull as exception:
+            self.send_json(503, {'error': str(exception)})
+        else:
+            self.send_json(202, job.to_dict())
+
+    def do_DELETE(self):
+        job = self.server.service.cancel(self.get_job_id())
+        if job is None:
+            self.send_json(404, {'error': 'No such job'})
+        else:
+            self.send_json(200, job.to_dict())
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix socket'
+
+    def log_message(self, format, *args):
+        if not getattr(self.server, 'quiet', False):
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server listening on a Unix socket"""
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(service, host='127.0.0.1', port=8765, socket_path=None, quiet=False):
+    """Returns the HTTP server of the conversion service
+
+    :param service: Conversion service that runs the jobs
+    :type service: class:`ConversionService`
+
+    :param host: Address to listen on
+    :type host: str
+
+    :param port: Port to listen on, 0 uses any available port
+    :type port: int
+
+    :param socket_path: Listen on this Unix socket instead of a TCP port
+    :type socket_path: str
+
+    :param quiet: Do not log the requests
+    :type quiet: bool
+
+    :rtype: class:`socketserver.BaseServer`
+    """
+    if socket_path:
+        server = UnixHTTPServer(socket_path, ConversionRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ConversionRequestHandler)
+    server.service = service
+    server.quiet = quiet
+    return server
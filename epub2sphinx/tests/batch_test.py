@@ -0,0 +1,37 @@
+import copy
+import epub2sphinx
+
+from epub2sphinx.batch import convert_batch, make_batches, split_definitions
+from epub2sphinx.convert import generate_chapter
+from synthetic import make_epub
+from utils import requires_pandoc
+
+
+def test_make_batches():
+    assert make_batches(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+    assert make_batches(list(range(3)), 0) == [[0], [1], [2]]
+
+
+def test_split_definitions():
+    definitions = split_definitions(".. |image1| image:: a.png\n.. |B| image:: b.png\n   :width: 10\n")
+    assert definitions == [("|image1|", ".. |image1| image:: a.png"),
+                           ("|B|", ".. |B| image:: b.png\n   :width: 10")]
+
+
+@requires_pandoc
+def test_batch_matches_per_chapter(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=5, paragraph_count=3)
+    book = epub2sphinx.Book(file_name)
+    chapters = list(filter(None, (generate_chapter(x, book) for x in book.epub.spine)))
+    for index, chapter in enumerate(chapters):
+        chapter.content = chapter.content.replace(
+            "</h1>", '</h1><p>Inline <img src="image_{}.png"/> image</p>'.format(index))
+    batched = copy.deepcopy(chapters)
+
+    for chapter in chapters:
+        chapter.convert(engine='pandoc')
+    convert_batch(batched, engine='pandoc')
+
+    for chapter, batched_chapter in zip(chapters, batched):
+        assert batched_chapter.content.strip() == chapter.content.strip()
@@ -0,0 +1,260 @@
+import epub2sphinx
+import json
+import os
+import platform
+import pypandoc
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from epub2sphinx.batch import convert_batch, make_batches
+from epub2sphinx.chapter import preprocess
+from epub2sphinx.constants import PANDOC_BACKENDS
+from epub2sphinx.convert import convert_chapters, generate_chapter, merge_chapters, merge_subchapters
+from epub2sphinx.executor import get_executor
+from synthetic import make_epub
+from utils import get_import_times
+
+
+def load_chapters(book):
+    chapters = list(filter(None, (generate_chapter(x, book) for x in book.epub.spine)))
+    return [ch for chapter in chapters for ch in [chapter] + chapter.subchapters]
+
+
+def benchmark_batch(chapter_count, batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "book.epub")
+        make_epub(file_name, chapter_count=chapter_count)
+        book = epub2sphinx.Book(file_name)
+
+        chapters = load_chapters(book)
+        start_time = time.time()
+        for chapter in chapters:
+            chapter.convert(engine='pandoc')
+        print("Per-chapter conversion of {} chapters: {:.2f}s".format(len(chapters), time.time() - start_time))
+
+        chapters = load_chapters(book)
+        start_time = time.time()
+        for batch in make_batches(chapters, batch_size):
+            convert_batch(batch, engine='pandoc')
+        print("Batched conversion of {} chapters (batch size {}): {:.2f}s".format(
+            len(chapters), batch_size, time.time() - start_time))
+
+        chapters = load_chapters(book)
+        start_time = time.time()
+        for chapter in chapters:
+            chapter.convert(engine='auto')
+        print("Per-chapter conversion of {} chapters without pandoc: {:.2f}s".format(
+            len(chapters), time.time() - start_time))
+
+
+def benchmark_scaling(spine_items):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "book.epub")
+        make_epub(file_name, chapter_count=spine_items // 5, paragraph_count=1, subsection_count=4)
+
+        start_time = time.time()
+        book = epub2sphinx.Book(file_name)
+        print("Parsing a book with {} spine items: {:.2f}s".format(len(book.epub.spine), time.time() - start_time))
+
+        start_time = time.time()
+        for chapter_id in book.epub.spine:
+            item = book.epub.get_item_with_id(chapter_id[0])
+            any(item.get_name() in subsections for subsections in book.subsections.values())
+        print("Linear lookups of {} spine items: {:.2f}s".format(len(book.epub.spine), time.time() - start_time))
+
+        start_time = time.time()
+        chapters = list(filter(None, (generate_chapter(x, book) for x in book.epub.spine)))
+        print("Generating {} chapters with indexed lookups: {:.2f}s".format(len(chapters), time.time() - start_time))
+
+
+def benchmark_startup(runs):
+    import_times = [get_import_times("import cli") for _ in range(runs)]
+    cli_times = sorted(times['cli'] for times in import_times)
+    print("Median import time of the command line over {} runs: {:.1f}ms".format(
+        runs, cli_times[len(cli_times) // 2] / 1000))
+    slowest = sorted(import_times[-1].items(), key=lambda item: item[1], reverse=True)[:10]
+    for module, cumulative_time in slowest:
+        print("  {:<40}{:>8.1f}ms".format(module, cumulative_time / 1000))
+
+
+def benchmark_pipeline(chapter_count, image_count):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "book.epub")
+        make_epub(file_name, chapter_count=chapter_count, subsection_count=1, image_count=image_count,
+                  image_size=256)
+        for pipeline in (False, True):
+            first_written = []
+
+            def on_event(event):
+                if event['type'] == 'progress' and event['stage'] == 'write chapters' and event['item']:
+                    first_written.append(first_written or time.time())
+
+            start_time = time.time()
+            epub2sphinx.Converter(file_name, os.path.join(directory, str(pipeline)), "alabaster", False,
+                                  engine='pandoc', verbose=False, pipeline=pipeline, on_event=on_event).convert()
+            print("{} conversion of {} chapters and {} images: {:.2f}s, first chapter written after {:.2f}s".format(
+                "Pipelined" if pipeline else "Staged", chapter_count * 2, image_count,
+                time.time() - start_time, first_written[0] - start_time))
+
+
+def benchmark_pandoc_workers(chapter_count, batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, "book.epub")
+        make_epub(file_name, chapter_count=chapter_count, paragraph_count=5, subsection_count=1)
+        for pandoc_backend in PANDOC_BACKENDS:
+            start_time = time.time()
+            epub2sphinx.Converter(file_name, os.path.join(directory, pandoc_backend), "alabaster", False,
+                                  batch_size=batch_size, engine='pandoc', verbose=False,
+                                  pandoc_backend=pandoc_backend).convert()
+            print("Conversion of {} chapters in batches of {} with the {} pandoc backend: {:.2f}s".format(
+                chapter_count * 2, batch_size, pandoc_backend, time.time() - start_time))
+
+
+def preprocess_multipass(content):
+    """The previous preprocessing, with a pass over the content for each rewrite"""
+    content = re.sub(r"(href=[\"\'][\w/.@-]*html)([#\'\"])", r"\1.html\2", content)
+    content = re.sub(r"epub:[a-zA-Z]+=\"[^\"]*\"", "", content)
+    if content.find("<svg") != -1:
+        content = re.sub(r"\<svg[^\>]*\>(.*)\</svg\>", r"\1", content, flags=re.MULTILINE|re.DOTALL)
+        content = content.replace("<image", "<img").replace("xlink:href", "src")
+    return content
+
+
+def benchmark_preprocess(paragraph_count):
+    paragraph = '<p epub:type="x">Text with a <a href="chapter_2.xhtml#s">link</a> and more words.</p>\n'
+    svg = '<svg width="10"><image width="10" xlink:href="images/a.png"/></svg>\n'
+    contents = {
+        "plain": paragraph * paragraph_count,
+        "svg": (paragraph * 9 + svg) * (paragraph_count // 10),
+        "unclosed svg": ('<svg width="10">' + paragraph) * (paragraph_count // 10),
+    }
+    for name, content in contents.items():
+        for function in (preprocess_multipass, preprocess):
+            start_time = time.time()
+            function(content)
+            print("{} of {:.1f}MB {} content: {:.3f}s".format(
+                function.__name__, len(content) / 1e6, name, time.time() - start_time))
+
+
+# Synthetic books of the benchmark suite, as arguments of make_epub
+SUITE_SCENARIOS = {
+    'baseline': dict(chapter_count=50, paragraph_count=20),
+    'many chapters': dict(chapter_count=1000, paragraph_count=2),
+    'large chapters': dict(chapter_count=5, paragraph_count=5000),
+    'deep toc': dict(chapter_count=50, paragraph_count=5, subsection_count=8, toc_depth=5),
+    'images': dict(chapter_count=50, paragraph_count=10, image_count=300, image_size=128),
+    'svg': dict(chapter_count=50, paragraph_count=10, image_count=50, svg_count=10),
+}
+
+
+def time_steps(file_name, directory):
+    """Time each step of the conversion of a book, then the whole conversion
+
+    :returns: (Step => Wall time in seconds) mapping
+    :rtype: dict
+    """
+    timings = {}
+
+    def timed(step, function, *args):
+        start_time = time.perf_counter()
+        result = function(*args)
+        timings[step] = time.perf_counter() - start_time
+        return result
+
+    def merge(chapters):
+        chapters = [merge_subchapters(chapter) for chapter in chapters]
+        merge_chapters(chapters)
+        return chapters
+
+    book = timed('parse', epub2sphinx.Book, file_name)
+    chapters = timed('generate chapters', lambda: list(filter(None, (generate_chapter(x, book)
+                                                                      for x in book.epub.spine))))
+    with get_executor('serial') as executor:
+        chapters = timed('convert chapters', convert_chapters, chapters, executor, 16)
+    subchapters = [subchapter for chapter in chapters for subchapter in chapter.subchapters]
+    chapters = timed('merge chapters', merge, chapters)
+    source_directory = os.path.join(directory, "steps")
+    os.makedirs(source_directory)
+    timed('write chapters', lambda: [chapter.write(source_directory) for chapter in subchapters + chapters])
+    timed('convert', lambda: epub2sphinx.Converter(file_name, os.path.join(directory, "output"), "alabaster", False,
+                                                   verbose=False).convert())
+    return timings
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_suite(results_file, repeat):
+    """Time the steps of the conversion of every scenario, keeping the fastest of the runs,
+    and write the results as JSON to compare them across commits"""
+    results = {
+        'commit': get_commit(),
+        'time': time.time(),
+        'python': platform.python_version(),
+        'pandoc': pypandoc.get_pandoc_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'scenarios': {},
+    }
+    for name, parameters in SUITE_SCENARIOS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "book.epub")
+            make_epub(file_name, **parameters)
+            timings = {}
+            for run in range(repeat):
+                run_directory = os.path.join(directory, str(run))
+                for step, wall_time in time_steps(file_name, run_directory).items():
+                    timings[step] = min(timings.get(step, wall_time), wall_time)
+            results['scenarios'][name] = {'parameters': parameters, 'epub_size': os.path.getsize(file_name),
+                                          'timings': timings}
+        if len(results['scenarios']) == 1:
+            print("{:<16}".format("Scenario") + "".join("{:>19}".format(step) for step in timings))
+        print("{:<16}".format(name) + "".join("{:>18.3f}s".format(wall_time) for wall_time in timings.values()))
+    with open(results_file, 'w') as results_json:
+        json.dump(results, results_json, indent=2)
+    print("Results written to {}".format(results_file))
+
+
+def benchmark_compare(old_results_file, new_results_file):
+    """Print the timings of two runs of the benchmark suite side by side"""
+    with open(old_results_file) as old_json, open(new_results_file) as new_json:
+        old_results, new_results = json.load(old_json), json.load(new_json)
+    print("Comparing {} to {}".format(old_results['commit'], new_results['commit']))
+    print("{:<16}{:<20}{:>10}{:>10}{:>8}".format("Scenario", "Step", "Old (s)", "New (s)", "Ratio"))
+    for name, scenario in new_results['scenarios'].items():
+        old_timings = old_results['scenarios'].get(name, {}).get('timings', {})
+        for step, wall_time in scenario['timings'].items():
+            if step in old_timings:
+                print("{:<16}{:<20}{:>10.3f}{:>10.3f}{:>8.2f}".format(
+                    name, step, old_timings[step], wall_time, wall_time / old_timings[step]))
+
+
+def benchmark(function_name, *args):
+    if "batch" == function_name:
+        benchmark_batch(int(args[0]) if args else 300, int(args[1]) if len(args) > 1 else 16)
+    elif "scaling" == function_name:
+        benchmark_scaling(int(args[0]) if args else 10000)
+    elif "startup" == function_name:
+        benchmark_startup(int(args[0]) if args else 10)
+    elif "pipeline" == function_name:
+        benchmark_pipeline(int(args[0]) if args else 200, int(args[1]) if len(args) > 1 else 500)
+    elif "pandoc" == function_name:
+        benchmark_pandoc_workers(int(args[0]) if args else 200, int(args[1]) if len(args) > 1 else 1)
+    elif "preprocess" == function_name:
+        benchmark_preprocess(int(args[0]) if args else 20000)
+    elif "suite" == function_name:
+        benchmark_suite(args[0] if args else "benchmark.json", int(args[1]) if len(args) > 1 else 3)
+    elif "compare" == function_name:
+        benchmark_compare(*args[:2])
+
+
+benchmark(*sys.argv[1:])
@@ -0,0 +1,46 @@
+import epub2sphinx
+
+from ebooklib import epub
+from epub2sphinx.convert import generate_chapter
+from synthetic import make_epub
+
+
+def make_html(file_name):
+    html = epub.EpubHtml(title=file_name, file_name=file_name)
+    html.content = "<h1>{}</h1><p>Text</p>".format(file_name)
+    return html
+
+
+def test_nested_sections(tmp_path):
+    book = epub.EpubBook()
+    book.set_identifier("nested")
+    book.set_title("Nested")
+    part, chapter, section_1, section_2 = items = [make_html(name + ".xhtml")
+                                                   for name in ("part", "chapter", "section_1", "section_2")]
+    for item in items:
+        book.add_item(item)
+    book.toc = [(epub.Section("Part", part.file_name),
+                 [(epub.Section("Chapter", chapter.file_name), [section_1, section_2])])]
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = items
+    file_name = str(tmp_path / "nested.epub")
+    epub.write_epub(file_name, book)
+
+    book = epub2sphinx.Book(file_name)
+    assert book.subsections == {"part.xhtml": ["chapter.xhtml", "section_1.xhtml", "section_2.xhtml"]}
+    assert book.parent_sections["section_2.xhtml"] == "part.xhtml"
+    assert book.items_by_href["chapter.xhtml"] is book.items_by_id[chapter.id]
+
+    chapters = [generate_chapter(x, book) for x in book.epub.spine]
+    assert [chapter.file for chapter in chapters if chapter] == ["part.xhtml"]
+    assert [subchapter.file for subchapter in chapters[0].subchapters] == [
+        "chapter.xhtml", "section_1.xhtml", "section_2.xhtml"]
+
+
+def test_deep_toc_subsections(tmp_path):
+    file_name = str(tmp_path / "deep.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=1, subsection_count=4, toc_depth=4)
+    book = epub2sphinx.Book(file_name)
+    assert book.subsections["chapter_1.xhtml"] == ["chapter_1_{}.xhtml".format(index) for index in range(4)]
+    assert book.parent_sections["chapter_1_2.xhtml"] == "chapter_1.xhtml"
@@ -0,0 +1,53 @@
+import epub2sphinx
+import os
+
+from epub2sphinx.build import build_html, parse_warnings
+from synthetic import make_epub
+
+
+def test_parse_warnings():
+    warnings = parse_warnings("\x1b[91m/src/a.rst:12: WARNING: Unknown target name: \"x\". [ref.ref]\x1b[39;49;00m\n"
+                              "/src/b.rst: ERROR: Unexpected section title.\n"
+                              "\n"
+                              "Title\n"
+                              "WARNING: html_static_path entry '_static' does not exist\n")
+    assert warnings == [
+        {'level': 'WARNING', 'file': '/src/a.rst', 'line': 12,
+         'message': 'Unknown target name: "x". [ref.ref]'},
+        {'level': 'ERROR', 'file': '/src/b.rst', 'line': None,
+         'message': 'Unexpected section title.\nTitle'},
+        {'level': 'WARNING', 'file': None, 'line': None,
+         'message': "html_static_path entry '_static' does not exist"},
+    ]
+
+
+def test_build_html(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=1)
+    build_directory = str(tmp_path / "output")
+    epub2sphinx.Converter(file_name, build_directory, "alabaster", False, verbose=False).convert()
+    with open(os.path.join(build_directory, "source", "chapter_0.xhtml.rst"), "a") as chapter_file:
+        chapter_file.write("\nA reference to a `missing target`_.\n")
+
+    working_directory = os.getcwd()
+    result = build_html(build_directory, jobs=2)
+    assert os.getcwd() == working_directory
+    assert result.succeeded
+    assert os.path.isfile(os.path.join(result.html_path, "chapter_0.xhtml.html"))
+    assert any(warning['file'].endswith("chapter_0.xhtml.rst") and "missing target" in warning['message']
+               for warning in result.warnings)
+
+
+def test_build_links_images(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=1, image_count=2)
+    build_directory = str(tmp_path / "output")
+    epub2sphinx.Converter(file_name, build_directory, "alabaster", False, verbose=False).convert()
+
+    result = build_html(build_directory, jobs=1)
+    assert result.succeeded
+    image_directory = os.path.join(result.html_path, "_images")
+    assert sorted(os.listdir(image_directory)) == ["image_0.png", "image_1.png"]
+    for image_name in os.listdir(image_directory):
+        image_stat = os.stat(os.path.join(image_directory, image_name))
+        assert image_stat.st_nlink == 2
@@ -0,0 +1,52 @@
+import os
+
+from epub2sphinx import bulk
+from epub2sphinx.bulk import convert_books, find_input_files, get_output_directories
+from synthetic import make_epub
+from utils import requires_pandoc
+
+
+def test_find_input_files(tmp_path):
+    os.makedirs(str(tmp_path / "books"))
+    for name in ("books/a.epub", "books/b.epub", "books/notes.txt", "c.epub"):
+        (tmp_path / name).write_text("")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# catalogue\n{}\n".format(tmp_path / "c.epub"))
+    assert find_input_files([str(tmp_path / "books")], str(manifest)) == [
+        str(tmp_path / "books" / "a.epub"), str(tmp_path / "books" / "b.epub"), str(tmp_path / "c.epub")]
+
+
+def test_output_directories_are_unique():
+    assert get_output_directories(["a/book.epub", "b/book.epub", "c/other.epub"], "out") == [
+        os.path.join("out", "book"), os.path.join("out", "book-2"), os.path.join("out", "other")]
+
+
+@requires_pandoc
+def test_convert_books_continues_after_failure(tmp_path):
+    good_file, bad_file = str(tmp_path / "good.epub"), str(tmp_path / "bad.epub")
+    make_epub(good_file, chapter_count=2, paragraph_count=1)
+    with open(bad_file, 'w') as bad_epub:
+        bad_epub.write("not an epub")
+    summary = convert_books([bad_file, good_file], str(tmp_path / "out"), "alabaster", build=False)
+    assert [book['status'] for book in summary['books']] == ['failed', 'ok']
+    assert summary['succeeded'] == 1 and summary['failed'] == 1
+    assert os.path.isfile(str(tmp_path / "out" / "good" / "source" / "index.rst"))
+
+
+def test_convert_books_continues_after_publish_failure(tmp_path, monkeypatch):
+    for name in ("first", "second"):
+        make_epub(str(tmp_path / "{}.epub".format(name)), chapter_count=1, paragraph_count=1)
+    publish_directory = bulk.publish_directory
+
+    def failing_publish(source_directory, output_directory, staging):
+        if output_directory.endswith("first"):
+            raise OSError("No space left on device")
+        publish_directory(source_directory, output_directory, staging)
+
+    monkeypatch.setattr(bulk, "publish_directory", failing_publish)
+    summary = convert_books([str(tmp_path / "first.epub"), str(tmp_path / "second.epub")], str(tmp_path / "out"),
+                            "alabaster", build=False, max_books=1)
+    assert [book['status'] for book in summary['books']] == ['failed', 'ok']
+    assert summary['books'][0]['error'] == "OSError: No space left on device"
+    assert not os.path.exists(str(tmp_path / "out" / "first"))
+    assert os.path.isfile(str(tmp_path / "out" / "second" / "source" / "index.rst"))
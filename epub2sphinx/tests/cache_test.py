@@ -0,0 +1,27 @@
+import os
+
+from epub2sphinx.cache import ConversionCache
+from utils import requires_pandoc
+
+
+@requires_pandoc
+def test_cache_get_put(tmp_path):
+    cache = ConversionCache(str(tmp_path))
+    assert cache.get("<p>a</p>") is None
+    cache.put("<p>a</p>", "a\n")
+    assert cache.get("<p>a</p>") == "a\n"
+    assert cache.get("<p>b</p>") is None
+
+
+@requires_pandoc
+def test_cache_prune_least_recently_used(tmp_path):
+    cache = ConversionCache(str(tmp_path), max_size=20)
+    for index, html_content in enumerate(["<p>a</p>", "<p>b</p>", "<p>c</p>"]):
+        cache.put(html_content, "x" * 10)
+        os.utime(cache.get_path(html_content), (index, index))
+    # Reading an entry marks it as recently used
+    cache.get("<p>a</p>")
+    cache.prune()
+    assert cache.get("<p>a</p>") is not None
+    assert cache.get("<p>b</p>") is None
+    assert cache.get("<p>c</p>") is not None
@@ -0,0 +1,74 @@
+from ebooklib import epub
+from epub2sphinx.chapter import Chapter, preprocess
+
+
+class Book:
+    chapter_names = {"Text/part.xhtml": "Part One"}
+
+
+def make_chapter(content):
+    chapter = Chapter(Book(), epub.EpubItem(file_name="Text/part.xhtml", content=b""))
+    chapter.content = content
+    return chapter
+
+
+def test_split_at_top_level_headings():
+    section = "Paragraph text.\n" * 10
+    chapter = make_chapter("First\n=====\n\n" + section + "Sub\n---\n\n" + section +
+                           "Second\n======\n\n" + section)
+    chapter.fragments = ["Third\n=====\n\n" + section]
+    pages = chapter.split(200)
+
+    assert [page.file for page in pages] == ["Text/part.xhtml-2", "Text/part.xhtml-3"]
+    assert [page.title for page in pages] == ["Second", "Third"]
+    assert chapter.content.startswith("First\n=====\n") and "Sub\n---\n" in chapter.content
+    assert pages[0].content == "\n" + section
+    assert chapter.fragments == []
+    assert chapter.toctree == ["part.xhtml-2", "part.xhtml-3"]
+    assert chapter.get_rst().endswith(".. toctree::\n   :maxdepth: 1\n\n   part.xhtml-2\n   part.xhtml-3\n")
+
+
+def test_split_keeps_definitions_with_their_pages():
+    section = "Paragraph text.\n" * 10
+    chapter = make_chapter("First\n=====\n\nInline |image1| image.\n\n" + section +
+                           "Second\n======\n\n" + section + "A |image2| and |image1|.\n\n"
+                           "Third\n=====\n\n" + section + "Link_ and note [1]_\n\n"
+                           ".. |image1| image:: images/a.png\n"
+                           ".. |image2| image:: images/b.png\n   :width: 10\n"
+                           ".. _Link: http://example.com\n"
+                           ".. [1]\n   The note\n")
+    pages = chapter.split(250)
+
+    assert len(pages) == 2
+    assert chapter.content.endswith("\n\n.. |image1| image:: images/a.png\n")
+    assert ".. |image2|" not in chapter.content and ".. _Link" not in chapter.content
+    assert pages[0].content.endswith("\n\n.. |image1| image:: images/a.png\n\n"
+                                     ".. |image2| image:: images/b.png\n   :width: 10\n")
+    assert pages[1].content.endswith("Link_ and note [1]_\n\n.. _Link: http://example.com\n\n"
+                                     ".. [1]\n   The note\n")
+    assert ".. |image" not in pages[1].content
+
+
+def test_small_chapter_is_not_split():
+    chapter = make_chapter("First\n=====\n\nText\n\nSecond\n======\n\nText\n")
+    assert chapter.split(1000) == []
+    assert chapter.toctree == []
+
+
+def test_preprocess_rewrites_links_and_removes_epub_attributes():
+    content = ('<section epub:type="chapter"><a href="Text/c2.xhtml#s1">Two</a> <a href=\'c3.html\'>Three</a>'
+               ' <a href="http://example.com/">Site</a></section>')
+    assert preprocess(content) == ('<section ><a href="Text/c2.xhtml.html#s1">Two</a>'
+                                   ' <a href=\'c3.html.html\'>Three</a> <a href="http://example.com/">Site</a></section>')
+
+
+def test_preprocess_removes_each_svg_separately():
+    content = ('<svg width="10"><image xlink:href="a.png"/></svg><p>Between <image/> xlink:href</p>'
+               '<svg><g><svg/><image height="2" xlink:href="b.png"/></g></svg><p>After</p>')
+    assert preprocess(content) == ('<img src="a.png"/><p>Between <image/> xlink:href</p>'
+                                   '<g><img height="2" src="b.png"/></g><p>After</p>')
+
+
+def test_preprocess_unclosed_svg_is_linear():
+    content = '<svg width="10"><p>Paragraph</p>' * 20000
+    assert preprocess(content) == '<p>Paragraph</p>' * 20000
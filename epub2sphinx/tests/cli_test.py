@@ -0,0 +1,10 @@
+from utils import get_import_times
+
+# Modules that are only needed once a conversion starts
+HEAVY_MODULES = ('ebooklib', 'pypandoc', 'jinja2', 'tqdm', 'sphinx', 'docutils', 'PIL', 'concurrent')
+
+
+def test_cli_startup_does_not_import_conversion_modules():
+    import_times = get_import_times("import cli")
+    assert 'cli' in import_times
+    assert [module for module in import_times if module.split('.')[0] in HEAVY_MODULES] == []
@@ -0,0 +1,97 @@
+import pypandoc
+import pytest
+
+from ebooklib import epub
+from epub2sphinx.chapter import Chapter, preprocess
+from epub2sphinx.htmlrst import html_to_rst
+from epub2sphinx.pandoc_workers import PandocWorkerPool
+from synthetic import make_html
+from utils import requires_pandoc
+
+SUPPORTED_CORPUS = [
+    '<html><head><title>T</title></head><body><h1>Title</h1><p>Hello <em>world</em>, a test.</p></body></html>',
+    '<p>a *b* c_d x-_y a,_b, *a*b q*" (_x_) x_ \\back a_&lt;b a*&lt;b a…_b</p>',
+    '<p>word<em>emph</em>word <strong>bold</strong>. “<em>i</em>” –<em>h</em>– (<em>c</em>) <em>a</em>&lt;b</p>',
+    '<p><em> lead</em>trail<strong>x </strong>y <em>a</em><em>b</em> <b>c</b> <i>d</i></p>',
+    '<p>a <span>b </span><em>c</em> d<span> e</span> x<span><em>f</em></span>y <a id="q"></a>g</p>',
+    '<p>Visit <a href="http://example.com">the site</a> or <a href="c2.html#x">chapter two</a>.</p>',
+    '<p>aaaaaaaaa bbbbbbbbb ccccccccc ddddddddd eeeeeeeee fffffffff ggg <a href="c.html">two words</a>'
+    ' hhhhhhhhh iiiiiiiii <em>jjjjjjjjj kkkkkkkkk lllllllll mmmmmmmmm nnnnnnnnn</em> ooooooooo.</p>',
+    '<p>Image <img src="a.png" alt="A"/> and <img src="b.png"/><img src="c.png" alt="A"/>'
+    ' <img src="a.png" alt="A"/> <img src="d.png" alt="Two words"/></p>',
+    '<p>loose text</p>bare text <em>x</em><p></p><p>  spaced   text  </p><p>nbsp&#160;here é_ _é</p>',
+    '<h2 id="sec">Section <em>two</em></h2><p>text</p><h3>Sub</h3><h4>Four</h4><h5>Five</h5>',
+    '<h2>Intro</h2><p>a</p><h2>Intro</h2><p>b</p><h3>Intro</h3><h2 id="intro-3">Intro</h2><h2>Intro</h2>',
+    '<h2 id="summary">Summary</h2><h2>Summary</h2><h2 id="x">1. Über <em>a.b_c</em> - d!</h2>'
+    '<h2>1. Über a.b_c - d</h2><h2>!!</h2><h2>!!</h2><h2 id="">Intro</h2>',
+    '<ul><li>one</li><li>three<ul><li>nested</li><li>n2</li></ul></li><li>four</li></ul>',
+    '<ol><li><p>one</p></li><li>two</li></ol><ul><li>a<ul><li><p>b</p></li><li>c</li></ul>after</li></ul>',
+    '<div class="a b" id="x">text<p>para</p><div class="c"><p>deep text that is long enough'
+    ' to wrap around the line width of seventy two characters</p></div></div><div class="e"></div>',
+    '<p class="c" style="text-align:center" lang="en">x <span class="b">y</span> <a id="pg1"/>z</p>',
+    '<p>1. not a list</p><p>- not a list</p><p>#. hmm</p><p>.. comment</p><p>a::</p><p>http://x.org url</p>',
+    "<?xml version='1.0' encoding='utf-8'?>\n<!DOCTYPE html>\n"
+    '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en">\n'
+    '<head/><body epub:type="bodymatter">' + make_html("chapter.xhtml", "Chapter", 5).content +
+    '</body></html>',
+]
+
+UNSUPPORTED_CORPUS = [
+    '<table><tr><td>a</td></tr></table>',
+    '<p>E = mc<sup>2</sup></p>',
+    '<p>x<br/>y</p>',
+    '<pre>code</pre>',
+    '<blockquote><p>quote</p></blockquote>',
+    '<p><strong>nested <em>markup</em></strong></p>',
+    '<p><a href="http://x.org/"><img src="i.png" alt="I"/></a></p>',
+    '<p><a href="mailto:a@b.org">mail</a></p>',
+    '<p><a href="http://a.com/x y">text</a></p>',
+    '<p><em>see <img src="a.png" alt="fig"/></em></p>',
+    '<p><strong><img src="a.png"/></strong></p>',
+    '<div class="note"><p>admonition</p></div>',
+    '<ul><li><h2>heading in a list</h2></li></ul>',
+    '<h6>six</h6>',
+    '<section><h1>Written as a rubric</h1></section>',
+    '<h1>日本語</h1>',
+    '<p><math><mi>x</mi></math></p>',
+]
+
+
+@requires_pandoc
+@pytest.mark.parametrize("html_content", SUPPORTED_CORPUS, ids=range(len(SUPPORTED_CORPUS)))
+def test_python_engine_matches_pandoc(html_content):
+    html_content = preprocess(html_content)
+    rst_content = html_to_rst(html_content)
+    assert rst_content is not None
+    assert rst_content == pypandoc.convert_text(html_content, 'rst', format='html')
+
+
+@pytest.mark.parametrize("html_content", UNSUPPORTED_CORPUS, ids=range(len(UNSUPPORTED_CORPUS)))
+def test_python_engine_falls_back(html_content):
+    assert html_to_rst(html_content) is None
+
+
+@requires_pandoc
+def test_chapter_selects_engine():
+    class Book:
+        chapter_names = {}
+
+    simple_html = make_html("simple.xhtml", "Simple", 2).content
+    simple = Chapter(Book(), epub.EpubItem(file_name="simple.xhtml", content=simple_html.encode()))
+    simple.convert()
+    assert simple.converted_by == 'python'
+
+    complex_html = simple_html + "<table><tr><td>cell</td></tr></table>"
+    complex_chapter = Chapter(Book(), epub.EpubItem(file_name="complex.xhtml", content=complex_html.encode()))
+    complex_chapter.convert()
+    assert complex_chapter.converted_by == 'pandoc'
+    assert 'cell' in complex_chapter.content
+
+
+@requires_pandoc
+def test_pandoc_worker_matches_pandoc():
+    with PandocWorkerPool(1) as pool:
+        for html_content in SUPPORTED_CORPUS + UNSUPPORTED_CORPUS:
+            html_content = preprocess(html_content)
+            assert pool.convert(html_content) == pypandoc.convert_text(html_content, 'rst', format='html')
+        assert pool.fallbacks == 0
@@ -0,0 +1,162 @@
+import epub2sphinx
+import filecmp
+import pytest
+import threading
+import time
+
+from ebooklib import epub
+from epub2sphinx.chapter import Chapter
+from epub2sphinx.convert import ConversionCancelled, merge_chapters, merge_subchapters
+from epub2sphinx.constants import EXECUTOR_BACKENDS, PANDOC_BACKENDS
+from epub2sphinx.executor import get_executor
+from synthetic import make_epub, make_html
+from utils import requires_pandoc
+
+
+def test_serial_executor():
+    with get_executor('serial') as executor:
+        assert list(executor.map(pow, [2, 3], [2, 2])) == [4, 9]
+
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        get_executor('fibers')
+
+
+@requires_pandoc
+def test_executor_backends_match(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=4, paragraph_count=2, subsection_count=2)
+    for backend in EXECUTOR_BACKENDS:
+        epub2sphinx.Converter(file_name, str(tmp_path / backend), "alabaster", False,
+                              batch_size=3, executor=backend, jobs=2).convert()
+    for backend in EXECUTOR_BACKENDS[1:]:
+        comparison = filecmp.dircmp(str(tmp_path / "thread" / "source"), str(tmp_path / backend / "source"))
+        assert not comparison.diff_files and not comparison.left_only and not comparison.right_only
+
+
+def test_merge_many_fragments(tmp_path):
+    """Micro-benchmark of a pathological book with 5,000 untitled fragments"""
+    class Book:
+        chapter_names = {"titled.xhtml": "Titled"}
+
+    def make_chapter(file_name, content):
+        chapter = Chapter(Book(), epub.EpubItem(file_name=file_name, content=b""))
+        chapter.content = content
+        return chapter
+
+    fragment = "Fragment paragraph\n" * 50
+    chapters = [make_chapter("part_{}.xhtml".format(index), fragment) for index in range(5000)]
+    titled = make_chapter("titled.xhtml", "Titled content\n")
+    titled.subchapters = [make_chapter("sub_{}.xhtml".format(index), fragment) for index in range(5000)]
+    chapters.append(titled)
+
+    start_time = time.perf_counter()
+    chapters = [merge_subchapters(chapter) for chapter in chapters]
+    merge_chapters(chapters)
+    chapters[0].write(str(tmp_path))
+    chapters[1].write(str(tmp_path))
+    elapsed = time.perf_counter() - start_time
+
+    assert [chapter.title for chapter in chapters] == ["Front Page", "Titled"]
+    front_page = (tmp_path / "part_0.xhtml.rst").read_text()
+    assert front_page.count("Fragment paragraph") == 5000 * 50
+    assert (tmp_path / "titled.xhtml.rst").read_text().count("Fragment paragraph") == 5000 * 50
+    assert elapsed < 5
+
+
+def test_cancelled_conversion(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=1)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    converter = epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False, verbose=False,
+                                      cancel_event=cancel_event)
+    with pytest.raises(ConversionCancelled):
+        converter.convert()
+
+
+def test_paginated_conversion(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=2, subsection_count=2)
+    epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False, verbose=False,
+                          max_page_size=100).convert()
+    source_directory = tmp_path / "output" / "source"
+    chapter = (source_directory / "chapter_0.xhtml.rst").read_text()
+    # The subsections are written once, on their own pages
+    assert "Section 0.0" not in chapter
+    assert chapter.endswith("   chapter_0_0.xhtml\n   chapter_0_1.xhtml\n")
+    assert (source_directory / "chapter_0_0.xhtml.rst").read_text().count("Lorem ipsum") == 2
+
+
+def test_conversion_events(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=3, paragraph_count=2, subsection_count=1, image_count=2)
+    events = []
+    epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False, verbose=False,
+                          on_event=events.append).convert()
+
+    stages = [event['stage'] for event in events if event['type'] == 'stage_started']
+    assert stages == [event['stage'] for event in events if event['type'] == 'stage_finished']
+    assert stages[:3] == ['setup', 'read chapters', 'convert chapters']
+    converted = [event for event in events if event['type'] == 'progress' and event['stage'] == 'convert chapters'
+                 and event['item']]
+    assert [event['completed'] for event in converted] == list(range(1, 7))
+    assert {event['total'] for event in converted} == {6}
+    assert sorted(event['item'] for event in converted)[:2] == ['chapter_0.xhtml', 'chapter_0_0.xhtml']
+    assert converted[-1]['bytes'] > 0 and converted[-1]['items_per_second'] > 0
+    extracted = [event for event in events if event['type'] == 'progress' and event['stage'] == 'extract files']
+    assert extracted.pop(0)['item'] is None
+    assert [event['item'] for event in extracted] == ['images/image_0.png', 'images/image_1.png']
+    assert "Creating directory structure" in [event['message'] for event in events if event['type'] == 'message']
+
+
+@requires_pandoc
+@pytest.mark.parametrize("max_page_size", [None, 1000])
+def test_pipeline_matches_converter(tmp_path, max_page_size):
+    book = epub.EpubBook()
+    book.set_identifier("pipeline")
+    book.set_title("Pipeline")
+    # The untitled items at the beginning are merged into the front page
+    items = [make_html("cover.xhtml", "Cover", 1), make_html("preface.xhtml", "Preface", 3)]
+    toc = []
+    for index in range(4):
+        chapter = make_html("chapter_{}.xhtml".format(index), "Chapter {}".format(index), 8)
+        chapter.content += "<table><tr><td>Converted by pandoc</td></tr></table>"
+        section = make_html("section_{}.xhtml".format(index), "Section {}".format(index), 2)
+        items += [chapter, section]
+        toc.append((epub.Section(chapter.title, chapter.file_name), [section]))
+    for item in items:
+        book.add_item(item)
+    book.toc = toc
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = items
+    file_name = str(tmp_path / "book.epub")
+    epub.write_epub(file_name, book)
+
+    events = []
+    for pipeline in (False, True):
+        converter = epub2sphinx.Converter(file_name, str(tmp_path / str(pipeline)), "alabaster", False, batch_size=3,
+                                          verbose=False, max_page_size=max_page_size, pipeline=pipeline,
+                                          on_event=events.append if pipeline else None)
+        converter.convert()
+        assert converter.book.toctree[0] == "cover.xhtml"
+    comparison = filecmp.dircmp(str(tmp_path / "False" / "source"), str(tmp_path / "True" / "source"))
+    assert not comparison.diff_files and not comparison.left_only and not comparison.right_only
+    assert "Front Page" in (tmp_path / "True" / "source" / "cover.xhtml.rst").read_text()
+    written = [event for event in events if event['type'] == 'progress' and event['stage'] == 'write chapters']
+    assert written[-1]['completed'] == written[-1]['total'] == len(comparison.common_files) - 2
+
+
+@requires_pandoc
+@pytest.mark.parametrize("executor, pipeline", [("thread", False), ("process", False), ("thread", True)])
+def test_pandoc_workers_match(tmp_path, executor, pipeline):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=4, paragraph_count=2, subsection_count=2)
+    for pandoc_backend in PANDOC_BACKENDS:
+        epub2sphinx.Converter(file_name, str(tmp_path / pandoc_backend), "alabaster", False, batch_size=3,
+                              executor=executor, jobs=2, verbose=False, engine="pandoc", pipeline=pipeline,
+                              pandoc_backend=pandoc_backend).convert()
+    comparison = filecmp.dircmp(str(tmp_path / "process" / "source"), str(tmp_path / "worker" / "source"))
+    assert not comparison.diff_files and not comparison.left_only and not comparison.right_only
@@ -0,0 +1,63 @@
+import epub2sphinx
+import io
+import os
+import zipfile
+
+from epub2sphinx.images import optimize_image, rewrite_image_paths
+from synthetic import make_epub
+from utils import requires_pillow
+
+
+def test_rewrite_image_paths():
+    rst = ("Text |image1|\n\n"
+           ".. |image1| image:: ../Images/logo_copy.png\n"
+           ".. figure:: ../Images/scan.png\n"
+           "   :alt: Scan\n"
+           ".. image:: ../Images/other.png\n")
+    image_paths = {"Images/logo_copy.png": "Images/logo.png", "Images/scan.png": "Images/scan.webp",
+                   "Images/other.png": "Images/other.png"}
+    assert rewrite_image_paths(rst, "Text/chapter.xhtml", image_paths) == (
+        "Text |image1|\n\n"
+        ".. |image1| image:: ../Images/logo.png\n"
+        ".. figure:: ../Images/scan.webp\n"
+        "   :alt: Scan\n"
+        ".. image:: ../Images/other.png\n")
+
+
+@requires_pillow
+def test_optimize_images(tmp_path):
+    from PIL import Image
+
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=4, paragraph_count=1, image_count=4, image_size=400, unique_images=2)
+    converter = epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False, verbose=False,
+                                      optimize_images=True, max_image_size=100, image_format='webp')
+    converter.convert()
+
+    source_directory = tmp_path / "output" / "source"
+    assert sorted(os.listdir(str(source_directory / "images"))) == ["image_0.webp", "image_1.webp"]
+    with Image.open(str(source_directory / "images" / "image_0.webp")) as image:
+        assert image.size == (100, 100)
+    assert converter.image_optimizer.duplicate_count == 2
+    assert converter.image_optimizer.bytes_saved > 0
+    # chapter_2 shows image_2.png, which is a duplicate of image_0.png
+    assert "image:: images/image_0.webp" in (source_directory / "chapter_2.xhtml.rst").read_text()
+
+
+@requires_pillow
+def test_optimize_image_too_large(tmp_path, monkeypatch):
+    from PIL import Image
+
+    image_file = io.BytesIO()
+    Image.new('RGB', (400, 400)).save(image_file, 'PNG')
+    file_name = str(tmp_path / "images.zip")
+    with zipfile.ZipFile(file_name, 'w') as archive:
+        archive.writestr("large.png", image_file.getvalue())
+    # Pillow refuses to open images with more than twice this number of pixels
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    output_path = str(tmp_path / "large.png")
+    with zipfile.ZipFile(file_name) as archive:
+        result = optimize_image(archive, "large.png", output_path, 100)
+    assert result[0] == output_path
+    with open(output_path, 'rb') as output_file:
+        assert output_file.read() == image_file.getvalue()
@@ -0,0 +1,22 @@
+import os
+
+from epub2sphinx.manifest import Manifest
+
+
+def test_manifest_rewrites_changed_files(tmp_path):
+    unchanged, changed, stale = (str(tmp_path / name) for name in ("unchanged", "changed", "stale"))
+    manifest = Manifest(str(tmp_path))
+    for file_path in (unchanged, changed, stale):
+        manifest.update(file_path, b"old")
+    manifest.save()
+    os.utime(unchanged, (0, 0))
+
+    manifest = Manifest(str(tmp_path), incremental=True)
+    manifest.update(unchanged, b"old")
+    manifest.update(changed, b"new")
+    manifest.save()
+
+    assert os.stat(unchanged).st_mtime == 0
+    with open(changed, 'rb') as changed_file:
+        assert changed_file.read() == b"new"
+    assert not os.path.exists(stale)
@@ -0,0 +1,68 @@
+import epub2sphinx
+import zipfile
+
+from ebooklib import epub
+from epub2sphinx.metadata import inspect_book, inspect_books
+from synthetic import make_epub
+
+
+def test_inspect_book_matches_book(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=3, paragraph_count=2, subsection_count=2)
+
+    result = inspect_book(file_name)
+    book = epub2sphinx.Book(file_name)
+    assert result["title"] == book.title == "Synthetic Book"
+    assert result["author"] == book.author
+    assert result["language"] == "en"
+    assert result["identifier"] == "epub2sphinx-synthetic"
+    assert result["chapter_names"] == book.chapter_names
+    assert result["subsections"] == book.subsections
+    assert result["spine"] == [book.items_by_id[item_id].get_name() for item_id, _ in book.epub.spine]
+
+
+def test_inspect_book_reads_ncx_without_nav(tmp_path):
+    book = epub.EpubBook()
+    book.set_identifier("ncx-only")
+    book.set_title("NCX only")
+    chapters = [epub.EpubHtml(title="Chapter {}".format(index), file_name="chapter_{}.xhtml".format(index),
+                              content="<h1>Chapter</h1><p>Text</p>") for index in range(2)]
+    for chapter in chapters:
+        book.add_item(chapter)
+    book.toc = [(epub.Section("Chapter 0", "chapter_0.xhtml"), [chapters[1]])]
+    book.add_item(epub.EpubNcx())
+    book.spine = chapters
+    file_name = str(tmp_path / "ncx.epub")
+    epub.write_epub(file_name, book)
+
+    result = inspect_book(file_name)
+    assert result["chapter_names"] == epub2sphinx.Book(file_name).chapter_names
+    assert result["subsections"] == {"chapter_0.xhtml": ["chapter_1.xhtml"]}
+
+
+def test_inspect_book_does_not_read_chapters(tmp_path, monkeypatch):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=3, paragraph_count=2)
+    read_files = []
+    read = zipfile.ZipFile.read
+
+    def record_read(zip_file, name, *args):
+        read_files.append(name)
+        return read(zip_file, name, *args)
+
+    monkeypatch.setattr(zipfile.ZipFile, "read", record_read)
+    inspect_book(file_name)
+    assert not any(name.endswith("chapter_0.xhtml") for name in read_files)
+    assert len(read_files) == 3
+
+
+def test_inspect_books_reports_errors(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=1, paragraph_count=1)
+    bad_file_name = tmp_path / "bad.epub"
+    bad_file_name.write_text("Not an epub")
+
+    results = list(inspect_books([str(bad_file_name), file_name], executor='serial'))
+    assert results[0]["file"] == str(bad_file_name)
+    assert "error" in results[0]
+    assert results[1]["title"] == "Synthetic Book"
@@ -0,0 +1,43 @@
+import os
+
+from epub2sphinx import output
+from epub2sphinx.output import exchange_paths, publish_directory, staging_directory
+
+
+def test_staging_directory_is_next_to_output(tmp_path):
+    output_directory = str(tmp_path / "books" / "output")
+    with staging_directory(output_directory) as staging:
+        assert os.path.dirname(staging) == str(tmp_path / "books")
+        assert os.path.basename(staging).startswith(".output.")
+        with open(os.path.join(staging, "partial.rst"), "w") as partial_file:
+            partial_file.write("Partial")
+    assert os.listdir(str(tmp_path / "books")) == []
+
+
+def test_publish_replaces_output(tmp_path):
+    output_directory = tmp_path / "output"
+    output_directory.mkdir()
+    (output_directory / "old.html").write_text("old")
+    with staging_directory(str(output_directory)) as staging:
+        os.mkdir(os.path.join(staging, "html"))
+        with open(os.path.join(staging, "html", "index.html"), "w") as index_file:
+            index_file.write("new")
+        publish_directory(os.path.join(staging, "html"), str(output_directory), staging)
+        assert os.listdir(str(output_directory)) == ["index.html"]
+    assert sorted(os.listdir(str(tmp_path))) == ["output"]
+    assert (output_directory / "index.html").read_text() == "new"
+
+
+def test_exchange_paths(tmp_path):
+    (tmp_path / "first").mkdir()
+    (tmp_path / "first" / "a").write_text("a")
+    (tmp_path / "second").mkdir()
+    if not exchange_paths(str(tmp_path / "first"), str(tmp_path / "second")):
+        return
+    assert os.listdir(str(tmp_path / "second")) == ["a"]
+    assert os.listdir(str(tmp_path / "first")) == []
+
+
+def test_publish_without_exchange(tmp_path, monkeypatch):
+    monkeypatch.setattr(output, "exchange_paths", lambda first_path, second_path: False)
+    test_publish_replaces_output(tmp_path)
@@ -0,0 +1,71 @@
+import copy
+import epub2sphinx
+import pickle
+import pypandoc
+import pytest
+
+from epub2sphinx.convert import generate_chapter
+from epub2sphinx.pandoc_workers import PandocWorkerPool, get_pandoc_backend, get_process_worker_pool
+from synthetic import make_epub
+from utils import requires_pandoc
+
+html_content = ("<h1>Title</h1><p>Some <b>bold</b> text, ünïcödé and a <a href='b.html'>link</a></p>"
+                "<table><tr><td>Cell</td></tr></table><p><img src='a.png'/></p>")
+
+
+@requires_pandoc
+def test_worker_matches_pandoc():
+    with PandocWorkerPool(2) as pool:
+        for content in (html_content, "", "<p>x</p>" * 1000):
+            assert pool.convert(content) == pypandoc.convert_text(content, 'rst', format='html')
+        assert len(pool.idle_workers) == 1
+        assert pool.restarts == pool.fallbacks == 0
+
+
+@requires_pandoc
+def test_worker_restarts_after_crash():
+    with PandocWorkerPool(1) as pool:
+        pool.convert(html_content)
+        pool.idle_workers[0].process.kill()
+        assert pool.convert(html_content) == pypandoc.convert_text(html_content, 'rst', format='html')
+        assert pool.restarts == 1 and pool.fallbacks == 0
+
+
+@requires_pandoc
+def test_worker_timeout_falls_back():
+    with PandocWorkerPool(1, timeout=1e-6) as pool:
+        assert pool.convert(html_content) == pypandoc.convert_text(html_content, 'rst', format='html')
+        assert pool.fallbacks == 1
+        assert not pool.idle_workers[0].alive
+
+
+def test_pool_sent_to_process():
+    pool = PandocWorkerPool(3, timeout=10)
+    unpickled = pickle.loads(pickle.dumps(pool))
+    assert unpickled is get_process_worker_pool(1, 10)
+    assert (unpickled.size, unpickled.timeout) == (1, 10)
+    assert pickle.loads(pickle.dumps(pool)) is unpickled
+
+
+@requires_pandoc
+def test_chapter_converted_by_worker(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=1, paragraph_count=3)
+    book = epub2sphinx.Book(file_name)
+    chapter = next(filter(None, (generate_chapter(x, book) for x in book.epub.spine)))
+    expected = copy.deepcopy(chapter)
+    expected.convert(engine='pandoc')
+    with PandocWorkerPool(1) as pool:
+        chapter.convert(engine='pandoc', pandoc=pool)
+        assert len(pool.idle_workers) == 1
+    assert chapter.converted_by == 'pandoc' and chapter.content == expected.content
+
+
+def test_pandoc_backend():
+    with get_pandoc_backend('process') as pandoc:
+        assert pandoc is None
+    pool = PandocWorkerPool(1)
+    with get_pandoc_backend(pool) as pandoc:
+        assert pandoc is pool
+    with pytest.raises(ValueError):
+        get_pandoc_backend('daemon')
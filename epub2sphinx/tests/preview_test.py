@@ -0,0 +1,122 @@
+import gzip
+import os
+import pytest
+import threading
+import urllib.error
+import urllib.request
+
+from epub2sphinx.preview import PreviewServer, get_accepted_encodings, get_book_names, precompress
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirect)
+
+
+def request(server, path, method="GET", **headers):
+    url = "http://{}:{}{}".format(*server.server_address[:2], path)
+    try:
+        with opener.open(urllib.request.Request(url, headers=headers, method=method)) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers, error.read()
+
+
+def make_book(directory, title):
+    os.makedirs(os.path.join(directory, "_static"))
+    with open(os.path.join(directory, "index.html"), "w") as index_file:
+        index_file.write("<html><body><h1>{}</h1>{}</body></html>".format(title, "<p>Text</p>" * 500))
+    with open(os.path.join(directory, "_static", "image.png"), "wb") as image_file:
+        image_file.write(b"\x89PNG" + bytes(range(256)) * 40)
+    return directory
+
+
+@pytest.fixture
+def books(tmp_path):
+    return {"first": make_book(str(tmp_path / "first"), "First"),
+            "second": make_book(str(tmp_path / "second"), "Second")}
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(books, **options):
+        server = PreviewServer(books, port=0, quiet=True, **options)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        servers.append((server, thread))
+        return server
+
+    yield make
+    for server, thread in servers:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_serve_book(make_server, books):
+    server = make_server({"": books["first"]}, max_age=60)
+    status, headers, body = request(server, "/")
+    assert status == 200 and b"<h1>First</h1>" in body
+    assert headers["Content-Type"] == "text/html; charset=utf-8"
+    assert headers["Cache-Control"] == "no-cache" and headers["Vary"] == "Accept-Encoding"
+
+    status, headers, body = request(server, "/_static/image.png")
+    assert status == 200 and body.startswith(b"\x89PNG") and len(body) == int(headers["Content-Length"])
+    assert headers["Content-Type"] == "image/png" and headers["Cache-Control"] == "max-age=60"
+    assert request(server, "/_static/image.png", method="HEAD")[2] == b""
+
+    assert request(server, "/_static")[0] == 301
+    assert request(server, "/_static")[1]["Location"] == "/_static/"
+    assert request(server, "/missing.html")[0] == 404
+    assert request(server, "/../second/index.html")[0] == 404
+
+
+def test_conditional_requests(make_server, books):
+    server = make_server({"": books["first"]})
+    _, headers, _ = request(server, "/_static/image.png")
+    etag, last_modified = headers["ETag"], headers["Last-Modified"]
+    status, headers, body = request(server, "/_static/image.png", **{"If-None-Match": etag})
+    assert status == 304 and body == b"" and headers["ETag"] == etag
+    assert request(server, "/_static/image.png", **{"If-Modified-Since": last_modified})[0] == 304
+    assert request(server, "/_static/image.png", **{"If-None-Match": '"other"'})[0] == 200
+
+    os.utime(os.path.join(books["first"], "_static", "image.png"), (0, 0))
+    assert request(server, "/_static/image.png", **{"If-None-Match": etag})[0] == 200
+
+
+def test_precompressed_files(make_server, books):
+    assert precompress(books["first"]) == 1
+    assert precompress(books["first"]) == 0
+    assert not os.path.exists(os.path.join(books["first"], "_static", "image.png.gz"))
+    server = make_server({"": books["first"]})
+
+    status, headers, body = request(server, "/index.html", **{"Accept-Encoding": "br, gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert b"<h1>First</h1>" in gzip.decompress(body)
+    _, plain_headers, plain_body = request(server, "/index.html")
+    assert "Content-Encoding" not in plain_headers and b"<h1>First</h1>" in plain_body
+    assert plain_headers["ETag"] != headers["ETag"]
+    assert "Content-Encoding" not in request(server, "/index.html", **{"Accept-Encoding": "gzip;q=0"})[1]
+
+    # An outdated copy is not sent
+    with open(os.path.join(books["first"], "index.html"), "a") as index_file:
+        index_file.write("<p>Changed</p>")
+    assert "Content-Encoding" not in request(server, "/index.html", **{"Accept-Encoding": "gzip"})[1]
+
+
+def test_serve_many_books(make_server, books):
+    server = make_server(books)
+    status, _, body = request(server, "/")
+    assert status == 200 and b'href="/first/"' in body and b'href="/second/"' in body
+    assert b"<h1>Second</h1>" in request(server, "/second/")[2]
+    assert request(server, "/third/")[0] == 404
+
+
+def test_get_book_names():
+    assert list(get_book_names(["a/book", "b/book/", "c/other"])) == ["book", "book-2", "other"]
+    assert get_accepted_encodings("gzip, br;q=0.5, deflate;q=0") == {"gzip", "br"}
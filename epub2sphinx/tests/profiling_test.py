@@ -0,0 +1,35 @@
+import epub2sphinx
+import json
+
+from epub2sphinx.profiling import Profiler, record_time
+from synthetic import make_epub
+
+
+def test_record_time():
+    timings = {}
+    for _ in range(2):
+        with record_time(timings, 'step'):
+            sum(range(1000))
+    assert set(timings['step']) == {'wall_time', 'cpu_time'}
+    assert timings['step']['wall_time'] > 0
+
+
+def test_conversion_profile(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=3, paragraph_count=2, subsection_count=1)
+    profiler = Profiler()
+    epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False,
+                          verbose=False, profiler=profiler).convert()
+
+    report_file = str(tmp_path / "profile.json")
+    profiler.write_json(report_file)
+    with open(report_file) as report_input:
+        report = json.load(report_input)
+    stage_names = [stage['name'] for stage in report['stages']]
+    assert stage_names[:2] == ['parse', 'setup']
+    assert 'convert chapters' in stage_names and 'write chapters' in stage_names
+    assert report['chapter_count'] == len(report['chapters']) == 6
+    assert all('preprocess' in chapter['steps'] for chapter in report['chapters'])
+    wall_times = [chapter['wall_time'] for chapter in report['chapters']]
+    assert wall_times == sorted(wall_times, reverse=True)
+    assert "Slowest chapters (of 6)" in profiler.format_report(slowest_chapters=2)
@@ -0,0 +1,54 @@
+import epub2sphinx
+import os
+
+from ebooklib import epub
+from epub2sphinx.book import get_chapter_names_and_subsections
+from epub2sphinx.convert import extract_file
+from epub2sphinx.reader import read_epub
+from synthetic import make_epub
+
+
+def test_lazy_reader_matches_ebooklib(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=3, paragraph_count=2, subsection_count=1, image_count=2)
+    expected = epub.read_epub(file_name)
+    book = read_epub(file_name)
+
+    assert book.title == expected.title
+    assert book.spine == expected.spine
+    assert get_chapter_names_and_subsections(book) == get_chapter_names_and_subsections(expected)
+    for item, expected_item in zip(book.get_items(), expected.get_items()):
+        assert (item.id, item.file_name, item.get_type()) == (expected_item.id, expected_item.file_name,
+                                                              expected_item.get_type())
+        assert item.get_content() == expected_item.get_content()
+
+
+def test_extract_file_skips_unchanged(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=1, image_count=1)
+    image = read_epub(file_name).get_item_with_href("images/image_0.png")
+    output_path = str(tmp_path / "image.png")
+
+    content_hash = extract_file(image.archive, image.zip_name, output_path)
+    with open(output_path, 'rb') as output_file:
+        assert output_file.read() == image.content
+    os.utime(output_path, (0, 0))
+    assert extract_file(image.archive, image.zip_name, output_path, content_hash) == content_hash
+    assert os.stat(output_path).st_mtime == 0
+
+
+def test_book_closes_archive(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=1, paragraph_count=1)
+    with epub2sphinx.Book(file_name) as book:
+        zip_file = book.archive.zip_file()
+        item = book.items_by_href["chapter_0.xhtml"]
+        content = item.get_content()
+    assert zip_file.fp is None
+    # The archive is opened again when it is read after being closed
+    assert item.get_content() == content
+    book.close()
+
+    converter = epub2sphinx.Converter(file_name, str(tmp_path / "output"), "alabaster", False, verbose=False)
+    converter.convert()
+    assert converter.book.archive._zip_file is None
@@ -0,0 +1,105 @@
+import json
+import os
+import pytest
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from epub2sphinx import server as server_module
+from epub2sphinx.server import ConversionService, QueueFull, make_server
+from synthetic import make_epub
+
+
+def request(server, method, path, data=None):
+    url = "http://{}:{}{}".format(*server.server_address[:2], path)
+    body = json.dumps(data).encode() if data is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, body, method=method)) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as error:
+        return error.code, json.load(error)
+
+
+def wait_for(service, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while not service.get(job_id).finished:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    return service.get(job_id)
+
+
+@pytest.fixture
+def server(tmp_path):
+    service = ConversionService(max_jobs=1, max_queue=2, roots=[str(tmp_path)])
+    server = make_server(service, port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+    thread.join()
+
+
+def test_submit_and_poll_job(server, tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=2, paragraph_count=1)
+    status, job = request(server, "POST", "/jobs", {"input": file_name, "output": str(tmp_path / "out"),
+                                                    "build": False})
+    assert status == 202 and job['status'] in ('queued', 'running')
+    assert wait_for(server.service, job['id']).status == 'ok'
+    status, job = request(server, "GET", "/jobs/" + job['id'])
+    assert status == 200 and job['result']['chapters'] == 2
+    assert job['stage'] == 'render templates'
+    assert os.path.isfile(str(tmp_path / "out" / "source" / "index.rst"))
+    assert request(server, "GET", "/jobs")[1]['jobs'][0]['id'] == job['id']
+
+
+def test_invalid_jobs(server, tmp_path):
+    assert request(server, "POST", "/jobs", {"output": "out"})[0] == 400
+    assert request(server, "POST", "/jobs", {"input": "a.epub", "output": "out", "build": "yes"})[0] == 400
+    assert request(server, "POST", "/jobs", {"input": "a.epub", "output": "out", "colour": "red"})[0] == 400
+    file_name = str(tmp_path / "book.epub")
+    # Invalid values are rejected before the job is queued
+    for name, value in (("engine", "bogus"), ("image_format", "gif"), ("max_image_size", 0), ("max_page_size", -1)):
+        options = {"input": file_name, "output": str(tmp_path / "out"), name: value}
+        status, response = request(server, "POST", "/jobs", options)
+        assert status == 400 and name in response['error']
+    assert request(server, "GET", "/jobs/missing")[0] == 404
+    # The input and output must be inside the roots of the service
+    for options in ({"input": file_name, "output": str(tmp_path / ".." / "out")},
+                    {"input": "/etc/passwd", "output": str(tmp_path / "out")},
+                    {"input": file_name, "output": str(tmp_path)}):
+        status, response = request(server, "POST", "/jobs", options)
+        assert status == 400 and "root directories" in response['error']
+    os.symlink("/", str(tmp_path / "link"))
+    assert request(server, "POST", "/jobs", {"input": file_name, "output": str(tmp_path / "link" / "out")})[0] == 400
+    assert server.service.list() == []
+    assert request(server, "DELETE", "/jobs/missing")[0] == 404
+
+
+def test_queue_limit_and_cancel(tmp_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking_convert_book(*args, cancel_event=None, **kwargs):
+        started.set()
+        release.wait(timeout=30)
+        return {'status': 'cancelled' if cancel_event.is_set() else 'ok'}
+    monkeypatch.setattr(server_module, "convert_book", blocking_convert_book)
+
+    service = ConversionService(max_jobs=1, max_queue=1, roots=[str(tmp_path)])
+    job_options = {"input": str(tmp_path / "book.epub"), "output": str(tmp_path / "out")}
+    try:
+        running = service.submit(job_options)
+        started.wait(timeout=30)
+        queued = service.submit(job_options)
+        with pytest.raises(QueueFull):
+            service.submit(job_options)
+        assert service.cancel(queued.id).status == 'cancelled'
+        assert service.cancel(running.id).cancel_event.is_set()
+    finally:
+        release.set()
+        service.shutdown()
+    assert service.get(running.id).status == 'cancelled'
+    assert service.get(queued.id).result is None
@@ -0,0 +1,130 @@
+import struct
+import zlib
+
+from ebooklib import epub
+
+paragraph = ("<p>Lorem ipsum <em>dolor</em> sit amet, <strong>consectetur</strong> adipiscing elit, "
+             "sed do eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>\n")
+
+
+def make_png(width, height, seed=0):
+    """Returns the bytes of a PNG image with a simple gradient"""
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+    rows = b"".join(b"\0" + bytes((x + y + seed) % 256 for x in range(width) for _ in range(3))
+                    for y in range(height))
+    return (b"\x89PNG\r\n\x1a\n" +
+            chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) +
+            chunk(b"IDAT", zlib.compress(rows)) +
+            chunk(b"IEND", b""))
+
+
+def make_html(file_name, title, paragraph_count):
+    html = epub.EpubHtml(title=title, file_name=file_name)
+    html.content = "<h1>{}</h1>\n".format(title) + paragraph * paragraph_count
+    return html
+
+
+def nest_sections(items, depth):
+    """Returns the TOC entries of the items, nested in chains of the given depth
+
+    :param items: List of EpubHtml items
+    :type items: list
+
+    :param depth: Number of levels of each chain, 1 lists the items flat
+    :type depth: int
+
+    :rtype: list
+    """
+    depth = max(depth, 1)
+    entries = []
+    for index in range(0, len(items), depth):
+        chain = items[index:index + depth]
+        entry = chain[-1]
+        for item in reversed(chain[:-1]):
+            entry = (epub.Section(item.title, item.file_name), [entry])
+        entries.append(entry)
+    return entries
+
+
+def make_svg(image_file_name=None):
+    """Returns an SVG figure wrapping an image, as found in the cover pages of many epubs"""
+    if image_file_name is None:
+        return '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"><rect width="10" height="10"/></svg>\n'
+    return ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+            'width="32" height="32"><image width="32" height="32" xlink:href="{}"/></svg>\n'.format(image_file_name))
+
+
+def make_epub(file_name, chapter_count=10, paragraph_count=20, subsection_count=0, image_count=0,
+              image_size=32, unique_images=None, toc_depth=2, svg_count=0):
+    """Write a synthetic epub file for testing and benchmarking
+
+    :param file_name: Name of the epub file to write
+    :type file_name: str
+
+    :param chapter_count: Number of chapters in the book
+    :type chapter_count: int
+
+    :param paragraph_count: Number of paragraphs in each chapter
+    :type paragraph_count: int
+
+    :param subsection_count: Number of subsections (in separate files) in each chapter
+    :type subsection_count: int
+
+    :param image_count: Number of images, spread across the chapters
+    :type image_count: int
+
+    :param image_size: Width and height of the images in pixels
+    :type image_size: int
+
+    :param unique_images: Number of different images, the other images are duplicates of them
+    :type unique_images: int
+
+    :param toc_depth: Depth of the TOC, with the chapters at the first level. The subsections of
+        a chapter are nested in chains of toc_depth - 1 levels.
+    :type toc_depth: int
+
+    :param svg_count: Number of SVG figures in each chapter and subsection, wrapping the images if there are any
+    :type svg_count: int
+    """
+    book = epub.EpubBook()
+    book.set_identifier("epub2sphinx-synthetic")
+    book.set_title("Synthetic Book")
+    book.set_language("en")
+    book.add_author("epub2sphinx")
+
+    spine = []
+    toc = []
+    for index in range(chapter_count):
+        chapter = make_html("chapter_{}.xhtml".format(index), "Chapter {}".format(index), paragraph_count)
+        subsections = [make_html("chapter_{}_{}.xhtml".format(index, sub_index),
+                                 "Section {}.{}".format(index, sub_index), paragraph_count)
+                       for sub_index in range(subsection_count)]
+        for item in [chapter] + subsections:
+            book.add_item(item)
+            spine.append(item)
+        if subsections:
+            toc.append((epub.Section(chapter.title, chapter.file_name), nest_sections(subsections, toc_depth - 1)))
+        else:
+            toc.append(chapter)
+
+    for index in range(image_count):
+        image = epub.EpubImage(uid="image_{}".format(index),
+                               file_name="images/image_{}.png".format(index),
+                               media_type="image/png",
+                               content=make_png(image_size, image_size, index % (unique_images or image_count)))
+        book.add_item(image)
+        chapter = spine[index % len(spine)]
+        chapter.content += '<p><img src="{}" alt="Image {}"/></p>\n'.format(image.file_name, index)
+
+    for index, chapter in enumerate(spine):
+        chapter.content += "".join(make_svg("images/image_{}.png".format((index + svg_index) % image_count)
+                                            if image_count else None)
+                                   for svg_index in range(svg_count))
+
+    book.toc = toc
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    book.spine = spine
+    epub.write_epub(file_name, book)
@@ -1,9 +1,14 @@
 import epub2sphinx
-import sys
+import os
 
-def unit_test(function_name):
-    if "create_directory_structure" == function_name:
-        print(function_name)
-        epub2sphinx.create_directory_structure("testing",["source","build"])
+from synthetic import make_epub
 
-unit_test(sys.argv[1])
+
+def test_create_directory_structure(tmp_path):
+    file_name = str(tmp_path / "book.epub")
+    make_epub(file_name, chapter_count=1, paragraph_count=1, image_count=1)
+    output_directory = tmp_path / "testing"
+    converter = epub2sphinx.Converter(file_name, str(output_directory), "alabaster", False, verbose=False)
+    converter.setup()
+    assert sorted(os.listdir(str(output_directory))) == ["Makefile", "make.bat", "source"]
+    assert os.path.isdir(str(output_directory / "source" / "images"))
@@ -0,0 +1,38 @@
+import os
+import pypandoc
+import pytest
+import subprocess
+import sys
+
+from epub2sphinx import images
+
+
+def pandoc_available():
+    try:
+        pypandoc.get_pandoc_version()
+        return True
+    except OSError:
+        return False
+
+
+requires_pandoc = pytest.mark.skipif(not pandoc_available(), reason="pandoc is not installed")
+requires_pillow = pytest.mark.skipif(not images.is_available(), reason="Pillow is not installed")
+
+repository_directory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_import_times(statement="import cli"):
+    """Run the statement in a new interpreter with -X importtime
+
+    :returns: (Module name => Cumulative import time in microseconds) mapping
+    :rtype: dict
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=repository_directory,
+                            stderr=subprocess.PIPE, text=True, check=True).stderr
+    import_times = {}
+    for line in output.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                import_times[module.strip()] = int(cumulative)
+    return import_times
@@ -28,8 +28,13 @@ setup(
     packages = find_packages(),
     package_data={'epub2sphinx': ['templates/*']},
     install_requires = [requirements],
+    extras_require = {'images': ['Pillow'], 'preview': ['Brotli']},
     entry_points = '''
         [console_scripts]
         epub2sphinx=cli:convert
+        epub2sphinx-bulk=cli:bulk_convert
+        epub2sphinx-serve-converter=cli:serve_converter
+        epub2sphinx-inspect=cli:inspect
+        epub2sphinx-preview=cli:preview
     '''
 )